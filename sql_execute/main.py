@@ -5,6 +5,7 @@ from timsy_config import Config
 logger = timsy_log.getLogger('main')
 
 if __name__ == '__main__':
+    timsy_log.init_root_logger()
     logger.info(get_logger_initialized())
     c = Config()
     logger.info(c.get('DEFAULT', 'loggerName'))
@@ -0,0 +1,149 @@
+import asyncio
+import contextvars
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import ExitStack
+from typing import Any, Callable
+
+import timsy_log
+from sql_conn import SqlConn, DEFAULT_BATCH_SIZE, _borrowed_cursor, drain_results
+
+logger = timsy_log.getLogger('AsyncSqlConn')
+
+
+class QueryTimeoutError(TimeoutError):
+    pass
+
+
+class _Statement:
+    """ Tracks the cursor a worker thread is using so the event loop can cancel it server side. """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._cursor = None
+        self.cancelled = False
+
+    def attach(self, cursor):
+        with self._lock:
+            if self.cancelled:
+                raise asyncio.CancelledError('Statement cancelled before it started')
+            self._cursor = cursor
+
+    def detach(self):
+        with self._lock:
+            self._cursor = None
+
+    def cancel(self):
+        with self._lock:
+            self.cancelled = True
+            cursor = self._cursor
+        if cursor is not None:
+            try:
+                # SQLCancel is safe to call from another thread while execute/fetch is blocked.
+                cursor.cancel()
+            except Exception as e:
+                logger.warning(f'Cursor cancel failed: {type(e).__name__}: {e}')
+
+
+class AsyncSqlConn:
+    """
+    asyncio front-end for SqlConn. Blocking driver calls run on a dedicated bounded executor, at most
+    max_concurrency statements are in flight per instance, and timeouts or task cancellation cancel the
+    statement on the server before the coroutine returns.
+    """
+
+    def __init__(self, sql_conn: SqlConn | None = None, max_workers: int | None = None,
+                 max_concurrency: int | None = None, default_timeout: float | None = None):
+        self.sql_conn = sql_conn if sql_conn is not None else SqlConn()
+        max_workers = max_workers or self.sql_conn.pool.max_size
+        self.default_timeout = default_timeout
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='AsyncSqlConn')
+        self._limit = asyncio.Semaphore(max_concurrency or max_workers)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        await self.close()
+
+    async def close(self):
+        await asyncio.get_running_loop().run_in_executor(None, self._executor.shutdown, True)
+
+    def _run(self, statement: _Statement, work: Callable[[Any], Any]):
+        with _borrowed_cursor(self.sql_conn, 'async') as cursor:
+            statement.attach(cursor)
+            try:
+                return work(cursor)
+            finally:
+                statement.detach()
+
+    async def _call(self, statement: _Statement, func: Callable, *args, timeout: float | None = None):
+        """ Run func(*args) on the executor, cancelling statement if the await times out or is cancelled. """
+        timeout = self.default_timeout if timeout is None else timeout
+        future = asyncio.get_running_loop().run_in_executor(self._executor, func, *args)
+        try:
+            done, _ = await asyncio.wait({future}, timeout=timeout)
+        except asyncio.CancelledError:
+            statement.cancel()
+            await asyncio.wait({future})
+            raise
+        if not done:
+            statement.cancel()
+            await asyncio.wait({future})
+            raise QueryTimeoutError(f'Query exceeded {timeout}s and was cancelled')
+        return future.result()
+
+    async def _submit(self, work: Callable[[Any], Any], timeout: float | None):
+        async with self._limit:
+            statement = _Statement()
+            # Run in a copy of the task's context so its workload class follows the statement onto the executor.
+            context = contextvars.copy_context()
+            return await self._call(statement, context.run, self._run, statement, work, timeout=timeout)
+
+    async def execute(self, query: str, params: list | tuple | None = None, timeout: float | None = None) -> int:
+        def work(cursor):
+            cursor.execute(query) if params is None else cursor.execute(query, params)
+            rowcount = drain_results(cursor)
+            cursor.connection.commit()
+            return rowcount
+
+        return await self._submit(work, timeout)
+
+    async def fetch(self, query: str, params: list | tuple | None = None, timeout: float | None = None) -> list:
+        def work(cursor):
+            cursor.execute(query) if params is None else cursor.execute(query, params)
+            return cursor.fetchall()
+
+        return await self._submit(work, timeout)
+
+    async def stream(self, query: str, params: list | tuple | None = None, batch_size: int = DEFAULT_BATCH_SIZE,
+                     timeout: float | None = None):
+        """
+        Yield rows as they are fetched, batch_size at a time. The connection stays checked out and one
+        concurrency slot stays held until iteration finishes or the generator is closed.
+        timeout applies to the execute and to each fetchmany round trip separately.
+        Wrap early-exit consumers in contextlib.aclosing to release the connection deterministically.
+        """
+        statement = _Statement()
+        stack = ExitStack()
+        # Opening and closing run on whichever executor threads are free; sharing one context between them
+        # keeps the scheduler slot taken on open tied to this stream rather than to a worker thread.
+        context = contextvars.copy_context()
+
+        def open_cursor():
+            cursor = stack.enter_context(_borrowed_cursor(self.sql_conn, 'async'))
+            statement.attach(cursor)
+            cursor.arraysize = batch_size
+            cursor.execute(query) if params is None else cursor.execute(query, params)
+            return cursor
+
+        async with self._limit:
+            try:
+                cursor = await self._call(statement, context.run, open_cursor, timeout=timeout)
+                while batch := await self._call(statement, cursor.fetchmany, batch_size, timeout=timeout):
+                    for row in batch:
+                        yield row
+            finally:
+                statement.detach()
+                await asyncio.shield(
+                    asyncio.get_running_loop().run_in_executor(self._executor, context.run, stack.close))
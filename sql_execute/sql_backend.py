@@ -0,0 +1,467 @@
+"""
+Driver backends. A backend is a connect callable taking (server, database, trusted_connection) and returning a
+DB-API connection whose cursors offer the pyodbc surface SqlConn relies on. Selected by the DEFAULT driver key
+in config.ini: odbc (default, SQL Server via pyodbc) or sqlite (database is a file path or :memory:).
+"""
+
+import re
+import sqlite3
+import threading
+import time
+from collections import deque
+from typing import Any, Callable, Iterable
+
+ConnectFactory = Callable[[str, str, str], Any]
+
+# ODBC SQL data type codes, used for the data_type column of the sqlite columns() catalog.
+_SQL_TYPE_CODES = (
+    ('INT', 4),
+    ('CHAR', 12),
+    ('CLOB', 12),
+    ('TEXT', 12),
+    ('BLOB', -3),
+    ('REAL', 8),
+    ('FLOA', 8),
+    ('DOUB', 8),
+    ('DATE', 91),
+    ('TIME', 93),
+    ('NUM', 2),
+    ('DEC', 3),
+    ('BIT', -7),
+    ('BOOL', -7),
+)
+_DECLARED_SIZE = re.compile(r'\(\s*(\d+)\s*(?:,\s*(\d+)\s*)?\)')
+
+
+def odbc_connect(server: str, database: str, trusted_connection: str):
+    import pyodbc
+
+    return pyodbc.connect(
+        f'DRIVER=ODBC Driver 17 for SQL Server;'
+        f'SERVER={server};'
+        f'DATABASE={database};'
+        f'Trusted_Connection={trusted_connection}'
+    )
+
+
+class Row(tuple):
+    """ pyodbc.Row look-alike: a tuple with attribute access by column name and cursor_description. """
+    cursor_description: tuple = ()
+    _index: dict[str, int] = {}
+
+    def __getattr__(self, name: str):
+        try:
+            return self[self._index[name]]
+        except KeyError:
+            raise AttributeError(name) from None
+
+
+def _row_class(description) -> type[Row]:
+    return type('Row', (Row,), {'cursor_description': tuple(description),
+                                '_index': {d[0]: i for i, d in enumerate(description)}})
+
+
+def _description(names: list[str], sample: tuple | None) -> list[tuple]:
+    """ DB-API description with the Python type of the first row's values as type code, like pyodbc. """
+    return [(name, type(sample[i]) if sample is not None and sample[i] is not None else None,
+             None, None, None, None, True) for i, name in enumerate(names)]
+
+
+def _sql_type(declared: str) -> tuple[int, int | None, int | None]:
+    declared = declared.upper()
+    code = next((c for prefix, c in _SQL_TYPE_CODES if prefix in declared), 12)
+    size = _DECLARED_SIZE.search(declared)
+    return code, int(size.group(1)) if size else None, int(size.group(2)) if size and size.group(2) else None
+
+
+def _scan_statement(sql: str) -> tuple[int, bool]:
+    """ Number of ? placeholders in sql, and whether it holds anything besides whitespace and comments. """
+    count, content, i, n = 0, False, 0, len(sql)
+    while i < n:
+        c = sql[i]
+        if c in '\'"`[':
+            end = sql.find(']' if c == '[' else c, i + 1)
+            i, content = (n if end < 0 else end + 1), True
+        elif sql.startswith('--', i):
+            end = sql.find('\n', i)
+            i = n if end < 0 else end + 1
+        elif sql.startswith('/*', i):
+            end = sql.find('*/', i + 2)
+            i = n if end < 0 else end + 2
+        else:
+            count += c == '?'
+            content = content or not c.isspace()
+            i += 1
+    return count, content
+
+
+def _split_statements(sql: str, params) -> list[tuple[str, tuple]]:
+    """ Split a multi-statement batch into (statement, its share of params) in order. """
+    statements, current, offset = [], '', 0
+    pieces = sql.split(';')
+    for index, piece in enumerate(pieces):
+        last = index == len(pieces) - 1
+        current += piece if last else piece + ';'
+        # complete_statement knows about literals, comments and trigger bodies, so only real ends split.
+        if last or sqlite3.complete_statement(current):
+            count, content = _scan_statement(current)
+            if content:
+                statements.append((current, tuple(params[offset:offset + count])))
+                offset += count
+            current = ''
+    return statements
+
+
+class SqliteCursor:
+    def __init__(self, connection: 'SqliteConnection'):
+        self.connection = connection
+        self._cursor = connection.raw.cursor()
+        self._rows = None
+        self._pending: list = []
+        self._row_type: type[Row] | None = None
+        self.description = None
+        self.arraysize = 1
+        self.fast_executemany = False
+        self._batch: deque = deque()
+
+    @property
+    def rowcount(self) -> int:
+        return self._cursor.rowcount
+
+    def _set_result(self, names: list[str] | None, rows):
+        self._rows = rows
+        self._pending = []
+        if names is None:
+            self.description = None
+            self._row_type = None
+            return
+        first = next(rows, None)
+        if first is not None:
+            self._pending.append(first)
+        self.description = _description(names, first)
+        self._row_type = _row_class(self.description)
+
+    def execute(self, sql: str, *params):
+        if len(params) == 1 and isinstance(params[0], (list, tuple)):
+            params = params[0]
+        self._batch = deque()
+        try:
+            self._cursor.execute(sql, params)
+        except sqlite3.ProgrammingError as pe:
+            if 'one statement at a time' not in str(pe):
+                raise
+            # Multi-statement batch: like SQL Server, each statement becomes its own result and runs once the
+            # previous result is passed with nextset().
+            self._batch = deque(_split_statements(sql, params))
+            self._execute_next()
+            return self
+        self._set_statement_result()
+        return self
+
+    def _set_statement_result(self):
+        names = [d[0] for d in self._cursor.description] if self._cursor.description else None
+        self._set_result(names, iter(self._cursor))
+
+    def _execute_next(self):
+        sql, params = self._batch.popleft()
+        try:
+            self._cursor.execute(sql, params)
+        except Exception:
+            # An error ends the batch; the statements after it are not run.
+            self._batch.clear()
+            self._set_result(None, None)
+            raise
+        self._set_statement_result()
+
+    def executemany(self, sql: str, seq_of_params):
+        self._cursor.executemany(sql, seq_of_params)
+        self._set_result(None, None)
+        return self
+
+    def fetchone(self):
+        rows = self.fetchmany(1)
+        return rows[0] if rows else None
+
+    def fetchmany(self, size: int | None = None):
+        if self._rows is None:
+            raise sqlite3.ProgrammingError('No results. Previous SQL was not a query.')
+        size = size or self.arraysize
+        batch = self._pending[:size]
+        del self._pending[:size]
+        if len(batch) < size:
+            batch.extend(r for _, r in zip(range(size - len(batch)), self._rows))
+        row_type = self._row_type
+        return [row_type(r) for r in batch]
+
+    def fetchall(self):
+        if self._rows is None:
+            raise sqlite3.ProgrammingError('No results. Previous SQL was not a query.')
+        row_type = self._row_type
+        rows = [row_type(r) for r in self._pending]
+        self._pending = []
+        rows.extend(row_type(r) for r in self._rows)
+        return rows
+
+    def __iter__(self):
+        while row := self.fetchone():
+            yield row
+
+    def nextset(self) -> bool:
+        if self._batch:
+            self._execute_next()
+            return True
+        self._set_result(None, None)
+        return False
+
+    def cancel(self):
+        self.connection.raw.interrupt()
+
+    def close(self):
+        self._rows = None
+        self._pending = []
+        self._cursor.close()
+
+    def _catalog_tables(self, table: str | None, catalog: str | None):
+        query = ("SELECT 'main', name, type FROM main.sqlite_master WHERE type IN ('table', 'view') "
+                 "UNION ALL SELECT 'temp', name, type FROM temp.sqlite_master WHERE type IN ('table', 'view')")
+        rows = self.connection.raw.execute(query).fetchall()
+        return [(cat, None, name, kind.upper()) for cat, name, kind in rows
+                if not name.startswith('sqlite_')
+                and (catalog is None or cat == catalog)
+                and (table is None or _like(name, table))]
+
+    def tables(self, table: str | None = None, catalog: str | None = None, schema: str | None = None,
+               tableType: str | None = None):
+        """ ODBC SQLTables over sqlite_master. sqlite has no schemas, so schema is ignored. """
+        rows = [(cat, sch, name, kind, None) for cat, sch, name, kind in self._catalog_tables(table, catalog)
+                if tableType is None or kind in tableType.upper()]
+        self._set_result(['table_cat', 'table_schem', 'table_name', 'table_type', 'remarks'], iter(rows))
+        return self
+
+    def columns(self, table: str | None = None, catalog: str | None = None, schema: str | None = None,
+                column: str | None = None):
+        """ ODBC SQLColumns over PRAGMA table_info. sqlite has no schemas, so schema is ignored. """
+        rows = []
+        for cat, sch, name, _ in self._catalog_tables(table, catalog):
+            info = self.connection.raw.execute(f'PRAGMA {cat}.table_info("{name.replace(chr(34), chr(34) * 2)}")')
+            for cid, column_name, declared, notnull, default, _ in info.fetchall():
+                if column is not None and not _like(column_name, column):
+                    continue
+                data_type, size, digits = _sql_type(declared or '')
+                nullable = 0 if notnull else 1
+                rows.append((cat, sch, name, column_name, data_type, declared, size, size, digits, 10, nullable,
+                             None, default, data_type, None, size, cid + 1, 'NO' if notnull else 'YES'))
+        self._set_result(['table_cat', 'table_schem', 'table_name', 'column_name', 'data_type', 'type_name',
+                          'column_size', 'buffer_length', 'decimal_digits', 'num_prec_radix', 'nullable',
+                          'remarks', 'column_def', 'sql_data_type', 'sql_datetime_sub', 'char_octet_length',
+                          'ordinal_position', 'is_nullable'], iter(rows))
+        return self
+
+
+def _like(value: str, pattern: str) -> bool:
+    """ ODBC catalog search patterns: % and _ wildcards, case-insensitive like SQL Server's default collation. """
+    regex = ''.join('.*' if c == '%' else '.' if c == '_' else re.escape(c) for c in pattern)
+    return re.fullmatch(regex, value, re.IGNORECASE | re.DOTALL) is not None
+
+
+class SqliteConnection:
+    def __init__(self, raw: sqlite3.Connection):
+        self.raw = raw
+        self.closed = False
+
+    @property
+    def autocommit(self) -> bool:
+        return self.raw.isolation_level is None
+
+    @autocommit.setter
+    def autocommit(self, value: bool):
+        self.raw.isolation_level = None if value else ''
+
+    def cursor(self) -> SqliteCursor:
+        return SqliteCursor(self)
+
+    def commit(self):
+        self.raw.commit()
+
+    def rollback(self):
+        self.raw.rollback()
+
+    def close(self):
+        if not self.closed:
+            self.raw.close()
+            self.closed = True
+
+
+def sqlite_connect(server: str, database: str, trusted_connection: str) -> SqliteConnection:
+    # Pooled connections move between threads, but only one thread uses a connection at a time.
+    return SqliteConnection(sqlite3.connect(database or ':memory:', check_same_thread=False))
+
+
+class InjectedFault(Exception):
+    """ Driver-style error with the SQLSTATE in args[0], like pyodbc.Error. """
+
+    def __init__(self, state: str, message: str):
+        super().__init__(state, f'[{state}] {message}')
+
+
+class FaultInjector:
+    """
+    Backend wrapper that fails on a script, for exercising retry and circuit breaker paths without an outage.
+    connect_faults and execute_faults yield a SQLSTATE to fail the next connect / execute with, or None to let
+    it through; once exhausted every call passes.
+    """
+
+    def __init__(self, connect: ConnectFactory, connect_faults: Iterable[str | None] = (),
+                 execute_faults: Iterable[str | None] = ()):
+        self.connect = connect
+        self._connect_faults = iter(connect_faults)
+        self._execute_faults = iter(execute_faults)
+        self._lock = threading.Lock()
+        self.connects = 0
+        self.executes = 0
+        self.faults = 0
+
+    def _next_fault(self, faults) -> str | None:
+        with self._lock:
+            return next(faults, None)
+
+    def _maybe_fail(self, faults, message: str):
+        state = self._next_fault(faults)
+        if state is not None:
+            with self._lock:
+                self.faults += 1
+            raise InjectedFault(state, message)
+
+    def __call__(self, server: str, database: str, trusted_connection: str):
+        with self._lock:
+            self.connects += 1
+        self._maybe_fail(self._connect_faults, f'Injected connect failure for {server}')
+        return _FaultyConnection(self.connect(server, database, trusted_connection), self)
+
+
+class _FaultyConnection:
+    def __init__(self, conn, injector: FaultInjector):
+        self._conn = conn
+        self._injector = injector
+
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
+    def cursor(self):
+        return _FaultyCursor(self._conn.cursor(), self)
+
+
+class _FaultyCursor:
+    def __init__(self, cursor, connection: _FaultyConnection):
+        self._cursor = cursor
+        self.connection = connection
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+    def __iter__(self):
+        return iter(self._cursor)
+
+    def _before_execute(self):
+        injector = self.connection._injector
+        with injector._lock:
+            injector.executes += 1
+        injector._maybe_fail(injector._execute_faults, 'Injected execute failure')
+
+    def execute(self, sql: str, *params):
+        self._before_execute()
+        self._cursor.execute(sql, *params)
+        return self
+
+    def executemany(self, sql: str, seq_of_params):
+        self._before_execute()
+        self._cursor.executemany(sql, seq_of_params)
+        return self
+
+
+class LatencyInjector:
+    """
+    Backend wrapper that adds round_trip seconds to every request sent to the server: connect, execute,
+    executemany and commit. As with SQL Server, a request's results come back in its response, so fetching them
+    and moving between result sets with nextset() add no further delay. Makes a local sqlite database behave like
+    a server on a slow link, so the effect of round-trip savings can be measured. sleep can be replaced to keep
+    tests deterministic.
+    :param durations: Called with the SQL of every execute; returns extra seconds the server spends running it.
+    """
+
+    def __init__(self, connect: ConnectFactory, round_trip: float = 0.001, sleep: Callable[[float], Any] = time.sleep,
+                 durations: Callable[[str], float] | None = None):
+        self.connect = connect
+        self.round_trip = round_trip
+        self.sleep = sleep
+        self.durations = durations
+        self._lock = threading.Lock()
+        self.round_trips = 0
+
+    def wait(self, sql: str | None = None):
+        with self._lock:
+            self.round_trips += 1
+        delay = self.round_trip
+        if sql is not None and self.durations is not None:
+            delay += self.durations(sql)
+        self.sleep(delay)
+
+    def __call__(self, server: str, database: str, trusted_connection: str):
+        self.wait()
+        return _SlowConnection(self.connect(server, database, trusted_connection), self)
+
+
+class _SlowConnection:
+    def __init__(self, conn, injector: LatencyInjector):
+        self._conn = conn
+        self._injector = injector
+
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
+    def cursor(self):
+        return _SlowCursor(self._conn.cursor(), self)
+
+    def commit(self):
+        self._injector.wait()
+        self._conn.commit()
+
+
+class _SlowCursor:
+    def __init__(self, cursor, connection: _SlowConnection):
+        self._cursor = cursor
+        self.connection = connection
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+    def __iter__(self):
+        return iter(self._cursor)
+
+    def execute(self, sql: str, *params):
+        self.connection._injector.wait(sql)
+        self._cursor.execute(sql, *params)
+        return self
+
+    def executemany(self, sql: str, seq_of_params):
+        self.connection._injector.wait(sql)
+        self._cursor.executemany(sql, seq_of_params)
+        return self
+
+
+_backends: dict[str, ConnectFactory] = {
+    'odbc': odbc_connect,
+    'sqlite': sqlite_connect,
+}
+
+
+def register_backend(name: str, connect: ConnectFactory):
+    _backends[name.lower()] = connect
+
+
+def get_backend(name: str | None = None) -> ConnectFactory:
+    name = (name or 'odbc').lower()
+    try:
+        return _backends[name]
+    except KeyError:
+        raise ValueError(f'Unknown driver backend {name!r}, expected one of {", ".join(_backends)}') from None
@@ -0,0 +1,192 @@
+""" Column-oriented result materialization: one typed array per column instead of a Row object per row. """
+
+from array import array
+from dataclasses import dataclass, field
+from typing import Any, Iterable
+
+# cursor.description type codes that can live in a packed array, with their array typecodes.
+_TYPECODES = {
+    int: 'q',
+    float: 'd',
+    bool: 'b',
+}
+_NUMPY_DTYPES = {'q': 'int64', 'd': 'float64', 'b': 'bool', 'i': 'int32'}
+
+
+@dataclass
+class Column:
+    name: str
+    type_code: Any
+    values: array | list
+    null_mask: bytearray | None = None
+    dictionary: list | None = None
+
+    def __len__(self):
+        return len(self.values)
+
+    @property
+    def null_count(self) -> int:
+        return self.null_mask.count(1) if self.null_mask is not None else 0
+
+    def to_pylist(self) -> list:
+        """ Decoded Python values with None for nulls. """
+        values = [self.dictionary[c] if c >= 0 else None for c in self.values] \
+            if self.dictionary is not None else list(self.values)
+        if self.null_mask is not None:
+            values = [None if null else v for v, null in zip(values, self.null_mask)]
+        return values
+
+    @property
+    def nbytes(self) -> int:
+        """ Approximate payload size; object columns count only their pointer array. """
+        size = self.values.itemsize * len(self.values) if isinstance(self.values, array) else 8 * len(self.values)
+        size += len(self.null_mask) if self.null_mask is not None else 0
+        if self.dictionary is not None:
+            size += sum(len(v) for v in self.dictionary if isinstance(v, str))
+        return size
+
+
+class _ColumnBuilder:
+    def __init__(self, name: str, type_code: Any, dictionary_encode: bool):
+        self.name = name
+        self.type_code = type_code
+        typecode = _TYPECODES.get(type_code)
+        self.encode = dictionary_encode and typecode is None
+        self.values: array | list = array('i') if self.encode else (array(typecode) if typecode else [])
+        self.null_mask = bytearray()
+        self.has_nulls = False
+        self.codes: dict[Any, int] = {}
+        self.dictionary: list = []
+
+    def _to_object_column(self):
+        # Value did not fit the packed type (e.g. an int beyond 64 bits); fall back to plain objects.
+        self.values = list(self.values)
+
+    def extend(self, values: tuple):
+        nulls = None in values
+        if nulls:
+            self.has_nulls = True
+            self.null_mask.extend(v is None for v in values)
+        else:
+            self.null_mask.extend(bytes(len(values)))
+        if self.encode:
+            codes = self.codes
+            dictionary = self.dictionary
+            encoded = []
+            for v in values:
+                if v is None:
+                    encoded.append(-1)
+                    continue
+                code = codes.get(v)
+                if code is None:
+                    code = codes[v] = len(dictionary)
+                    dictionary.append(v)
+                encoded.append(code)
+            self.values.extend(encoded)
+            return
+        if isinstance(self.values, array):
+            filled = [0 if v is None else v for v in values] if nulls else values
+            size = len(self.values)
+            try:
+                self.values.extend(filled)
+                return
+            except (OverflowError, TypeError):
+                # array.extend may have appended part of the batch before failing.
+                del self.values[size:]
+                self._to_object_column()
+        self.values.extend(values)
+
+    def build(self) -> Column:
+        return Column(name=self.name, type_code=self.type_code, values=self.values,
+                      null_mask=self.null_mask if self.has_nulls else None,
+                      dictionary=self.dictionary if self.encode else None)
+
+
+@dataclass
+class ColumnarResult:
+    columns: dict[str, Column] = field(default_factory=dict)
+    row_count: int = 0
+
+    def __len__(self):
+        return self.row_count
+
+    def __getitem__(self, name: str) -> Column:
+        return self.columns[name]
+
+    @property
+    def names(self) -> list[str]:
+        return list(self.columns)
+
+    @property
+    def nbytes(self) -> int:
+        return sum(c.nbytes for c in self.columns.values())
+
+    def to_numpy(self) -> dict[str, Any]:
+        """
+        One ndarray per column, zero-copy for packed columns. Columns with nulls become masked arrays and
+        dictionary encoded columns are decoded. Requires numpy.
+        """
+        try:
+            import numpy
+        except ImportError as ie:
+            raise ImportError('numpy is required for ColumnarResult.to_numpy()') from ie
+        arrays = {}
+        for name, column in self.columns.items():
+            if column.dictionary is not None:
+                data = numpy.array(column.dictionary + [None], dtype=object)[numpy.frombuffer(column.values, 'int32')]
+            elif isinstance(column.values, array):
+                data = numpy.frombuffer(column.values, dtype=_NUMPY_DTYPES[column.values.typecode])
+            else:
+                data = numpy.array(column.values, dtype=object)
+            if column.null_mask is not None:
+                data = numpy.ma.masked_array(data, mask=numpy.frombuffer(column.null_mask, dtype='bool'))
+            arrays[name] = data
+        return arrays
+
+
+def build_columnar(cursor, batch_size: int = 10000, dictionary_encode: bool | Iterable[str] = False) -> ColumnarResult:
+    """
+    Drain an executed cursor with fetchmany into typed per-column arrays, using cursor.description
+    type codes to choose the storage. Only one batch of rows is alive at a time.
+    :param dictionary_encode: True to dictionary encode every non-numeric column, or the names to encode.
+    """
+    description = cursor.description
+    if description is None:
+        raise ValueError('Query did not return a result set')
+    encode_names = None if isinstance(dictionary_encode, bool) else set(dictionary_encode)
+    builders = [_ColumnBuilder(d[0], d[1], dictionary_encode if encode_names is None else d[0] in encode_names)
+                for d in description]
+    row_count = 0
+    while True:
+        batch = cursor.fetchmany(batch_size)
+        if not batch:
+            break
+        row_count += len(batch)
+        for builder, values in zip(builders, zip(*batch)):
+            builder.extend(values)
+        del batch
+    return ColumnarResult(columns={b.name: b.build() for b in builders}, row_count=row_count)
+
+
+if __name__ == '__main__':
+    import tracemalloc
+
+    class _StandInCursor:
+        description = [('id', int), ('amount', float), ('status', str)]
+
+        def __init__(self, rows: int):
+            self._rows = ((i, i * 0.5, ('open', 'closed', 'void')[i % 3]) for i in range(rows))
+
+        def fetchmany(self, size):
+            return [r for _, r in zip(range(size), self._rows)]
+
+        def fetchall(self):
+            return list(self._rows)
+
+    for label, run in (('fetchall', lambda: _StandInCursor(200000).fetchall()),
+                       ('columnar', lambda: build_columnar(_StandInCursor(200000), dictionary_encode=True))):
+        tracemalloc.start()
+        result = run()
+        current, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        print(f'{label}: {current / 200000:.1f} bytes/row retained, {peak / 1024 / 1024:.1f} MiB peak')
@@ -1,26 +1,176 @@
-import pyodbc
+from __future__ import annotations
+
+import functools
+import inspect
+import itertools
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+from typing import TYPE_CHECKING, Iterable, Sequence
+
 from dataclasses import dataclass, field, InitVar
 from timsy_config import Config
+from sql_pool import SqlConnPool
+from sql_prepared import StatementCache, normalize_query, quote_identifier, quote_table_name
+from sql_hooks import instrument
+from sql_leaks import tracker
 import timsy_log
 
+# Optional features are imported where they are first used, so `import sql_conn` stays cheap for short jobs.
+if TYPE_CHECKING:
+    import pyodbc
+    from sql_columnar import ColumnarResult
+    from sql_export import ExportResult
+    from sql_pipeline import PipelineResult, StatementPipeline
+    from sql_result_cache import CachedResult, ResultCache
+    from sql_retry import RetryPolicy
+    from sql_scheduler import QueryScheduler
+
 logger = timsy_log.getLogger('SqlConn')
 
+DEFAULT_BATCH_SIZE = 1000
+DEFAULT_CHUNK_SIZE = 10000
+
+_default_pool: SqlConnPool | None = None
+_default_pool_lock = threading.Lock()
+
+
+def get_default_pool(config: Config | None = None) -> SqlConnPool:
+    """
+    Process-wide pool shared by every SqlConn that is not given its own.
+    The driver backend, pool sizes and connect retry settings are read from config on first use.
+    """
+    global _default_pool
+    with _default_pool_lock:
+        if _default_pool is None:
+            from sql_backend import get_backend
+            from sql_retry import RetryPolicy, resilient_connect
+            config = config if config is not None else Config()
+            _default_pool = SqlConnPool(
+                resilient_connect(get_backend(config.get('DEFAULT', 'driver')), RetryPolicy.from_config(config)),
+                min_size=config.get_int('DEFAULT', 'poolMinSize') or 0,
+                max_size=config.get_int('DEFAULT', 'poolMaxSize') or 8,
+                idle_timeout=config.get_float('DEFAULT', 'poolIdleTimeout') or 300.0,
+            )
+        return _default_pool
+
+
+def set_default_pool(pool: SqlConnPool | None):
+    """ Replace the process-wide pool, e.g. with one built on a fake connection factory. """
+    global _default_pool
+    with _default_pool_lock:
+        _default_pool = pool
+
+
+def iter_batches(cursor: pyodbc.Cursor, batch_size: int = DEFAULT_BATCH_SIZE):
+    """ Yield lists of at most batch_size rows from an executed cursor until it is exhausted. """
+    while True:
+        batch = cursor.fetchmany(batch_size)
+        if not batch:
+            return
+        yield batch
+
+
+def iter_rows(cursor: pyodbc.Cursor, batch_size: int = DEFAULT_BATCH_SIZE):
+    for batch in iter_batches(cursor, batch_size):
+        yield from batch
+
+
+def drain_results(cursor: pyodbc.Cursor) -> int:
+    """ Consume every pending result set without keeping rows. Returns the rowcount of the last one. """
+    rowcount = cursor.rowcount
+    while True:
+        if cursor.description is not None:
+            for _ in iter_batches(cursor):
+                pass
+        if not cursor.nextset():
+            return rowcount
+        rowcount = cursor.rowcount
+
+
+def to_temp_table_name(name: str) -> str:
+    """ Quoted local temp table name for SQL Server, adding the leading # when missing. """
+    name = name[1:-1].replace(']]', ']') if name.startswith('[') and name.endswith(']') else name
+    return quote_identifier(name if name.startswith('#') else f'#{name}')
+
+
+@dataclass
+class BulkInsertResult:
+    table: str
+    rows: int = 0
+    chunks: int = 0
+    elapsed: float = 0.0
+
+    @property
+    def rows_per_second(self) -> float:
+        return self.rows / self.elapsed if self.elapsed > 0 else 0.0
+
 
-def precursor(func):
+def _admission(sql_conn: 'SqlConn'):
+    """ Scheduler slot for the statement about to run, in the current workload class, when scheduling is on. """
+    scheduler: QueryScheduler | None = getattr(sql_conn, 'scheduler', None)
+    if scheduler is None:
+        return nullcontext()
+    from sql_scheduler import current_workload
+    return scheduler.slot(current_workload(sql_conn.workload))
+
+
+@contextmanager
+def _borrowed_cursor(sql_conn: 'SqlConn', operation: str = 'cursor', timeout: float | None = None):
+    with _admission(sql_conn), sql_conn.borrow_connection(timeout=timeout) as conn:
+        cursor: pyodbc.Cursor = conn.cursor()
+        if cursor is None:
+            raise ValueError('Cursor is None')
+        cursor = instrument(cursor, operation)
+        token = tracker.track('cursor', operation)
+        try:
+            yield cursor
+        finally:
+            tracker.untrack(token)
+            cursor.close()
+
+
+def precursor(func=None, *, idempotent: bool = False):
+    """
+    Borrow a pooled connection and cursor for the call and pass the cursor as the cursor keyword.
+    Generator functions keep both checked out until the generator finishes or is closed.
+    :param idempotent: Safe to run again after a partial failure. When the SqlConn has a retry_policy, only
+        idempotent calls that fail with a transient error are re-run on a fresh connection. Anything that
+        commits part of its work (execute, bulk_insert, pipelines) is not, and generator functions are never
+        retried since their rows may already have been consumed.
+    """
+    if func is None:
+        return functools.partial(precursor, idempotent=idempotent)
+
+    if inspect.isgeneratorfunction(func):
+        @functools.wraps(func)
+        def gen_wrapper(*args, **kwargs):
+            try:
+                wrapper_self: SqlConn = args[0]
+                with _borrowed_cursor(wrapper_self, func.__name__) as cursor:
+                    yield from func(*args, cursor=cursor, **kwargs)
+            except Exception as e:
+                logger.error(f'{type(e).__name__}: {e}')
+                raise e
+
+        return gen_wrapper
+
+    @functools.wraps(func)
     def wrapper(*args, **kwargs):
-        cursor: pyodbc.Cursor | None = None
         try:
             wrapper_self: SqlConn = args[0]
-            cursor: pyodbc.Cursor = wrapper_self.get_cursor()
-            if cursor is None:
-                raise ValueError('Cursor is None')
-            return func(*args, cursor=cursor, **kwargs)
+
+            def call():
+                with _borrowed_cursor(wrapper_self, func.__name__) as cursor:
+                    return func(*args, cursor=cursor, **kwargs)
+
+            policy: RetryPolicy | None = getattr(wrapper_self, 'retry_policy', None)
+            if policy is None or not idempotent:
+                return call()
+            return policy.call(call, server=wrapper_self.server, description=func.__name__)
         except Exception as e:
             logger.error(f'{type(e).__name__}: {e}')
             raise e
-        finally:
-            if cursor is not None:
-                cursor.close()
 
     return wrapper
 
@@ -32,8 +182,14 @@ class SqlConn:
     database: str = field(init=False)
     trusted_connection: str = field(init=False)
     config_override: InitVar[dict | None] = None
+    pool: SqlConnPool | None = None
+    result_cache: ResultCache | None = None
+    retry_policy: RetryPolicy | None = None
+    scheduler: QueryScheduler | None = None
+    workload: str = 'interactive'  # sql_scheduler.INTERACTIVE
     conn: pyodbc.Connection = field(init=False, default=None)
     is_connected: bool = field(init=False, default=False)
+    _leak_token: int | None = field(init=False, default=None, repr=False)
 
     def __post_init__(self, config_override):
         if config_override is not None:
@@ -45,15 +201,104 @@ class SqlConn:
             self.server = self.config.get('DEFAULT', 'server')
             self.database = self.config.get('DEFAULT', 'database')
             self.trusted_connection = self.config.get('DEFAULT', 'trusted_connection')
+        if self.pool is None:
+            self.pool = get_default_pool(self.config)
+        if self.retry_policy is None and self.config.get_boolean('DEFAULT', 'retryStatements'):
+            from sql_retry import RetryPolicy
+            self.retry_policy = RetryPolicy.from_config(self.config)
+        if self.scheduler is None and self.config.get_boolean('DEFAULT', 'scheduleQueries'):
+            from sql_scheduler import get_default_scheduler
+            self.scheduler = get_default_scheduler(self.config)
 
     def open_connection(self):
-        self.conn = pyodbc.connect(
-            f'DRIVER=ODBC Driver 17 for SQL Server;'
-            f'SERVER={self.server};'
-            f'DATABASE={self.database};'
-            f'Trusted_Connection={self.trusted_connection}'
-        )
+        """ Open a dedicated connection owned by this SqlConn, outside the pool, with the pool's driver backend. """
+        self.conn = self.pool.connect_factory(self.server, self.database, self.trusted_connection)
         self.is_connected = True
+        self._leak_token = tracker.track('connection', f'{self.server}/{self.database} (dedicated)')
+
+    @contextmanager
+    def borrow_connection(self, timeout: float | None = None):
+        """ Check a connection out of the pool for the duration of the with block. """
+        with self.pool.connection(self.server, self.database, self.trusted_connection, timeout=timeout) as conn:
+            yield conn
+
+    @contextmanager
+    def _prepared_cursor(self, query: str, params, operation: str = 'prepared'):
+        """ Borrow a connection and its cached cursor for the normalized query. Yields (cursor, query, params). """
+        normalized, bound = normalize_query(query, params)
+        with _admission(self), self.borrow_connection() as conn:
+            state = self.pool.connection_state(conn, self.server, self.database, self.trusted_connection)
+            statements: StatementCache = state.get('statements')
+            if statements is None:
+                statements = state['statements'] = StatementCache(conn)
+            cursor = statements.cursor_for(normalized)
+            instrumented = instrument(cursor, operation)
+            token = tracker.track('cursor', operation)
+            try:
+                yield instrumented, normalized, bound
+            except Exception:
+                # A failed statement may leave the cursor mid-result; prepare it afresh next time.
+                statements.discard(normalized)
+                raise
+            finally:
+                tracker.untrack(token)
+                if instrumented is not cursor:
+                    instrumented.release()
+
+    def execute_prepared(self, query: str, params: list | tuple | dict | None = None) -> int:
+        """
+        Execute a parameterized statement through the connection's statement cache and commit.
+        query may use ? or :name placeholders; repeat executions with new params reuse the prepared statement.
+        """
+        try:
+            with self._prepared_cursor(query, params, 'execute_prepared') as (cursor, normalized, bound):
+                cursor.execute(normalized, bound)
+                rowcount = drain_results(cursor)
+                cursor.connection.commit()
+                return rowcount
+        except Exception as e:
+            logger.error(f'{type(e).__name__}: {e}')
+            raise e
+
+    def fetch_cached(self, query: str, params: list | tuple | dict | None = None,
+                     ttl: float | None = None) -> CachedResult:
+        """
+        Read-only query served from the result cache (this SqlConn's, or the process default) keyed by
+        server, database, normalized SQL and parameters. Misses run through fetch_prepared's statement cache.
+        """
+        from sql_result_cache import CachedResult, default_result_cache
+        normalized, bound = normalize_query(query, params)
+        first_word = normalized.split(None, 1)[0].upper() if normalized else ''
+        if first_word not in ('SELECT', 'WITH'):
+            raise ValueError('Only read-only SELECT queries can be served from the result cache')
+        cache = self.result_cache if self.result_cache is not None else default_result_cache
+
+        def load() -> CachedResult:
+            with self._prepared_cursor(normalized, bound, 'fetch_cached') as (cursor, _, _):
+                cursor.execute(normalized, bound)
+                columns = tuple(d[0] for d in cursor.description)
+                rows = tuple(tuple(r) for r in iter_rows(cursor))
+                drain_results(cursor)
+                return CachedResult(columns=columns, rows=rows)
+
+        try:
+            key = (self.server, self.database, normalized, bound)
+            hash(key)
+        except TypeError:
+            return load()
+        return cache.get_or_load(key, normalized, load, ttl=ttl)
+
+    def fetch_prepared(self, query: str, params: list | tuple | dict | None = None) -> list:
+        """ Like execute_prepared, returning the rows of the first result set. """
+        try:
+            with self._prepared_cursor(query, params, 'fetch_prepared') as (cursor, normalized, bound):
+                cursor.execute(normalized, bound)
+                rows = cursor.fetchall()
+                drain_results(cursor)
+                return rows
+        except Exception as e:
+            logger.error(f'{type(e).__name__}: {e}')
+            raise e
 
     def verify_connection(self) -> bool:
         if not self.is_connected:
@@ -61,16 +306,23 @@ class SqlConn:
         return self.is_connected
 
     def test_connection(self):
+        def ping():
+            with self.borrow_connection() as conn:
+                cursor = conn.cursor()
+                try:
+                    cursor.execute('SELECT 1')
+                    cursor.fetchall()
+                finally:
+                    cursor.close()
+
         try:
-            self.verify_connection()
-            cursor = self.conn.cursor()
-            cursor.execute('SELECT 1')
-            cursor.fetchall()
+            if self.retry_policy is None:
+                ping()
+            else:
+                self.retry_policy.call(ping, server=self.server, description='test_connection')
             logger.info('Connection Successful')
         except Exception as e:
             logger.error(f'Connection Failed: {type(e).__name__}: {e}')
-            self.close_connection()
-            self.is_connected = False
             raise e
 
     def get_cursor(self) -> pyodbc.Cursor:
@@ -78,44 +330,191 @@ class SqlConn:
             self.open_connection()
         return self.conn.cursor()
 
-    @precursor
+    @precursor(idempotent=True)
     def test_query(self, query: str, cursor=None):
         if cursor is None:
             raise ValueError('Cursor is None')
         cursor.execute(query)
-        cursor.fetchall()
+        for _ in iter_batches(cursor):
+            pass
         logger.info('Connection Successfully passed cursor!')
 
     @precursor
+    def execute(self, query: str, params: list | tuple | None = None, cursor: pyodbc.Cursor = None) -> int:
+        """ Execute query, drain every result set it produces and commit. Returns the last rowcount. """
+        if params is None:
+            cursor.execute(query)
+        else:
+            cursor.execute(query, params)
+        rowcount = drain_results(cursor)
+        cursor.connection.commit()
+        return rowcount
+
+    @precursor
+    def execute_batches(self, batches: Iterable[str], cursor: pyodbc.Cursor = None) -> int:
+        """ Execute GO separated batches in order on one connection, so session state carries over, then commit. """
+        rowcount = -1
+        for batch in batches:
+            cursor.execute(batch)
+            rowcount = drain_results(cursor)
+        cursor.connection.commit()
+        return rowcount
+
+    @precursor
+    def stream(self, query: str, params: list | tuple | None = None, batch_size: int = DEFAULT_BATCH_SIZE,
+               batches: bool = False, cursor: pyodbc.Cursor = None):
+        """
+        Execute query and yield its rows, fetching batch_size rows at a time so memory stays bounded by the batch.
+        The pooled cursor stays open while iterating and is released as soon as the generator is exhausted
+        or closed, so wrap early-exit consumers in contextlib.closing to release it deterministically.
+        :param batches: Yield each fetchmany batch as a list instead of individual rows.
+        """
+        if batch_size < 1:
+            raise ValueError('batch_size must be at least 1')
+        cursor.arraysize = batch_size
+        if params is None:
+            cursor.execute(query)
+        else:
+            cursor.execute(query, params)
+        if batches:
+            yield from iter_batches(cursor, batch_size)
+        else:
+            yield from iter_rows(cursor, batch_size)
+
+    @precursor(idempotent=True)
+    def fetch_columnar(self, query: str, params: list | tuple | None = None, batch_size: int = DEFAULT_CHUNK_SIZE,
+                       dictionary_encode: bool | Iterable[str] = False, numpy: bool = False,
+                       cursor: pyodbc.Cursor = None) -> ColumnarResult | dict:
+        """
+        Execute query and materialize it column by column into typed arrays with null masks, reading
+        batch_size rows at a time. numpy=True returns a dict of ndarrays instead (requires numpy).
+        """
+        from sql_columnar import build_columnar
+        cursor.arraysize = batch_size
+        if params is None:
+            cursor.execute(query)
+        else:
+            cursor.execute(query, params)
+        result = build_columnar(cursor, batch_size=batch_size, dictionary_encode=dictionary_encode)
+        return result.to_numpy() if numpy else result
+
+    @precursor
+    def export(self, query: str, path: str, format: str = 'csv', params: list | tuple | None = None,
+               compression: str | None = None, batch_size: int = DEFAULT_CHUNK_SIZE,
+               cursor: pyodbc.Cursor = None) -> ExportResult:
+        """
+        Stream the result of query to a csv, jsonl or columnar file without materialising it: batches are
+        fetched on this thread while a writer thread encodes and writes them.
+        :param compression: gzip or zstd (requires zstandard); inferred from a .gz or .zst suffix when None.
+        """
+        from sql_export import export_cursor
+        if params is None:
+            cursor.execute(query)
+        else:
+            cursor.execute(query, params)
+        result = export_cursor(cursor, path, format=format, compression=compression, batch_size=batch_size)
+        logger.info(f'Exported {result.rows} rows to {result.path} in {result.elapsed:.2f}s '
+                    f'({result.rows_per_second:.0f} rows/sec, {result.bytes_per_second / 1024 / 1024:.1f} MiB/sec)')
+        return result
+
+    def pipeline(self) -> StatementPipeline:
+        """
+        New statement pipeline on this SqlConn: queue statements with add(), then run() sends them as one
+        batch and returns each statement's result sets, rowcount and error.
+        """
+        from sql_pipeline import StatementPipeline
+        return StatementPipeline(self)
+
+    @precursor
+    def run_pipeline(self, pipeline: StatementPipeline, commit: bool = True, raise_on_error: bool = True,
+                     cursor: pyodbc.Cursor = None) -> PipelineResult:
+        return pipeline.run_on(cursor, commit=commit, raise_on_error=raise_on_error)
+
+    @precursor
+    def bulk_insert(self, table: str, columns: Sequence[str], rows: Iterable[Sequence],
+                    chunk_size: int = DEFAULT_CHUNK_SIZE, temp_columns: Sequence[str] | None = None,
+                    post_sql: str | None = None, cursor: pyodbc.Cursor = None) -> BulkInsertResult:
+        """
+        Load rows into table with fast_executemany, committing every chunk_size rows so generators are never
+        materialised beyond one chunk.
+        :param temp_columns: Column definitions, e.g. ['id INT', 'name VARCHAR(30)']. When given, table is treated
+            as a #temp staging table that is created before and dropped after the load.
+        :param post_sql: Statement run on the same connection after the load, e.g. a MERGE from the staging table.
+        """
+        if chunk_size < 1:
+            raise ValueError('chunk_size must be at least 1')
+        if not columns:
+            raise ValueError('At least one column is required')
+        table = to_temp_table_name(table) if temp_columns is not None else quote_table_name(table)
+        column_list = ', '.join(quote_identifier(c) for c in columns)
+        placeholders = ', '.join('?' for _ in columns)
+        insert_sql = f'INSERT INTO {table} ({column_list}) VALUES ({placeholders});'
+        result = BulkInsertResult(table=table)
+        connection = cursor.connection
+        if hasattr(cursor, 'fast_executemany'):
+            cursor.fast_executemany = True
+        started = time.perf_counter()
+        try:
+            if temp_columns is not None:
+                cursor.execute(f'DROP TABLE IF EXISTS {table};')
+                cursor.execute(f'CREATE TABLE {table} ({", ".join(temp_columns)});')
+            source = iter(rows)
+            while chunk := list(itertools.islice(source, chunk_size)):
+                try:
+                    cursor.executemany(insert_sql, chunk)
+                    connection.commit()
+                except Exception:
+                    connection.rollback()
+                    logger.error(f'Bulk insert into {table} failed on chunk {result.chunks + 1}, '
+                                 f'{result.rows} rows committed before it')
+                    raise
+                result.rows += len(chunk)
+                result.chunks += 1
+            if post_sql is not None:
+                cursor.execute(post_sql)
+                connection.commit()
+        finally:
+            if temp_columns is not None:
+                try:
+                    cursor.execute(f'DROP TABLE IF EXISTS {table};')
+                except Exception as e:
+                    logger.warning(f'Failed dropping staging table {table}: {type(e).__name__}: {e}')
+            result.elapsed = time.perf_counter() - started
+        logger.info(f'Bulk inserted {result.rows} rows into {table} in {result.chunks} chunks '
+                    f'({result.rows_per_second:.0f} rows/sec)')
+        return result
+
+    @precursor(idempotent=True)
     def test_temp_two_part(self, temp_table_name: str, cursor: pyodbc.Cursor = None):
         try:
-            if not temp_table_name.startswith('#'):
-                temp_table_name = f'#{temp_table_name}'
-            cursor.execute(f"DROP TABLE IF EXISTS {temp_table_name};")
-            cursor.execute(f'CREATE TABLE {temp_table_name} (id VARCHAR(30));')
-            cursor.execute(f"INSERT INTO {temp_table_name} SELECT ('Hello Temp Table') UNION SELECT ('Still Hello');")
-            cursor.execute(f'SELECT * FROM {temp_table_name};')
-            result = cursor.fetchall()
+            from sql_pipeline import StatementPipeline
+            temp_table_name = to_temp_table_name(temp_table_name)
+            pipeline = StatementPipeline()
+            pipeline.add(f"DROP TABLE IF EXISTS {temp_table_name};")
+            pipeline.add(f'CREATE TABLE {temp_table_name} (id VARCHAR(30));')
+            pipeline.add(f"INSERT INTO {temp_table_name} SELECT ('Hello Temp Table') UNION SELECT ('Still Hello');")
+            select = pipeline.add(f'SELECT * FROM {temp_table_name};')
+            pipeline.add(f'DROP TABLE IF EXISTS {temp_table_name}')
+            result = pipeline.run_on(cursor, commit=False)[select].rows
             for index, r in enumerate(result):
-                if isinstance(r, pyodbc.Row):
+                if hasattr(r, 'cursor_description'):
                     logger.info(f'Temp Table Result {index}: {r.id}')
             logger.info(f'Temp Table Result Column Names: {result[0].cursor_description}')
             logger.info(f'Temp Table Result: {result}')
-            cursor.execute(f'DROP TABLE IF EXISTS {temp_table_name}')
             logger.info('Connection Successfully passed cursor!')
         except Exception as e:
             logger.error(f'Connection Failed: {type(e).__name__}: {e}')
             raise e
 
-    @precursor
+    @precursor(idempotent=True)
     def test_pyodbc_tables(self, table_name:str = None, cursor: pyodbc.Cursor = None):
         try:
             if table_name:
-                tables = cursor.tables(table=table_name).fetchall()
-                if len(tables) > 0:
-                    for row in tables:
-                        logger.info(f'Table Name: [{row.table_cat}].[{row.table_schem}].[{row.table_name}]')
-                else:
+                found = 0
+                for row in iter_rows(cursor.tables(table=table_name)):
+                    found += 1
+                    logger.info(f'Table Name: [{row.table_cat}].[{row.table_schem}].[{row.table_name}]')
+                if not found:
                     logger.info(f'Table {table_name} Does Not Exist')
             else:
                 logger.info('No Table Name Provided to Search')
@@ -125,17 +524,17 @@ class SqlConn:
             logger.error(f'Connection Failed: {type(e).__name__}: {e}')
             raise e
 
-    @precursor
+    @precursor(idempotent=True)
     def test_pyodbc_columns(self, catalog:str = None, schema:str = None, table_name:str = None, column:str = None, cursor: pyodbc.Cursor = None):
         try:
-            rows = cursor.columns(table=table_name, catalog=catalog, schema=schema, column=column).fetchall()
-            if len(rows) > 0:
-                for row in rows:
-                    column_name:str = row.column_name
-                    for detail, value in zip(row.cursor_description, row):
-                        if value is not None:
-                            logger.info(f'Column {column_name} : {detail[0]}({detail[1]}): {value}')
-            else:
+            found = 0
+            for row in iter_rows(cursor.columns(table=table_name, catalog=catalog, schema=schema, column=column)):
+                found += 1
+                column_name:str = row.column_name
+                for detail, value in zip(row.cursor_description, row):
+                    if value is not None:
+                        logger.info(f'Column {column_name} : {detail[0]}({detail[1]}): {value}')
+            if not found:
                 logger.info(f'No Columns Found for parameters: {catalog}, {schema}, {table_name}, {column}')
         except Exception as e:
             logger.error(f'Connection Failed: {type(e).__name__}: {e}')
@@ -144,52 +543,60 @@ class SqlConn:
 
     def close_connection(self):
         if self.is_connected:
+            tracker.untrack(self._leak_token)
+            self._leak_token = None
             self.conn.close()
             self.is_connected = False
 
-    def __del__(self):
+    def __enter__(self) -> SqlConn:
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
         self.close_connection()
-        logger.info('Connection Closed')
+
+    def __del__(self):
+        if getattr(self, 'is_connected', False):
+            logger.warning(f'SqlConn for {self.server}/{self.database} was not closed, closing it on garbage collection')
+            self.close_connection()
 
 
 def base_run_01():
-    sql_conn = SqlConn()
-    sql_conn.test_connection()
-    del sql_conn
-    logger.info('Connection Deleted')
+    with SqlConn() as sql_conn:
+        sql_conn.test_connection()
+    logger.info('Connection Closed')
 
 
 def base_run_02():
-    sql_conn = SqlConn()
-    sql_conn.verify_connection()
-    sql_conn.test_query(query='SELECT 1')
-    sql_conn.test_query('SELECT 1')
+    with SqlConn() as sql_conn:
+        sql_conn.verify_connection()
+        sql_conn.test_query(query='SELECT 1')
+        sql_conn.test_query('SELECT 1')
 
 
 def base_run_03():
-    sql_conn = SqlConn()
-    sql_conn.verify_connection()
-    sql_conn.test_temp_two_part('HelloTable')
-    del sql_conn
+    with SqlConn() as sql_conn:
+        sql_conn.verify_connection()
+        sql_conn.test_temp_two_part('HelloTable')
     logger.info('Base Run 03 Completed')
 
 def base_run_04():
-    sql_conn = SqlConn()
-    # sql_conn.test_pyodbc_tables()
-    sql_conn.test_pyodbc_tables('Person')
+    with SqlConn() as sql_conn:
+        # sql_conn.test_pyodbc_tables()
+        sql_conn.test_pyodbc_tables('Person')
 
 def base_run_05():
-    sql_conn = SqlConn()
-    sql_conn.test_pyodbc_columns(table_name='Person', schema='Person', catalog='AdventureWorks2022')
+    with SqlConn() as sql_conn:
+        sql_conn.test_pyodbc_columns(table_name='Person', schema='Person', catalog='AdventureWorks2022')
 
 def base_run_06():
-    sql_conn = SqlConn()
-    sql_conn.test_pyodbc_columns(column='FirstName',table_name='Person', schema='Person', catalog='AdventureWorks2022')
+    with SqlConn() as sql_conn:
+        sql_conn.test_pyodbc_columns(column='FirstName',table_name='Person', schema='Person', catalog='AdventureWorks2022')
 
 def base_run_07():
-    sql_conn = SqlConn()
-    sql_conn.test_pyodbc_columns(column='Banana',table_name='Person', schema='Person', catalog='AdventureWorks2022')
+    with SqlConn() as sql_conn:
+        sql_conn.test_pyodbc_columns(column='Banana',table_name='Person', schema='Person', catalog='AdventureWorks2022')
 
 
 if __name__ == '__main__':
+    timsy_log.init_root_logger()
     base_run_07()
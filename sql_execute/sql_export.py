@@ -0,0 +1,303 @@
+"""
+Streaming export of query results to CSV, JSON Lines or a compact columnar binary file. The caller's thread
+fetches batches from the cursor while a writer thread encodes and writes them, connected by a bounded queue so
+memory stays at a few batches whatever the result size.
+"""
+
+import csv
+import gzip
+import io
+import json
+import os
+import queue
+import struct
+import sys
+import threading
+import time
+from array import array
+from dataclasses import dataclass
+from typing import Any, BinaryIO, Callable, Iterator
+
+from sql_columnar import Column, ColumnarResult, _ColumnBuilder
+
+FORMATS = ('csv', 'jsonl', 'columnar')
+COMPRESSIONS = ('gzip', 'zstd')
+DEFAULT_QUEUE_DEPTH = 4
+
+_COLUMNAR_MAGIC = b'TSYC\x01'
+_UINT32 = struct.Struct('<I')
+_END = object()
+
+
+@dataclass
+class ExportResult:
+    path: str
+    format: str
+    compression: str | None
+    rows: int = 0
+    batches: int = 0
+    bytes_encoded: int = 0
+    bytes_written: int = 0
+    elapsed: float = 0.0
+
+    @property
+    def rows_per_second(self) -> float:
+        return self.rows / self.elapsed if self.elapsed > 0 else 0.0
+
+    @property
+    def bytes_per_second(self) -> float:
+        """ Bytes written to disk per second, after compression. """
+        return self.bytes_written / self.elapsed if self.elapsed > 0 else 0.0
+
+
+def compression_for(path: str) -> str | None:
+    """ Compression implied by the file suffix: .gz for gzip, .zst for zstd. """
+    if path.endswith('.gz'):
+        return 'gzip'
+    if path.endswith('.zst'):
+        return 'zstd'
+    return None
+
+
+def _open_compressed(path: str, mode: str, compression: str | None) -> BinaryIO:
+    if compression is None:
+        return open(path, mode)
+    if compression == 'gzip':
+        # Level 6 is several times faster than the default 9 for a few percent larger output.
+        return gzip.open(path, mode, compresslevel=6) if mode == 'wb' else gzip.open(path, mode)
+    if compression == 'zstd':
+        try:
+            import zstandard
+        except ImportError as ie:
+            raise ImportError('zstandard is required for zstd compression') from ie
+        raw = open(path, mode)
+        if mode == 'wb':
+            return zstandard.ZstdCompressor().stream_writer(raw, closefd=True)
+        return zstandard.ZstdDecompressor().stream_reader(raw, closefd=True)
+    raise ValueError(f'Unknown compression {compression!r}, expected one of {", ".join(COMPRESSIONS)}')
+
+
+class _CsvEncoder:
+    def __init__(self, names: list[str]):
+        self._buffer = io.StringIO()
+        self._writer = csv.writer(self._buffer, lineterminator='\n')
+        self.header = self.encode_rows([names])
+
+    def encode_rows(self, rows) -> bytes:
+        self._writer.writerows(rows)
+        text = self._buffer.getvalue()
+        self._buffer.seek(0)
+        self._buffer.truncate()
+        return text.encode('utf-8')
+
+    def encode(self, batch: list) -> bytes:
+        return self.encode_rows(batch)
+
+
+class _JsonLinesEncoder:
+    header = b''
+
+    def __init__(self, names: list[str]):
+        self.names = names
+        self._dumps = json.JSONEncoder(default=str, ensure_ascii=False).encode
+
+    def encode(self, batch: list) -> bytes:
+        names = self.names
+        dumps = self._dumps
+        return ''.join([dumps(dict(zip(names, row))) + '\n' for row in batch]).encode('utf-8')
+
+
+class _ColumnarEncoder:
+    """
+    Layout: magic, uint32-prefixed JSON header, then one block per batch: uint32 row count followed by each
+    column as a kind byte, a null flag byte with an optional one-byte-per-row null mask, and the values.
+    Kinds q/d/b are packed arrays in the header's byte order, s is a dictionary of UTF-8 strings plus int32
+    codes; values that are neither numbers nor strings are written as their str(). A zero row count ends the file.
+    """
+
+    def __init__(self, names: list[str], type_codes: list[Any]):
+        self.names = names
+        self.type_codes = type_codes
+        header = json.dumps({'columns': [[n, getattr(t, '__name__', str(t))] for n, t in zip(names, type_codes)],
+                             'byteorder': sys.byteorder}).encode('utf-8')
+        self.header = _COLUMNAR_MAGIC + _UINT32.pack(len(header)) + header
+
+    def encode(self, batch: list) -> bytes:
+        builders = [_ColumnBuilder(n, t, dictionary_encode=True) for n, t in zip(self.names, self.type_codes)]
+        for builder, values in zip(builders, zip(*batch)):
+            builder.extend(values)
+        parts = [_UINT32.pack(len(batch))]
+        for builder in builders:
+            column = builder.build()
+            if isinstance(column.values, list):
+                # Packed type overflowed (e.g. an int beyond 64 bits): store it as text like other objects.
+                column = _encode_text(column)
+            if column.dictionary is not None:
+                kind = b's'
+                payload = _UINT32.pack(len(column.dictionary)) + b''.join(
+                    _UINT32.pack(len(e)) + e for e in (_text(v).encode('utf-8') for v in column.dictionary))
+                payload += column.values.tobytes()
+            else:
+                kind = column.values.typecode.encode('ascii')
+                payload = column.values.tobytes()
+            parts.append(kind)
+            if column.null_mask is not None:
+                parts.append(b'\x01')
+                parts.append(bytes(column.null_mask))
+            else:
+                parts.append(b'\x00')
+            parts.append(_UINT32.pack(len(payload)))
+            parts.append(payload)
+        return b''.join(parts)
+
+    @staticmethod
+    def footer() -> bytes:
+        return _UINT32.pack(0)
+
+
+def _text(value) -> str:
+    return value if isinstance(value, str) else str(value)
+
+
+def _encode_text(column: Column) -> Column:
+    codes: dict[str, int] = {}
+    encoded = array('i')
+    for v in column.values:
+        encoded.append(-1 if v is None else codes.setdefault(str(v), len(codes)))
+    return Column(name=column.name, type_code=column.type_code, values=encoded, null_mask=column.null_mask,
+                  dictionary=list(codes))
+
+
+def read_columnar(path: str, compression: str | None = None) -> Iterator[ColumnarResult]:
+    """ Read a file written with format='columnar', one ColumnarResult per exported batch. """
+    compression = compression if compression is not None else compression_for(path)
+    with _open_compressed(path, 'rb', compression) as stream:
+
+        def read(size: int) -> bytes:
+            data = stream.read(size)
+            while len(data) < size:
+                # Decompressing readers may return short reads.
+                more = stream.read(size - len(data))
+                if not more:
+                    raise ValueError(f'Truncated columnar file {path}')
+                data += more
+            return data
+
+        if read(len(_COLUMNAR_MAGIC)) != _COLUMNAR_MAGIC:
+            raise ValueError(f'{path} is not a columnar export')
+        header = json.loads(read(_UINT32.unpack(read(4))[0]))
+        swap = header['byteorder'] != sys.byteorder
+        while rows := _UINT32.unpack(read(4))[0]:
+            columns = {}
+            for name, type_name in header['columns']:
+                kind = read(1).decode('ascii')
+                null_mask = bytearray(read(rows)) if read(1) == b'\x01' else None
+                payload = memoryview(read(_UINT32.unpack(read(4))[0]))
+                dictionary = None
+                if kind == 's':
+                    count, offset = _UINT32.unpack_from(payload)[0], 4
+                    dictionary = []
+                    for _ in range(count):
+                        size = _UINT32.unpack_from(payload, offset)[0]
+                        dictionary.append(str(payload[offset + 4:offset + 4 + size], 'utf-8'))
+                        offset += 4 + size
+                    kind, payload = 'i', payload[offset:]
+                values = array(kind)
+                values.frombytes(payload)
+                if swap:
+                    values.byteswap()
+                columns[name] = Column(name=name, type_code=type_name, values=values, null_mask=null_mask,
+                                       dictionary=dictionary)
+            yield ColumnarResult(columns=columns, row_count=rows)
+
+
+def _make_encoder(format: str, description) -> Any:
+    names = [d[0] for d in description]
+    if format == 'csv':
+        return _CsvEncoder(names)
+    if format == 'jsonl':
+        return _JsonLinesEncoder(names)
+    return _ColumnarEncoder(names, [d[1] for d in description])
+
+
+class _Writer(threading.Thread):
+    """ Consumer side of the pipeline: encodes queued batches and writes them out. """
+
+    def __init__(self, batches: queue.Queue, encoder, out: BinaryIO, result: ExportResult):
+        super().__init__(name='SqlExportWriter', daemon=True)
+        self.batches = batches
+        self.encoder = encoder
+        self.out = out
+        self.result = result
+        self.error: BaseException | None = None
+
+    def run(self):
+        try:
+            while (batch := self.batches.get()) is not _END:
+                data = self.encoder.encode(batch)
+                self.out.write(data)
+                self.result.bytes_encoded += len(data)
+        except BaseException as e:
+            self.error = e
+            # Keep draining so the producer never blocks on a full queue after a failure.
+            while self.batches.get() is not _END:
+                pass
+
+
+def export_cursor(cursor, path: str, format: str = 'csv', compression: str | None = None,
+                  batch_size: int = 10000, queue_depth: int = DEFAULT_QUEUE_DEPTH,
+                  on_progress: Callable[[ExportResult], Any] | None = None) -> ExportResult:
+    """
+    Stream the current result set of an executed cursor to path. The file is written under a temporary name
+    and renamed into place only once complete, so readers never see a partial export.
+    :param compression: gzip or zstd; inferred from a .gz or .zst suffix when None.
+    :param queue_depth: Batches allowed in flight between the fetching and the writing thread.
+    :param on_progress: Called from the fetching thread after every batch with the running totals.
+    """
+    if format not in FORMATS:
+        raise ValueError(f'Unknown export format {format!r}, expected one of {", ".join(FORMATS)}')
+    if batch_size < 1:
+        raise ValueError('batch_size must be at least 1')
+    if cursor.description is None:
+        raise ValueError('Query did not return a result set')
+    path = os.fspath(path)
+    compression = compression if compression is not None else compression_for(path)
+    encoder = _make_encoder(format, cursor.description)
+    result = ExportResult(path=path, format=format, compression=compression)
+    partial = f'{path}.part'
+    started = time.perf_counter()
+    batches: queue.Queue = queue.Queue(maxsize=max(1, queue_depth))
+    out = _open_compressed(partial, 'wb', compression)
+    writer = _Writer(batches, encoder, out, result)
+    try:
+        out.write(encoder.header)
+        result.bytes_encoded += len(encoder.header)
+        writer.start()
+        try:
+            cursor.arraysize = batch_size
+            while writer.error is None and (batch := cursor.fetchmany(batch_size)):
+                batches.put(batch)
+                result.rows += len(batch)
+                result.batches += 1
+                if on_progress is not None:
+                    on_progress(result)
+        finally:
+            batches.put(_END)
+            writer.join()
+        if writer.error is not None:
+            raise writer.error
+        if isinstance(encoder, _ColumnarEncoder):
+            out.write(encoder.footer())
+            result.bytes_encoded += 4
+        out.close()
+        os.replace(partial, path)
+    except BaseException:
+        out.close()
+        try:
+            os.remove(partial)
+        except OSError:
+            pass
+        raise
+    result.bytes_written = os.path.getsize(path)
+    result.elapsed = time.perf_counter() - started
+    return result
@@ -0,0 +1,385 @@
+"""
+Scatter-gather: run one query against many servers/databases at once and merge the results into a single
+stream of batches tagged with the target they came from, in arrival order, so fast databases are not held up by
+the slowest. Each target runs on its own pooled connection; a failure or timeout is reported for that target
+without affecting the others.
+"""
+
+import queue
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Iterable, Iterator
+
+import timsy_log
+from sql_conn import DEFAULT_BATCH_SIZE, SqlConn, _borrowed_cursor
+from sql_pool import SqlConnPool
+from timsy_config import Config
+
+logger = timsy_log.getLogger('SqlFanOut')
+
+DEFAULT_MAX_CONCURRENCY = 8
+_LIST_SEPARATOR = re.compile(r'[,\s]+')
+
+
+class TargetTimeoutError(TimeoutError):
+    pass
+
+
+class FanOutCancelled(Exception):
+    """ Recorded for targets that had not finished when the stream was closed early. """
+
+
+@dataclass(frozen=True)
+class Target:
+    """ One server/database to query. Unset fields fall back to the DEFAULT section of the config. """
+    name: str
+    server: str | None = None
+    database: str | None = None
+    trusted_connection: str | None = None
+
+    def config_override(self) -> dict:
+        return {k: v for k, v in (('server', self.server), ('database', self.database),
+                                  ('trusted_connection', self.trusted_connection)) if v is not None}
+
+
+def as_target(target: 'Target | dict | str') -> Target:
+    """ Target from a Target, a config_override style dict, or a 'server/database' or 'database' string. """
+    if isinstance(target, Target):
+        return target
+    if isinstance(target, dict):
+        server, database = target.get('server'), target.get('database')
+        name = target.get('name') or '/'.join(p for p in (server, database) if p)
+        return Target(name=name, server=server, database=database,
+                      trusted_connection=target.get('trusted_connection'))
+    server, _, database = target.rpartition('/')
+    return Target(name=target, server=server or None, database=database)
+
+
+def targets_from_config(config: Config, section: str, key: str = 'targets') -> list[Target]:
+    """
+    Targets listed under key in section, comma or newline separated. A name that is also a section reads that
+    section's server, database and trusted_connection (falling back to DEFAULT); any other name is parsed like
+    a 'server/database' or 'database' string, e.g.
+        [Tenants]
+        targets = TenantA, TenantB, reporting
+        [reporting]
+        server = report-sql01
+        database = Reporting
+    """
+    listed = config.get(section, key)
+    if listed is None:
+        raise ValueError(f'No {key} listed in config section {section}')
+    sections = set(config.get_sections())
+    targets = []
+    for name in (n for n in _LIST_SEPARATOR.split(listed) if n):
+        if name in sections:
+            targets.append(Target(name=name, server=config.get(name, 'server'),
+                                  database=config.get(name, 'database'),
+                                  trusted_connection=config.get(name, 'trusted_connection')))
+        else:
+            targets.append(as_target(name))
+    return targets
+
+
+@dataclass
+class TargetBatch:
+    target: Target
+    rows: list
+
+
+@dataclass
+class TargetResult:
+    target: Target
+    ok: bool = False
+    row_count: int = 0
+    batches: int = 0
+    elapsed: float = 0.0
+    timed_out: bool = False
+    error: str | None = None
+    rows: list | None = None
+
+
+@dataclass
+class FanOutReport:
+    results: list[TargetResult] = field(default_factory=list)
+    wall_clock: float = 0.0
+
+    @property
+    def succeeded(self) -> list[TargetResult]:
+        return [r for r in self.results if r.ok]
+
+    @property
+    def failed(self) -> list[TargetResult]:
+        return [r for r in self.results if not r.ok]
+
+    @property
+    def timed_out(self) -> list[TargetResult]:
+        return [r for r in self.results if r.timed_out]
+
+    @property
+    def row_count(self) -> int:
+        return sum(r.row_count for r in self.results)
+
+    @property
+    def total_duration(self) -> float:
+        return sum(r.elapsed for r in self.results)
+
+    @property
+    def speedup(self) -> float:
+        return self.total_duration / self.wall_clock if self.wall_clock > 0 else 0.0
+
+    def summary(self) -> str:
+        return (f'{len(self.succeeded)} succeeded, {len(self.failed)} failed ({len(self.timed_out)} timed out), '
+                f'{self.row_count} rows; wall clock {self.wall_clock:.3f}s vs {self.total_duration:.3f}s summed '
+                f'({self.speedup:.2f}x speedup)')
+
+
+class _Watchdog:
+    """ Cancels the target's running statement from another thread once its deadline passes. """
+
+    def __init__(self, timeout: float | None):
+        self._lock = threading.Lock()
+        self._cursor = None
+        self.expired = False
+        self.deadline = time.monotonic() + timeout if timeout is not None else None
+        self._timer = threading.Timer(timeout, self._expire) if timeout is not None else None
+        if self._timer is not None:
+            self._timer.daemon = True
+            self._timer.start()
+
+    def attach(self, cursor):
+        with self._lock:
+            self._cursor = cursor
+            expired = self.expired
+        if expired:
+            self._cancel(cursor)
+
+    def _expire(self):
+        with self._lock:
+            self.expired = True
+            cursor = self._cursor
+        if cursor is not None:
+            self._cancel(cursor)
+
+    @staticmethod
+    def _cancel(cursor):
+        try:
+            cursor.cancel()
+        except Exception as e:
+            logger.warning(f'Cursor cancel failed: {type(e).__name__}: {e}')
+
+    def stop(self):
+        if self._timer is not None:
+            self._timer.cancel()
+        with self._lock:
+            self._cursor = None
+
+
+class FanOutStream:
+    """
+    Iterator of TargetBatch in arrival order. report holds a TargetResult per target once it has finished;
+    it is complete when iteration ends. Closing early cancels running statements and records the targets that
+    had not finished as failed with FanOutCancelled.
+    """
+
+    def __init__(self, fan_out: 'FanOut', query: str, params, batch_size: int, keep_rows: bool):
+        self.report = FanOutReport()
+        self._fan_out = fan_out
+        self._query = query
+        self._params = params
+        self._batch_size = batch_size
+        self._keep_rows = keep_rows
+        self._pending = len(fan_out.targets)
+        self._items: queue.Queue = queue.Queue(maxsize=max(1, fan_out.queue_depth))
+        self._stop = threading.Event()
+        self._watchdogs: set[_Watchdog] = set()
+        self._lock = threading.Lock()
+        self._started = time.perf_counter()
+        self._executor = ThreadPoolExecutor(max_workers=max(1, min(fan_out.max_concurrency, self._pending)),
+                                            thread_name_prefix='SqlFanOut')
+        for target in fan_out.targets:
+            self._executor.submit(self._run_target, target)
+
+    def __iter__(self) -> Iterator[TargetBatch]:
+        return self
+
+    def __next__(self) -> TargetBatch:
+        while self._pending:
+            item = self._items.get()
+            if isinstance(item, TargetResult):
+                self._finish(item)
+                continue
+            return item
+        self._shutdown()
+        raise StopIteration
+
+    def __enter__(self) -> 'FanOutStream':
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def _finish(self, result: TargetResult):
+        self._pending -= 1
+        self.report.results.append(result)
+        if result.ok:
+            logger.info(f'{result.target.name}: {result.row_count} rows in {result.elapsed:.3f}s')
+        else:
+            logger.error(f'{result.target.name} failed in {result.elapsed:.3f}s: {result.error}')
+
+    def _put(self, item, watchdog: _Watchdog | None = None) -> bool:
+        """
+        Hand item to the consumer, giving up once the stream is closed. With a watchdog, waiting for a slow
+        consumer is bounded by the target's deadline too, and raises TargetTimeoutError once it passes.
+        """
+        while not self._stop.is_set():
+            wait = 0.05
+            if watchdog is not None and watchdog.deadline is not None:
+                remaining = watchdog.deadline - time.monotonic()
+                if remaining <= 0 or watchdog.expired:
+                    raise TargetTimeoutError(f'Exceeded {self._fan_out.timeout}s waiting for the consumer')
+                wait = min(wait, remaining)
+            try:
+                self._items.put(item, timeout=wait)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _run_target(self, target: Target):
+        result = TargetResult(target=target, rows=[] if self._keep_rows else None)
+        fan_out = self._fan_out
+        started = time.perf_counter()
+        watchdog = _Watchdog(fan_out.timeout)
+        with self._lock:
+            self._watchdogs.add(watchdog)
+        try:
+            if self._stop.is_set():
+                raise FanOutCancelled('Stream closed before the target started')
+            sql_conn = SqlConn(config=fan_out.config, config_override=target.config_override(), pool=fan_out.pool)
+            with _borrowed_cursor(sql_conn, 'fan_out', timeout=fan_out.timeout) as cursor:
+                watchdog.attach(cursor)
+                cursor.arraysize = self._batch_size
+                if self._params is None:
+                    cursor.execute(self._query)
+                else:
+                    cursor.execute(self._query, self._params)
+                while True:
+                    if self._stop.is_set():
+                        raise FanOutCancelled('Stream closed while the target was running')
+                    if watchdog.expired:
+                        raise TargetTimeoutError(f'Exceeded {fan_out.timeout}s and was cancelled')
+                    batch = cursor.fetchmany(self._batch_size) if cursor.description is not None else None
+                    if not batch:
+                        break
+                    result.row_count += len(batch)
+                    result.batches += 1
+                    if self._keep_rows:
+                        result.rows.extend(batch)
+                    elif not self._put(TargetBatch(target=target, rows=batch), watchdog):
+                        raise FanOutCancelled('Stream closed while the target was running')
+            if watchdog.expired:
+                raise TargetTimeoutError(f'Exceeded {fan_out.timeout}s and was cancelled')
+            result.ok = True
+        except Exception as e:
+            if self._stop.is_set():
+                # close() cancels running statements; whatever the driver raised, the cause is the close.
+                if not isinstance(e, FanOutCancelled):
+                    e = FanOutCancelled('Stream closed while the target was running')
+            elif watchdog.expired and not isinstance(e, TargetTimeoutError):
+                # The driver reports the cancel as an operation-cancelled error; name the cause instead.
+                e = TargetTimeoutError(f'Exceeded {fan_out.timeout}s and was cancelled ({type(e).__name__}: {e})')
+            result.timed_out = isinstance(e, TimeoutError)
+            result.error = f'{type(e).__name__}: {e}'
+        finally:
+            watchdog.stop()
+            with self._lock:
+                self._watchdogs.discard(watchdog)
+        result.elapsed = time.perf_counter() - started
+        if not self._put(result):
+            with self._lock:
+                self.report.results.append(result)
+
+    def _shutdown(self):
+        if self.report.wall_clock:
+            return
+        self._executor.shutdown(wait=True)
+        self.report.wall_clock = time.perf_counter() - self._started
+        order = {target: index for index, target in enumerate(self._fan_out.targets)}
+        self.report.results.sort(key=lambda r: order[r.target])
+
+    def close(self):
+        if not self._pending:
+            return
+        self._stop.set()
+        with self._lock:
+            watchdogs = list(self._watchdogs)
+        for watchdog in watchdogs:
+            watchdog._expire()
+        self._executor.shutdown(wait=True)
+        # Collect outcomes already queued; workers that could not queue theirs appended to the report directly.
+        while True:
+            try:
+                item = self._items.get_nowait()
+            except queue.Empty:
+                break
+            if isinstance(item, TargetResult):
+                self.report.results.append(item)
+        self._pending = 0
+        self._shutdown()
+
+
+class FanOut:
+    """
+    Run the same query against every target concurrently, at most max_concurrency at a time.
+    :param targets: Targets, config_override style dicts, or 'server/database' / 'database' strings.
+    :param timeout: Seconds each target may take, from connection checkout to the last row; the statement is
+        cancelled on the server when it runs over. Time spent waiting for a slow consumer counts too.
+    :param queue_depth: Batches buffered between the workers and the consumer.
+    """
+
+    def __init__(self, targets: Iterable['Target | dict | str'], max_concurrency: int = DEFAULT_MAX_CONCURRENCY,
+                 timeout: float | None = None, config: Config | None = None, pool: SqlConnPool | None = None,
+                 queue_depth: int = 64):
+        if max_concurrency < 1:
+            raise ValueError('max_concurrency must be at least 1')
+        self.targets = [as_target(t) for t in targets]
+        names = [t.name for t in self.targets]
+        if len(set(names)) != len(names):
+            raise ValueError('Target names must be unique')
+        self.max_concurrency = max_concurrency
+        self.timeout = timeout
+        self.config = config if config is not None else Config()
+        self.pool = pool
+        self.queue_depth = queue_depth
+
+    @classmethod
+    def from_config(cls, section: str, config: Config | None = None, **kwargs) -> 'FanOut':
+        """ FanOut over targets_from_config(config, section); maxConcurrency and timeout are read from it too. """
+        config = config if config is not None else Config()
+        kwargs.setdefault('max_concurrency', config.get_int(section, 'maxConcurrency') or DEFAULT_MAX_CONCURRENCY)
+        kwargs.setdefault('timeout', config.get_float(section, 'timeout'))
+        return cls(targets_from_config(config, section), config=config, **kwargs)
+
+    def stream(self, query: str, params: list | tuple | None = None,
+               batch_size: int = DEFAULT_BATCH_SIZE) -> FanOutStream:
+        """
+        Start the query on every target and return the merged stream of TargetBatch. Use it as a context
+        manager, or call close(), when a consumer may stop early, so running statements are cancelled.
+        """
+        if batch_size < 1:
+            raise ValueError('batch_size must be at least 1')
+        return FanOutStream(self, query, params, batch_size, keep_rows=False)
+
+    def fetch(self, query: str, params: list | tuple | None = None,
+              batch_size: int = DEFAULT_BATCH_SIZE) -> FanOutReport:
+        """ Run the query everywhere and return each target's rows in TargetResult.rows. """
+        with FanOutStream(self, query, params, batch_size, keep_rows=True) as results:
+            for _ in results:
+                pass
+        logger.info(f'Fan-out over {len(self.targets)} targets: {results.report.summary()}')
+        return results.report
+
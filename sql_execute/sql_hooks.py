@@ -0,0 +1,304 @@
+""" Per-query instrumentation: hook registry, an instrumented cursor proxy and built-in collectors. """
+
+import bisect
+import functools
+import re
+import sys
+import threading
+import time
+from dataclasses import dataclass, field
+
+import timsy_log
+from sql_prepared import _normalize
+
+logger = timsy_log.getLogger('SqlHooks')
+
+_LITERAL = re.compile(r"N?'[^']*(?:''[^']*)*'|\b0x[0-9A-Fa-f]+\b|(?<![\w\]])-?\d+(?:\.\d+)?(?:[eE][-+]?\d+)?\b")
+_IN_LIST = re.compile(r'\(\s*\?(?:\s*,\s*\?)+\s*\)')
+
+
+@functools.lru_cache(maxsize=4096)
+def fingerprint(sql: str) -> str:
+    """ Query shape with literals replaced by ? and whitespace collapsed, so executions group together. """
+    try:
+        normalized, _ = _normalize(sql)
+    except Exception:
+        normalized = ' '.join(sql.split())
+    return _IN_LIST.sub('(?)', _LITERAL.sub('?', normalized))
+
+
+@dataclass
+class QueryEvent:
+    """ One statement executed on an instrumented cursor. Times are time.perf_counter() values. """
+    operation: str
+    fingerprint: str
+    started_at: float
+    executed_at: float | None = None
+    fetched_at: float | None = None
+    rows: int = 0
+    bytes_estimate: int = 0
+    error: str | None = None
+
+    @property
+    def execute_time(self) -> float:
+        return (self.executed_at or self.started_at) - self.started_at
+
+    @property
+    def fetch_time(self) -> float:
+        return (self.fetched_at or self.executed_at or self.started_at) - (self.executed_at or self.started_at)
+
+    @property
+    def duration(self) -> float:
+        return (self.fetched_at or self.executed_at or self.started_at) - self.started_at
+
+
+@dataclass
+class CursorEvent:
+    operation: str
+    opened_at: float
+    closed_at: float | None = None
+    statements: list[QueryEvent] = field(default_factory=list)
+
+
+class QueryHook:
+    """ Base class for instrumentation hooks. Override the callbacks you need; exceptions are logged and ignored. """
+
+    def on_cursor_open(self, cursor_event: CursorEvent):
+        pass
+
+    def on_execute_start(self, event: QueryEvent):
+        pass
+
+    def on_execute_end(self, event: QueryEvent):
+        pass
+
+    def on_fetch_end(self, event: QueryEvent):
+        pass
+
+    def on_close(self, cursor_event: CursorEvent):
+        pass
+
+
+_hooks: tuple[QueryHook, ...] = ()
+_hooks_lock = threading.Lock()
+
+
+def register_hook(hook: QueryHook) -> QueryHook:
+    global _hooks
+    with _hooks_lock:
+        _hooks = _hooks + (hook,)
+    return hook
+
+
+def unregister_hook(hook: QueryHook):
+    global _hooks
+    with _hooks_lock:
+        _hooks = tuple(h for h in _hooks if h is not hook)
+
+
+def registered_hooks() -> tuple[QueryHook, ...]:
+    return _hooks
+
+
+def _emit(hooks: tuple[QueryHook, ...], callback: str, event):
+    for hook in hooks:
+        try:
+            getattr(hook, callback)(event)
+        except Exception as e:
+            logger.warning(f'{type(hook).__name__}.{callback} failed: {type(e).__name__}: {e}')
+
+
+def _estimate_bytes(rows) -> int:
+    # Size the first row and extrapolate; sizing every cell would cost more than the fetch itself.
+    first = rows[0]
+    return len(rows) * (sys.getsizeof(first) + sum(sys.getsizeof(v) for v in first))
+
+
+class InstrumentedCursor:
+    """ Cursor proxy that reports execute/fetch timings and row counts to the registered hooks. """
+    __slots__ = ('_cursor', '_hooks', '_cursor_event', '_current')
+
+    def __init__(self, cursor, operation: str, hooks: tuple[QueryHook, ...]):
+        object.__setattr__(self, '_cursor', cursor)
+        object.__setattr__(self, '_hooks', hooks)
+        object.__setattr__(self, '_cursor_event', CursorEvent(operation=operation, opened_at=time.perf_counter()))
+        object.__setattr__(self, '_current', None)
+        _emit(hooks, 'on_cursor_open', self._cursor_event)
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+    def __setattr__(self, name, value):
+        setattr(self._cursor, name, value)
+
+    def __iter__(self):
+        while (row := self.fetchone()) is not None:
+            yield row
+
+    def _finish_statement(self):
+        event = self._current
+        if event is not None:
+            object.__setattr__(self, '_current', None)
+            if event.fetched_at is None:
+                event.fetched_at = event.executed_at
+            _emit(self._hooks, 'on_fetch_end', event)
+
+    def _start_statement(self, sql: str) -> QueryEvent:
+        self._finish_statement()
+        event = QueryEvent(operation=self._cursor_event.operation, fingerprint=fingerprint(sql),
+                           started_at=time.perf_counter())
+        self._cursor_event.statements.append(event)
+        object.__setattr__(self, '_current', event)
+        _emit(self._hooks, 'on_execute_start', event)
+        return event
+
+    def _call(self, event: QueryEvent, method: str, *args, **kwargs):
+        try:
+            result = getattr(self._cursor, method)(*args, **kwargs)
+        except Exception as e:
+            event.executed_at = time.perf_counter()
+            event.error = f'{type(e).__name__}: {e}'
+            _emit(self._hooks, 'on_execute_end', event)
+            self._finish_statement()
+            raise
+        event.executed_at = time.perf_counter()
+        _emit(self._hooks, 'on_execute_end', event)
+        return self if result is self._cursor else result
+
+    def _run(self, method: str, sql: str, *args):
+        return self._call(self._start_statement(sql), method, sql, *args)
+
+    def execute(self, sql: str, *params):
+        return self._run('execute', sql, *params)
+
+    def executemany(self, sql: str, seq_of_params):
+        return self._run('executemany', sql, seq_of_params)
+
+    def _catalog(self, method: str, **kwargs):
+        return self._call(self._start_statement(f'{{{method}}}'), method, **kwargs)
+
+    def tables(self, **kwargs):
+        return self._catalog('tables', **kwargs)
+
+    def columns(self, **kwargs):
+        return self._catalog('columns', **kwargs)
+
+    def _record(self, rows, exhausted: bool):
+        event = self._current
+        if event is None:
+            return
+        if rows:
+            event.rows += len(rows)
+            event.bytes_estimate += _estimate_bytes(rows)
+        event.fetched_at = time.perf_counter()
+        if exhausted:
+            self._finish_statement()
+
+    def fetchone(self):
+        row = self._cursor.fetchone()
+        self._record([row] if row is not None else [], row is None)
+        return row
+
+    def fetchmany(self, size: int | None = None):
+        rows = self._cursor.fetchmany(size) if size is not None else self._cursor.fetchmany()
+        self._record(rows, not rows)
+        return rows
+
+    def fetchall(self):
+        rows = self._cursor.fetchall()
+        self._record(rows, True)
+        return rows
+
+    def nextset(self):
+        self._finish_statement()
+        return self._cursor.nextset()
+
+    def release(self):
+        """ Report the cursor closed without closing the underlying cursor, e.g. a cached prepared cursor. """
+        self._finish_statement()
+        self._cursor_event.closed_at = time.perf_counter()
+        _emit(self._hooks, 'on_close', self._cursor_event)
+
+    def close(self):
+        try:
+            self.release()
+        finally:
+            self._cursor.close()
+
+
+def instrument(cursor, operation: str):
+    """ Wrap cursor when hooks are registered; otherwise return it untouched so the hot path pays nothing. """
+    hooks = _hooks
+    return InstrumentedCursor(cursor, operation, hooks) if hooks else cursor
+
+
+# Bucket bounds grow by 2**(1/4) from 10 microseconds to ~170 seconds, so percentiles are within ~19%.
+_BUCKET_BOUNDS = tuple(1e-5 * 2 ** (i / 4) for i in range(97))
+
+
+@dataclass
+class Histogram:
+    """ Fixed-bucket histogram of durations in seconds, cheap enough to update on every statement. """
+    counts: list[int] = field(default_factory=lambda: [0] * (len(_BUCKET_BOUNDS) + 1))
+    count: int = 0
+    total: float = 0.0
+    max: float = 0.0
+    rows: int = 0
+
+    def add(self, value: float, rows: int):
+        self.counts[bisect.bisect_left(_BUCKET_BOUNDS, value)] += 1
+        self.count += 1
+        self.total += value
+        self.rows += rows
+        self.max = max(self.max, value)
+
+    def percentile(self, p: float) -> float:
+        if not self.count:
+            return 0.0
+        rank = p / 100 * self.count
+        seen = 0
+        for index, bucket_count in enumerate(self.counts):
+            seen += bucket_count
+            if seen >= rank and bucket_count:
+                return min(_BUCKET_BOUNDS[index] if index < len(_BUCKET_BOUNDS) else self.max, self.max)
+        return self.max
+
+
+class LatencyHistogram(QueryHook):
+    """ In-process latency histogram per query fingerprint, reported as p50/p95/p99. """
+
+    def __init__(self):
+        self._histograms: dict[str, Histogram] = {}
+        self._lock = threading.Lock()
+
+    def on_fetch_end(self, event: QueryEvent):
+        with self._lock:
+            histogram = self._histograms.get(event.fingerprint)
+            if histogram is None:
+                histogram = self._histograms[event.fingerprint] = Histogram()
+            histogram.add(event.duration, event.rows)
+
+    def summary(self) -> dict[str, dict[str, float]]:
+        with self._lock:
+            return {fp: {'count': h.count, 'rows': h.rows, 'mean': h.total / h.count, 'max': h.max,
+                         'p50': h.percentile(50), 'p95': h.percentile(95), 'p99': h.percentile(99)}
+                    for fp, h in self._histograms.items()}
+
+    def reset(self):
+        with self._lock:
+            self._histograms.clear()
+
+
+class SlowQueryLog(QueryHook):
+    """ Log statements slower than threshold seconds through timsy_log. """
+
+    def __init__(self, threshold: float = 1.0, logger_name: str = 'SlowQuery'):
+        self.threshold = threshold
+        self.logger = timsy_log.getLogger(logger_name)
+
+    def on_fetch_end(self, event: QueryEvent):
+        if event.duration >= self.threshold:
+            self.logger.warning(f'Slow query {event.duration:.3f}s (execute {event.execute_time:.3f}s, '
+                                f'fetch {event.fetch_time:.3f}s, {event.rows} rows, ~{event.bytes_estimate} bytes) '
+                                f'in {event.operation}: {event.fingerprint}'
+                                + (f' failed with {event.error}' if event.error else ''))
@@ -0,0 +1,167 @@
+"""
+Optional lifecycle tracking of open connections and cursors: creation stack, age and owning thread of each,
+a live count, and warnings for anything held longer than a threshold. Off by default; when on, tracking a
+resource costs a tuple and a dict insert, plus a short walk up the caller's frames for the sampled ones.
+"""
+
+import itertools
+import sys
+import threading
+import time
+from dataclasses import dataclass
+
+import timsy_log
+
+logger = timsy_log.getLogger('SqlLeaks')
+
+STACK_DEPTH = 8
+DEFAULT_STACK_SAMPLE_RATE = 16
+
+
+@dataclass
+class TrackedResource:
+    kind: str
+    description: str
+    created_at: float
+    thread_name: str
+    stack: tuple = ()
+    warned: bool = False
+
+    @property
+    def age(self) -> float:
+        return time.monotonic() - self.created_at
+
+    def format_stack(self) -> str:
+        return '\n'.join(f'  File "{code.co_filename}", line {lineno}, in {code.co_name}'
+                         for code, lineno in reversed(self.stack))
+
+
+def _caller_stack(skip: int, depth: int) -> tuple:
+    # Keep (code, line) pairs only; holding frame objects would keep their locals alive.
+    frame = sys._getframe(skip + 1)
+    stack = []
+    for _ in range(depth):
+        if frame is None:
+            break
+        stack.append((frame.f_code, frame.f_lineno))
+        frame = frame.f_back
+    return tuple(stack)
+
+
+class ResourceTracker:
+    """
+    Registry of open resources. track() returns a token to pass to untrack(), or None while disabled.
+    :param warn_after: Seconds a resource may stay open before check() warns about it, once per resource.
+    :param capture_stacks: Record the creating call stack, STACK_DEPTH frames deep.
+    :param stack_sample_rate: Record the stack of one in every stack_sample_rate resources; the walk up the
+        frames is most of the cost of tracking, and a leak that keeps happening is soon caught with its stack.
+        1 records every stack.
+    """
+
+    def __init__(self, warn_after: float = 60.0, capture_stacks: bool = True,
+                 stack_sample_rate: int = DEFAULT_STACK_SAMPLE_RATE):
+        self.enabled = False
+        self.warn_after = warn_after
+        self.capture_stacks = capture_stacks
+        self.stack_sample_rate = stack_sample_rate
+        # token -> (kind, description, created_at, thread_name, stack); TrackedResource is built only when read.
+        self._resources: dict[int, tuple] = {}
+        self._warned: set[int] = set()
+        self._tokens = itertools.count(1)
+        self._monitor: threading.Thread | None = None
+        self._monitor_stop = threading.Event()
+
+    def track(self, kind: str, description: str = '') -> int | None:
+        if not self.enabled:
+            return None
+        token = next(self._tokens)
+        sampled = self.capture_stacks and token % self.stack_sample_rate == 0
+        self._resources[token] = (kind, description, time.monotonic(), threading.current_thread().name,
+                                  _caller_stack(1, STACK_DEPTH) if sampled else ())
+        return token
+
+    def untrack(self, token: int | None):
+        if token is not None:
+            self._resources.pop(token, None)
+            if self._warned:
+                self._warned.discard(token)
+
+    def live_count(self, kind: str | None = None) -> int:
+        if kind is None:
+            return len(self._resources)
+        return sum(1 for r in list(self._resources.values()) if r[0] == kind)
+
+    def _held_since(self, older_than: float) -> list[tuple[int, TrackedResource]]:
+        now = time.monotonic()
+        held = [(token, TrackedResource(kind, description, created_at, thread_name, stack, token in self._warned))
+                for token, (kind, description, created_at, thread_name, stack) in list(self._resources.items())
+                if now - created_at >= older_than]
+        return sorted(held, key=lambda item: item[1].created_at)
+
+    def outstanding(self, older_than: float = 0.0) -> list[TrackedResource]:
+        """ Open resources at least older_than seconds old, oldest first. """
+        return [resource for _, resource in self._held_since(older_than)]
+
+    def check(self) -> list[TrackedResource]:
+        """ Warn about resources held past warn_after that were not reported before. Returns them. """
+        held = [(token, r) for token, r in self._held_since(self.warn_after) if not r.warned]
+        for token, resource in held:
+            self._warned.add(token)
+            resource.warned = True
+            opened_at = (f'opened at:\n{resource.format_stack()}' if resource.stack
+                         else 'creation stack not sampled')
+            logger.warning(f'{resource.kind} {resource.description} held for {resource.age:.1f}s by thread '
+                           f'{resource.thread_name}, {opened_at}')
+        return [resource for _, resource in held]
+
+    def start_monitor(self, interval: float = 10.0):
+        """ Run check() every interval seconds on a daemon thread. """
+        self.stop_monitor()
+        self._monitor_stop.clear()
+
+        def run():
+            while not self._monitor_stop.wait(interval):
+                self.check()
+
+        self._monitor = threading.Thread(target=run, name='SqlLeakMonitor', daemon=True)
+        self._monitor.start()
+
+    def stop_monitor(self):
+        if self._monitor is not None:
+            self._monitor_stop.set()
+            self._monitor.join()
+            self._monitor = None
+
+    def clear(self):
+        self._resources.clear()
+        self._warned.clear()
+
+
+tracker = ResourceTracker()
+
+
+def enable_leak_tracking(warn_after: float = 60.0, capture_stacks: bool = True,
+                         monitor_interval: float | None = None, stack_sample_rate: int = DEFAULT_STACK_SAMPLE_RATE):
+    """
+    Start tracking connections and cursors opened from now on. monitor_interval starts the warning thread.
+    Pass stack_sample_rate=1 while hunting a specific leak to record every creation stack.
+    """
+    if stack_sample_rate < 1:
+        raise ValueError('stack_sample_rate must be at least 1')
+    tracker.warn_after = warn_after
+    tracker.capture_stacks = capture_stacks
+    tracker.stack_sample_rate = stack_sample_rate
+    tracker.enabled = True
+    if monitor_interval is not None:
+        tracker.start_monitor(monitor_interval)
+
+
+def disable_leak_tracking():
+    tracker.enabled = False
+    tracker.stop_monitor()
+    tracker.clear()
+
+
+def live_resources(kind: str | None = None) -> int:
+    """ Number of tracked resources currently open, optionally only of one kind (connection or cursor). """
+    return tracker.live_count(kind)
@@ -0,0 +1,230 @@
+"""
+Statement pipelining: queue parameterized statements and send them to the server as one batch, then walk the
+batch's results with nextset(), so n statements cost one round trip instead of n. A tiny marker result set
+after every statement tells which statement each result and any error belongs to.
+"""
+
+import time
+from dataclasses import dataclass, field
+from typing import Any, Iterable, Iterator, Mapping, Sequence
+
+import timsy_log
+from sql_prepared import normalize_query
+
+logger = timsy_log.getLogger('SqlPipeline')
+
+# SQL Server accepts at most 2100 parameters per request; larger pipelines are split into several batches.
+MAX_BATCH_PARAMETERS = 2100
+MARKER_COLUMN = '__pipeline_statement'
+
+
+class PipelineError(Exception):
+    """ A pipelined statement failed. result has every statement's outcome; the failed one carries the error. """
+
+    def __init__(self, result: 'PipelineResult'):
+        failed = result.failed
+        super().__init__(f'Statement {failed.index} failed: {failed.error}\n  {failed.sql[:200]}')
+        self.result = result
+        self.index = failed.index
+
+
+@dataclass
+class StatementResult:
+    index: int
+    sql: str
+    params: tuple = ()
+    executed: bool = False
+    rowcount: int = -1
+    columns: list[tuple[str, ...]] = field(default_factory=list)
+    result_sets: list[list] = field(default_factory=list)
+    error: str | None = None
+
+    @property
+    def ok(self) -> bool:
+        return self.executed and self.error is None
+
+    @property
+    def rows(self) -> list:
+        """ Rows of the statement's first result set, or an empty list. """
+        return self.result_sets[0] if self.result_sets else []
+
+
+@dataclass
+class PipelineResult:
+    statements: list[StatementResult] = field(default_factory=list)
+    round_trips: int = 0
+    elapsed: float = 0.0
+
+    @property
+    def ok(self) -> bool:
+        return all(s.ok for s in self.statements)
+
+    @property
+    def failed(self) -> StatementResult | None:
+        return next((s for s in self.statements if s.error is not None), None)
+
+    def __getitem__(self, index: int) -> StatementResult:
+        return self.statements[index]
+
+    def __iter__(self) -> Iterator[StatementResult]:
+        return iter(self.statements)
+
+    def __len__(self) -> int:
+        return len(self.statements)
+
+
+class StatementPipeline:
+    """
+    Statements queued with add() and sent together by run(), in order, on one connection.
+    Statements that must start their own batch in SQL Server (CREATE PROCEDURE, VIEW, FUNCTION, TRIGGER) can't
+    be pipelined; run those with execute_batches.
+    """
+
+    def __init__(self, sql_conn=None):
+        self.sql_conn = sql_conn
+        self.statements: list[tuple[str, tuple]] = []
+
+    def add(self, query: str, params: Sequence | Mapping[str, Any] | None = None) -> int:
+        """ Queue a statement with ? or :name placeholders. Returns its index in the result. """
+        normalized, bound = normalize_query(query, params)
+        normalized = normalized.rstrip(';').rstrip()
+        if not normalized:
+            raise ValueError('Cannot pipeline an empty statement')
+        if len(bound) > MAX_BATCH_PARAMETERS - 1:
+            raise ValueError(f'A statement may bind at most {MAX_BATCH_PARAMETERS - 1} parameters')
+        self.statements.append((normalized, bound))
+        return len(self.statements) - 1
+
+    def extend(self, statements: Iterable[str | tuple[str, Sequence | Mapping[str, Any] | None]]):
+        for statement in statements:
+            if isinstance(statement, str):
+                self.add(statement)
+            else:
+                self.add(*statement)
+
+    def __len__(self) -> int:
+        return len(self.statements)
+
+    def clear(self):
+        self.statements.clear()
+
+    def batches(self) -> list[list[int]]:
+        """ Statement indexes per batch, splitting only where the parameter limit forces it. """
+        batches, current, bound = [], [], 0
+        for index, (_, params) in enumerate(self.statements):
+            if current and bound + len(params) > MAX_BATCH_PARAMETERS:
+                batches.append(current)
+                current, bound = [], 0
+            current.append(index)
+            bound += len(params)
+        if current:
+            batches.append(current)
+        return batches
+
+    def run(self, commit: bool = True, raise_on_error: bool = True) -> PipelineResult:
+        """ Send the queued statements on a connection borrowed from the SqlConn's pool. See execute_pipeline. """
+        if self.sql_conn is None:
+            raise ValueError('Pipeline has no SqlConn, use run_on(cursor)')
+        return self.sql_conn.run_pipeline(self, commit=commit, raise_on_error=raise_on_error)
+
+    def run_on(self, cursor, commit: bool = True, raise_on_error: bool = True) -> PipelineResult:
+        """ Send the queued statements on cursor, e.g. inside a precursor method. See execute_pipeline. """
+        return execute_pipeline(cursor, self, commit=commit, raise_on_error=raise_on_error)
+
+
+def execute_pipeline(cursor, pipeline: StatementPipeline, commit: bool = True,
+                     raise_on_error: bool = True) -> PipelineResult:
+    """
+    Send the pipeline's statements on cursor and collect every statement's result sets and rowcount.
+    SQL Server carries on with the rest of a batch after most statement errors, so a failed batch is still read
+    to its end and every statement that ran is reported as executed; the transaction is then rolled back and
+    later batches are not sent. An error raised before any statement of a batch finished (a syntax error stops
+    SQL Server compiling the whole batch) is attributed to the first statement of that batch.
+    :param raise_on_error: Raise PipelineError on failure instead of only recording it in the result.
+    """
+    result = PipelineResult(statements=[StatementResult(index=i, sql=sql, params=params)
+                                        for i, (sql, params) in enumerate(pipeline.statements)])
+    if not result.statements:
+        return result
+    started = time.perf_counter()
+    connection = cursor.connection
+    for batch in pipeline.batches():
+        sql = ';\n'.join(f'{pipeline.statements[i][0]};\nSELECT {i} AS {MARKER_COLUMN}' for i in batch) + ';'
+        params = tuple(p for i in batch for p in pipeline.statements[i][1])
+        result.round_trips += 1
+        if not _walk(cursor, sql, params, batch, result):
+            try:
+                # Pending result sets would leave the connection busy and the rollback refused.
+                while cursor.nextset():
+                    pass
+            except Exception as e:
+                logger.debug(f'Discarding pipeline results failed: {type(e).__name__}: {e}')
+            try:
+                connection.rollback()
+            except Exception as e:
+                logger.warning(f'Rollback after pipeline failure failed: {type(e).__name__}: {e}')
+            break
+    else:
+        if commit:
+            connection.commit()
+            result.round_trips += 1
+    result.elapsed = time.perf_counter() - started
+    failed = result.failed
+    if failed is None:
+        logger.info(f'Pipelined {len(result)} statements in {result.round_trips} round trips, {result.elapsed:.3f}s')
+    elif raise_on_error:
+        raise PipelineError(result)
+    else:
+        logger.error(f'Pipelined statement {failed.index} failed: {failed.error}')
+    return result
+
+
+def _walk(cursor, sql: str, params: tuple, batch: list[int], result: PipelineResult) -> bool:
+    """
+    Execute one batch and attribute its results. A statement counts as executed once its marker arrives; an
+    error is charged to the statement running when it was raised and the walk carries on with the next result,
+    stopping only when the driver can't move past an error. Returns False when a statement failed.
+    """
+    position = 0
+    ok = True
+    current = result.statements[batch[0]]
+    try:
+        cursor.execute(sql, params) if params else cursor.execute(sql)
+        has_result = True
+    except Exception as e:
+        _record_error(current, e)
+        ok = has_result = False
+    errors_in_a_row = 0
+    while True:
+        try:
+            if has_result:
+                description = cursor.description
+                if description is not None and description[0][0] == MARKER_COLUMN:
+                    # Everything before the marker belongs to the current statement, which has now finished.
+                    current.executed = True
+                    position += 1
+                    if position == len(batch):
+                        return ok
+                    current = result.statements[batch[position]]
+                elif description is not None:
+                    current.columns.append(tuple(d[0] for d in description))
+                    current.result_sets.append(cursor.fetchall())
+                elif cursor.rowcount != -1:
+                    current.rowcount = cursor.rowcount
+            if not cursor.nextset():
+                return ok
+            has_result = True
+            errors_in_a_row = 0
+        except Exception as e:
+            _record_error(current, e)
+            ok = has_result = False
+            errors_in_a_row += 1
+            if errors_in_a_row > 1:
+                return ok
+
+
+def _record_error(statement: StatementResult, error: Exception):
+    """ Keep the first error a statement raised; SQL Server may report several. """
+    statement.executed = True
+    if statement.error is None:
+        statement.error = f'{type(error).__name__}: {error}'
@@ -0,0 +1,315 @@
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from dataclasses import dataclass, field, replace
+from typing import Any, Callable
+
+import timsy_log
+from sql_leaks import tracker
+
+logger = timsy_log.getLogger('SqlConnPool')
+
+PoolKey = tuple[str, str, str]
+
+
+class PoolTimeoutError(TimeoutError):
+    pass
+
+
+@dataclass
+class PoolStats:
+    checkouts: int = 0
+    waits: int = 0
+    wait_time: float = 0.0
+    creates: int = 0
+    evictions: int = 0
+    validation_failures: int = 0
+
+    def merge(self, other: 'PoolStats') -> 'PoolStats':
+        return PoolStats(
+            checkouts=self.checkouts + other.checkouts,
+            waits=self.waits + other.waits,
+            wait_time=self.wait_time + other.wait_time,
+            creates=self.creates + other.creates,
+            evictions=self.evictions + other.evictions,
+            validation_failures=self.validation_failures + other.validation_failures,
+        )
+
+
+@dataclass
+class _PooledConnection:
+    conn: Any
+    created_at: float
+    last_used: float
+    suspect: bool = False
+    state: dict = field(default_factory=dict)
+    leak_token: int | None = None
+
+
+@dataclass
+class _Bucket:
+    # Shares the pool's lock; notified when a connection or a free slot for this key becomes available.
+    available: threading.Condition
+    idle: deque = field(default_factory=deque)
+    in_use: dict = field(default_factory=dict)
+    pending: int = 0
+    stats: PoolStats = field(default_factory=PoolStats)
+
+    @property
+    def size(self) -> int:
+        return len(self.idle) + len(self.in_use) + self.pending
+
+
+def ping_connection(conn) -> bool:
+    """ Cheap liveness check, run before handing out a connection that sat idle. """
+    if getattr(conn, 'closed', False):
+        return False
+    cursor = conn.cursor()
+    try:
+        cursor.execute('SELECT 1')
+        cursor.fetchone()
+    finally:
+        cursor.close()
+    return True
+
+
+class SqlConnPool:
+    """
+    Thread-safe pool of connections keyed by (server, database, trusted_connection).
+    :param connect_factory: Callable taking (server, database, trusted_connection) and returning a DB-API connection.
+    :param min_size: Connections opened on a key's first checkout and kept open, even when idle past idle_timeout.
+    :param max_size: Upper bound of open connections per key. Callers block once it is reached.
+    :param idle_timeout: Seconds an idle connection may sit in the pool before being evicted.
+    :param validate_after: Seconds of idleness after which a connection is pinged before reuse.
+    :param acquire_timeout: Default seconds to wait for a free connection before PoolTimeoutError.
+    """
+
+    def __init__(self, connect_factory: Callable[[str, str, str], Any], min_size: int = 0, max_size: int = 8,
+                 idle_timeout: float = 300.0, validate_after: float = 30.0, acquire_timeout: float | None = 30.0,
+                 validator: Callable[[Any], bool] = ping_connection, clock: Callable[[], float] = time.monotonic):
+        if max_size < 1:
+            raise ValueError('max_size must be at least 1')
+        if min_size < 0 or min_size > max_size:
+            raise ValueError('min_size must be between 0 and max_size')
+        self.connect_factory = connect_factory
+        self.min_size = min_size
+        self.max_size = max_size
+        self.idle_timeout = idle_timeout
+        self.validate_after = validate_after
+        self.acquire_timeout = acquire_timeout
+        self.validator = validator
+        self.clock = clock
+        self._buckets: dict[PoolKey, _Bucket] = {}
+        self._lock = threading.Lock()
+        self._closed = False
+
+    def _bucket(self, key: PoolKey) -> _Bucket:
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            bucket = self._buckets[key] = _Bucket(available=threading.Condition(self._lock))
+        return bucket
+
+    def _create(self, key: PoolKey, bucket: _Bucket) -> _PooledConnection:
+        """ Open a new connection for a slot already reserved via bucket.pending. """
+        try:
+            conn = self.connect_factory(*key)
+        except Exception:
+            with self._lock:
+                bucket.pending -= 1
+                bucket.available.notify()
+            raise
+        now = self.clock()
+        with self._lock:
+            bucket.pending -= 1
+            bucket.stats.creates += 1
+        return _PooledConnection(conn=conn, created_at=now, last_used=now)
+
+    def _discard(self, pooled: _PooledConnection):
+        try:
+            pooled.conn.close()
+        except Exception as e:
+            logger.warning(f'Failed closing pooled connection: {type(e).__name__}: {e}')
+
+    def _is_usable(self, pooled: _PooledConnection, now: float) -> bool:
+        if not pooled.suspect and now - pooled.last_used < self.validate_after:
+            return True
+        try:
+            return bool(self.validator(pooled.conn))
+        except Exception as e:
+            logger.warning(f'Pooled connection failed validation: {type(e).__name__}: {e}')
+            return False
+
+    def _collect_idle(self, bucket: _Bucket, now: float) -> list[_PooledConnection]:
+        """ Pop connections idle past idle_timeout, oldest first, keeping min_size open. Caller holds the lock. """
+        expired = []
+        while bucket.idle and bucket.size > self.min_size:
+            oldest = bucket.idle[0]
+            if now - oldest.last_used < self.idle_timeout:
+                break
+            expired.append(bucket.idle.popleft())
+            bucket.stats.evictions += 1
+        return expired
+
+    def acquire(self, server: str, database: str, trusted_connection: str, timeout: float | None = None):
+        key: PoolKey = (server, database, trusted_connection)
+        timeout = self.acquire_timeout if timeout is None else timeout
+        if self.min_size and key not in self._buckets:
+            # First checkout for this key opens the min_size connections the pool keeps warm.
+            self.prefill(server, database, trusted_connection)
+        waited = False
+        wait_started = 0.0
+        while True:
+            pooled = None
+            with self._lock:
+                if self._closed:
+                    raise RuntimeError('SqlConnPool is closed')
+                bucket = self._bucket(key)
+                expired = self._collect_idle(bucket, self.clock())
+                if bucket.idle:
+                    # LIFO reuse keeps the hottest connections busy and lets the rest age out.
+                    pooled = bucket.idle.pop()
+                    bucket.in_use[id(pooled.conn)] = pooled
+                elif bucket.size < self.max_size:
+                    bucket.pending += 1
+                else:
+                    if not waited:
+                        waited = True
+                        wait_started = time.perf_counter()
+                        bucket.stats.waits += 1
+                    remaining = None if timeout is None else timeout - (time.perf_counter() - wait_started)
+                    if remaining is not None and remaining <= 0:
+                        bucket.stats.wait_time += time.perf_counter() - wait_started
+                        raise PoolTimeoutError(f'No connection available for {key[0]}/{key[1]} within {timeout}s')
+                    bucket.available.wait(remaining)
+                    continue
+            for stale in expired:
+                self._discard(stale)
+
+            if pooled is None:
+                pooled = self._create(key, bucket)
+                with self._lock:
+                    bucket.in_use[id(pooled.conn)] = pooled
+            elif not self._is_usable(pooled, self.clock()):
+                with self._lock:
+                    bucket.in_use.pop(id(pooled.conn), None)
+                    bucket.stats.validation_failures += 1
+                    bucket.stats.evictions += 1
+                    bucket.available.notify()
+                self._discard(pooled)
+                continue
+
+            with self._lock:
+                bucket.stats.checkouts += 1
+                if waited:
+                    bucket.stats.wait_time += time.perf_counter() - wait_started
+            pooled.leak_token = tracker.track('connection', f'{server}/{database}')
+            return pooled.conn
+
+    def release(self, conn, server: str, database: str, trusted_connection: str, discard: bool = False,
+                suspect: bool = False):
+        """
+        Return a connection to the pool.
+        :param discard: Close the connection instead of returning it.
+        :param suspect: Force validation before the connection is handed out again.
+        """
+        key: PoolKey = (server, database, trusted_connection)
+        with self._lock:
+            bucket = self._bucket(key)
+            pooled = bucket.in_use.pop(id(conn), None)
+        if pooled is None:
+            raise ValueError('Connection was not checked out from this pool')
+        tracker.untrack(pooled.leak_token)
+        pooled.leak_token = None
+        if not discard:
+            try:
+                # Never hand an open transaction to the next borrower.
+                conn.rollback()
+            except Exception as e:
+                logger.warning(f'Rollback on release failed, discarding: {type(e).__name__}: {e}')
+                discard = True
+        with self._lock:
+            if discard or self._closed:
+                bucket.stats.evictions += 1
+            else:
+                pooled.last_used = self.clock()
+                pooled.suspect = suspect
+                bucket.idle.append(pooled)
+            bucket.available.notify()
+        if discard or self._closed:
+            self._discard(pooled)
+
+    def connection_state(self, conn, server: str, database: str, trusted_connection: str) -> dict:
+        """ Scratch dict that lives as long as the pooled connection, e.g. for per-connection statement caches. """
+        with self._lock:
+            bucket = self._buckets.get((server, database, trusted_connection))
+            pooled = bucket.in_use.get(id(conn)) if bucket else None
+        if pooled is None:
+            raise ValueError('Connection is not checked out from this pool')
+        return pooled.state
+
+    @contextmanager
+    def connection(self, server: str, database: str, trusted_connection: str, timeout: float | None = None):
+        conn = self.acquire(server, database, trusted_connection, timeout=timeout)
+        failed = False
+        try:
+            yield conn
+        except Exception:
+            failed = True
+            raise
+        finally:
+            self.release(conn, server, database, trusted_connection, suspect=failed)
+
+    def prefill(self, server: str, database: str, trusted_connection: str):
+        """ Open connections for the key until min_size are available. """
+        key: PoolKey = (server, database, trusted_connection)
+        while True:
+            with self._lock:
+                if self._closed:
+                    raise RuntimeError('SqlConnPool is closed')
+                bucket = self._bucket(key)
+                if bucket.size >= self.min_size:
+                    return
+                bucket.pending += 1
+            pooled = self._create(key, bucket)
+            with self._lock:
+                bucket.idle.append(pooled)
+                bucket.available.notify()
+
+    def evict_idle(self) -> int:
+        """ Close connections idle past idle_timeout across all keys. Returns the number evicted. """
+        with self._lock:
+            now = self.clock()
+            expired = [p for bucket in self._buckets.values() for p in self._collect_idle(bucket, now)]
+        for stale in expired:
+            self._discard(stale)
+        return len(expired)
+
+    def stats(self, server: str | None = None, database: str | None = None,
+              trusted_connection: str | None = None) -> PoolStats:
+        """ Snapshot of pool counters, for one key when given or aggregated over all keys. """
+        with self._lock:
+            if server is not None:
+                bucket = self._buckets.get((server, database, trusted_connection))
+                return replace(bucket.stats) if bucket else PoolStats()
+            total = PoolStats()
+            for bucket in self._buckets.values():
+                total = total.merge(bucket.stats)
+            return total
+
+    def size(self, server: str, database: str, trusted_connection: str) -> tuple[int, int]:
+        """ (idle, in_use) connection counts for a key. """
+        with self._lock:
+            bucket = self._buckets.get((server, database, trusted_connection))
+            return (len(bucket.idle), len(bucket.in_use)) if bucket else (0, 0)
+
+    def close(self):
+        """ Close idle connections and refuse new checkouts. In-use connections are closed on release. """
+        with self._lock:
+            self._closed = True
+            idle = [p for bucket in self._buckets.values() for p in bucket.idle]
+            for bucket in self._buckets.values():
+                bucket.idle.clear()
+                bucket.available.notify_all()
+        for pooled in idle:
+            self._discard(pooled)
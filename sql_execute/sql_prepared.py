@@ -0,0 +1,142 @@
+""" Query normalization, identifier quoting and per-connection prepared statement reuse. """
+
+import functools
+import re
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Mapping, Sequence
+
+import timsy_log
+
+logger = timsy_log.getLogger('SqlPrepared')
+
+DEFAULT_STATEMENT_CACHE_SIZE = 64
+
+_NORMALIZE_TOKEN = re.compile(r"""
+      (?P<literal>N?'[^']*(?:''[^']*)*'|"[^"]*(?:""[^"]*)*"|\[[^\]]*(?:\]\][^\]]*)*\])
+    | (?P<named>(?<![:\w]):(?P<name>[A-Za-z_]\w*))
+    | (?P<gap>(?:\s|--[^\n]*|/\*[\s\S]*?\*/)+)
+""", re.VERBOSE)
+
+_IDENTIFIER_PART = re.compile(r'\[(?:[^\]]|\]\])*\]|[^.]+')
+
+
+def quote_identifier(name: str) -> str:
+    """ Quote one identifier part for SQL Server, e.g. Order Details -> [Order Details]. """
+    if not name:
+        raise ValueError('Identifier must not be empty')
+    if '\x00' in name:
+        raise ValueError('Identifier must not contain NUL characters')
+    return '[' + name.replace(']', ']]') + ']'
+
+
+def quote_table_name(name: str) -> str:
+    """ Quote a possibly multi-part name such as dbo.Person or #Stage. Parts already in brackets are kept. """
+    parts = _IDENTIFIER_PART.findall(name)
+    if not parts or '.'.join(parts) != name:
+        raise ValueError(f'Invalid table name: {name!r}')
+    return '.'.join(p if p.startswith('[') else quote_identifier(p) for p in parts)
+
+
+@functools.lru_cache(maxsize=1024)
+def _normalize(query: str) -> tuple[str, tuple[str, ...]]:
+    names = []
+
+    def replace(match: re.Match) -> str:
+        kind = match.lastgroup
+        if kind == 'named':
+            names.append(match.group('name'))
+            return '?'
+        if kind == 'gap':
+            return ' '
+        return match.group()
+
+    normalized = _NORMALIZE_TOKEN.sub(replace, query).strip()
+    return normalized, tuple(names)
+
+
+def normalize_query(query: str, params: Sequence | Mapping[str, Any] | None = None) -> tuple[str, tuple]:
+    """
+    Rewrite query into the canonical text used for preparing and caching: :name placeholders become ?,
+    comments are dropped and whitespace outside literals is collapsed. Mapping params are reordered to match.
+    """
+    normalized, names = _normalize(query)
+    if isinstance(params, Mapping):
+        if not names:
+            raise ValueError('Named parameters given but the query has no :name placeholders')
+        missing = [n for n in names if n not in params]
+        if missing:
+            raise KeyError(f'Missing query parameters: {", ".join(missing)}')
+        return normalized, tuple(params[n] for n in names)
+    if names:
+        raise ValueError('Query uses :name placeholders, parameters must be a mapping')
+    return normalized, tuple(params) if params is not None else ()
+
+
+@dataclass
+class StatementCacheStats:
+    hits: int = 0
+    misses: int = 0
+    evictions: int = 0
+
+    @property
+    def hit_rate(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+
+_stats = StatementCacheStats()
+_stats_lock = threading.Lock()
+
+
+def statement_cache_stats() -> StatementCacheStats:
+    """ Process-wide snapshot across every connection's statement cache. """
+    with _stats_lock:
+        return StatementCacheStats(hits=_stats.hits, misses=_stats.misses, evictions=_stats.evictions)
+
+
+class StatementCache:
+    """
+    LRU of cursors for one connection, keyed by normalized SQL. pyodbc keeps the last prepared statement
+    on each cursor and skips SQLPrepare when the same text is executed again, so a dedicated cursor per
+    statement turns repeat executions with new parameters into execute-only round trips.
+    Not thread-safe: a connection is only ever used by the thread that checked it out of the pool.
+    """
+
+    def __init__(self, conn, max_size: int = DEFAULT_STATEMENT_CACHE_SIZE):
+        self.conn = conn
+        self.max_size = max_size
+        self._cursors: OrderedDict[str, Any] = OrderedDict()
+
+    def cursor_for(self, normalized_query: str):
+        cursor = self._cursors.get(normalized_query)
+        if cursor is not None:
+            self._cursors.move_to_end(normalized_query)
+            with _stats_lock:
+                _stats.hits += 1
+            return cursor
+        cursor = self.conn.cursor()
+        self._cursors[normalized_query] = cursor
+        evicted = None
+        if len(self._cursors) > self.max_size:
+            evicted = self._cursors.popitem(last=False)[1]
+        with _stats_lock:
+            _stats.misses += 1
+            if evicted is not None:
+                _stats.evictions += 1
+        if evicted is not None:
+            evicted.close()
+        return cursor
+
+    def discard(self, normalized_query: str):
+        cursor = self._cursors.pop(normalized_query, None)
+        if cursor is not None:
+            try:
+                cursor.close()
+            except Exception as e:
+                logger.warning(f'Failed closing cached cursor: {type(e).__name__}: {e}')
+
+    def close(self):
+        for query in list(self._cursors):
+            self.discard(query)
@@ -0,0 +1,210 @@
+""" Opt-in cache of read-only query results with TTL, byte budget, table invalidation and stampede protection. """
+
+import re
+import sys
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, replace
+from typing import Callable, Hashable
+
+import timsy_log
+
+logger = timsy_log.getLogger('ResultCache')
+
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+
+_TABLE_REFERENCE = re.compile(
+    r'\b(?:FROM|JOIN|UPDATE|INTO|APPLY)\s+((?:\[[^\]]+\]|[\w#@$]+)(?:\s*\.\s*(?:\[[^\]]+\]|[\w#@$]*))*)',
+    re.IGNORECASE)
+
+
+def referenced_tables(query: str) -> frozenset[str]:
+    """ Unqualified, lower-cased names of the tables a query reads from, used for invalidation. """
+    tables = set()
+    for match in _TABLE_REFERENCE.finditer(query):
+        last_part = match.group(1).split('.')[-1].strip()
+        if last_part:
+            tables.add(last_part.strip('[]').lower())
+    return frozenset(tables)
+
+
+@dataclass(frozen=True)
+class CachedResult:
+    """ Rows detached from the cursor: plain tuples plus the column names from cursor.description. """
+    columns: tuple[str, ...]
+    rows: tuple[tuple, ...]
+
+    def __len__(self):
+        return len(self.rows)
+
+    def __iter__(self):
+        return iter(self.rows)
+
+
+def estimate_size(result: CachedResult) -> int:
+    size = sys.getsizeof(result.rows) + sum(sys.getsizeof(c) for c in result.columns)
+    for row in result.rows:
+        size += sys.getsizeof(row) + sum(sys.getsizeof(v) for v in row)
+    return size
+
+
+@dataclass
+class ResultCacheStats:
+    hits: int = 0
+    misses: int = 0
+    evictions: int = 0
+    expirations: int = 0
+    invalidations: int = 0
+    coalesced: int = 0
+    bytes: int = 0
+    entries: int = 0
+
+
+@dataclass
+class _Entry:
+    result: CachedResult
+    size: int
+    expires_at: float | None
+    tables: frozenset[str]
+
+
+class _Inflight:
+    def __init__(self, tables: frozenset[str], generation: int):
+        # Invalidation generation when the load started; the result is only stored if nothing it reads changed since.
+        self.tables = tables
+        self.generation = generation
+        self.done = threading.Event()
+        self.result: CachedResult | None = None
+        self.error: BaseException | None = None
+
+
+class ResultCache:
+    """
+    :param max_bytes: Approximate memory budget; least recently used results are evicted beyond it.
+    :param ttl: Default seconds a result stays valid. None caches until evicted or invalidated.
+    """
+
+    def __init__(self, max_bytes: int = DEFAULT_MAX_BYTES, ttl: float | None = 60.0,
+                 clock: Callable[[], float] = time.monotonic):
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.clock = clock
+        self._entries: OrderedDict[Hashable, _Entry] = OrderedDict()
+        self._inflight: dict[Hashable, _Inflight] = {}
+        self._stats = ResultCacheStats()
+        self._generation = 0
+        self._invalidated: dict[str, int] = {}
+        self._cleared = 0
+        self._lock = threading.Lock()
+
+    def _lookup(self, key: Hashable) -> CachedResult | None:
+        """ Caller holds the lock. """
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if entry.expires_at is not None and self.clock() >= entry.expires_at:
+            self._remove(key)
+            self._stats.expirations += 1
+            return None
+        self._entries.move_to_end(key)
+        return entry.result
+
+    def _remove(self, key: Hashable):
+        """ Caller holds the lock. """
+        entry = self._entries.pop(key)
+        self._stats.bytes -= entry.size
+
+    def _is_current(self, tables: frozenset[str], generation: int) -> bool:
+        """ Whether nothing in tables was invalidated after generation. Caller holds the lock. """
+        if self._cleared > generation:
+            return False
+        return all(self._invalidated.get(table, 0) <= generation for table in tables)
+
+    def _store(self, key: Hashable, result: CachedResult, tables: frozenset[str], ttl: float | None,
+               generation: int):
+        size = estimate_size(result)
+        if size > self.max_bytes:
+            logger.debug(f'Result of {size} bytes exceeds the cache budget, not cached')
+            return
+        ttl = self.ttl if ttl is None else ttl
+        expires_at = self.clock() + ttl if ttl is not None else None
+        with self._lock:
+            if not self._is_current(tables, generation):
+                logger.debug('A table the result reads was invalidated while it loaded, not cached')
+                return
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = _Entry(result=result, size=size, expires_at=expires_at, tables=tables)
+            self._stats.bytes += size
+            while self._stats.bytes > self.max_bytes:
+                self._remove(next(iter(self._entries)))
+                self._stats.evictions += 1
+
+    def get_or_load(self, key: Hashable, query: str, loader: Callable[[], CachedResult],
+                    ttl: float | None = None) -> CachedResult:
+        """
+        Return the cached result for key, or run loader once and cache it. Concurrent misses on the same
+        key wait for the first caller's load instead of each hitting the database. A result whose tables are
+        invalidated while it loads is returned to the callers already waiting for it but not cached.
+        """
+        tables = referenced_tables(query)
+        with self._lock:
+            result = self._lookup(key)
+            if result is not None:
+                self._stats.hits += 1
+                return result
+            inflight = self._inflight.get(key)
+            leader = inflight is None
+            if leader:
+                inflight = self._inflight[key] = _Inflight(tables, self._generation)
+                self._stats.misses += 1
+            else:
+                self._stats.coalesced += 1
+        if not leader:
+            inflight.done.wait()
+            if inflight.error is not None:
+                raise inflight.error
+            return inflight.result
+        try:
+            inflight.result = loader()
+            self._store(key, inflight.result, tables, ttl, inflight.generation)
+            return inflight.result
+        except BaseException as e:
+            inflight.error = e
+            raise
+        finally:
+            with self._lock:
+                if self._inflight.get(key) is inflight:
+                    del self._inflight[key]
+            inflight.done.set()
+
+    def invalidate_table(self, table: str) -> int:
+        """ Drop every cached result whose query references table (schema qualifiers are ignored). """
+        table = table.split('.')[-1].strip('[]').lower()
+        with self._lock:
+            self._generation += 1
+            self._invalidated[table] = self._generation
+            # Loads already running may have read the old rows; later misses start a fresh load instead of joining them.
+            for key in [k for k, inflight in self._inflight.items() if table in inflight.tables]:
+                del self._inflight[key]
+            stale = [k for k, e in self._entries.items() if table in e.tables]
+            for key in stale:
+                self._remove(key)
+            self._stats.invalidations += len(stale)
+        return len(stale)
+
+    def clear(self):
+        with self._lock:
+            self._generation += 1
+            self._cleared = self._generation
+            self._inflight.clear()
+            self._entries.clear()
+            self._stats.bytes = 0
+
+    def stats(self) -> ResultCacheStats:
+        with self._lock:
+            return replace(self._stats, entries=len(self._entries))
+
+
+default_result_cache = ResultCache()
@@ -0,0 +1,273 @@
+"""
+Retry with exponential backoff and jitter for transient driver errors, and a per-server circuit breaker that
+fails fast while a server is known to be down.
+"""
+
+import random
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Any, Callable, TypeVar
+
+import timsy_log
+
+logger = timsy_log.getLogger('SqlRetry')
+
+T = TypeVar('T')
+
+# SQLSTATEs worth another attempt: communication link failures, connect failures, timeouts and deadlock victims.
+TRANSIENT_SQLSTATES = frozenset({
+    '08S01',  # communication link failure
+    '08001',  # client unable to establish connection
+    '08004',  # server rejected the connection
+    '08007',  # connection failure during transaction
+    '40001',  # serialization failure, SQL Server deadlock victim (1205)
+    'HYT00',  # timeout expired
+    'HYT01',  # connection timeout expired
+})
+
+# The subset that says the server could not be reached; only these count against the circuit breaker.
+# Deadlock victims and query timeouts come from a server that is up, so they are retried without being counted.
+CONNECTIVITY_SQLSTATES = frozenset({'08S01', '08001', '08004', '08007', 'HYT01'})
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+
+class CircuitOpenError(ConnectionError):
+    """ Raised without contacting the server while its circuit breaker is open. """
+
+    def __init__(self, server: str, retry_in: float):
+        super().__init__(f'Circuit open for {server}, not retrying for another {retry_in:.1f}s')
+        self.server = server
+        self.retry_in = retry_in
+
+
+def sqlstate(error: BaseException) -> str | None:
+    """ SQLSTATE of a driver error. pyodbc puts it in args[0]; other drivers may set a sqlstate attribute. """
+    state = getattr(error, 'sqlstate', None)
+    if state is None and error.args and isinstance(error.args[0], str) and len(error.args[0]) == 5:
+        state = error.args[0]
+    return state
+
+
+# Set on an error once a RetryPolicy has given up on it, so an enclosing policy neither retries nor counts it again.
+_RETRIED = 'retried_by_policy'
+
+
+def _mark_retried(error: BaseException):
+    try:
+        setattr(error, _RETRIED, True)
+    except AttributeError:
+        pass
+
+
+class CircuitBreaker:
+    """
+    Opens after failure_threshold consecutive connectivity failures. While open every call fails fast with
+    CircuitOpenError; after reset_timeout seconds one probe call is let through (half-open), which closes the
+    breaker on success and re-opens it on failure. Calls nested in the probe on the same thread, such as the
+    connect made while checking out its connection, belong to the probe and go ahead too.
+    """
+
+    def __init__(self, server: str, failure_threshold: int = 5, reset_timeout: float = 30.0,
+                 clock: Callable[[], float] = time.monotonic):
+        self.server = server
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.clock = clock
+        self.failures = 0
+        self.times_opened = 0
+        self._state = CLOSED
+        self._opened_at = 0.0
+        self._probe_started: float | None = None
+        self._probe_thread: int | None = None
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            if self._state == OPEN and self.clock() - self._opened_at >= self.reset_timeout:
+                return HALF_OPEN
+            return self._state
+
+    def before_call(self):
+        """ Raise CircuitOpenError unless the call may go ahead. """
+        with self._lock:
+            if self._state == CLOSED:
+                return
+            now = self.clock()
+            if self._state == OPEN:
+                remaining = self.reset_timeout - (now - self._opened_at)
+                if remaining > 0:
+                    raise CircuitOpenError(self.server, remaining)
+                self._state = HALF_OPEN
+                self._probe_started = None
+            # Half-open: one probe at a time. A probe that never reported back is replaced after reset_timeout.
+            if self._probe_started is not None and now - self._probe_started < self.reset_timeout:
+                if self._probe_thread == threading.get_ident():
+                    return
+                raise CircuitOpenError(self.server, self.reset_timeout - (now - self._probe_started))
+            self._probe_started = now
+            self._probe_thread = threading.get_ident()
+
+    def record_success(self):
+        with self._lock:
+            if self._state != CLOSED:
+                logger.info(f'Circuit closed for {self.server}')
+            self._state = CLOSED
+            self.failures = 0
+            self._probe_started = None
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self._state == HALF_OPEN or self.failures >= self.failure_threshold:
+                if self._state != OPEN:
+                    self.times_opened += 1
+                    logger.warning(f'Circuit opened for {self.server} after {self.failures} failures, '
+                                   f'failing fast for {self.reset_timeout}s')
+                self._state = OPEN
+                self._opened_at = self.clock()
+                self._probe_started = None
+
+    def release_probe(self):
+        """ Let the next call probe again when the current one ended without telling anything about the server. """
+        with self._lock:
+            self._probe_started = None
+
+    def reset(self):
+        with self._lock:
+            self._state = CLOSED
+            self.failures = 0
+            self._probe_started = None
+
+
+_breakers: dict[str, CircuitBreaker] = {}
+_breakers_lock = threading.Lock()
+
+
+def circuit_breaker(server: str, failure_threshold: int = 5, reset_timeout: float = 30.0) -> CircuitBreaker:
+    """ Process-wide breaker for server, created with the given settings on first use. """
+    breaker = _breakers.get(server)
+    if breaker is None:
+        with _breakers_lock:
+            breaker = _breakers.get(server)
+            if breaker is None:
+                breaker = _breakers[server] = CircuitBreaker(server, failure_threshold, reset_timeout)
+    return breaker
+
+
+def reset_circuit_breakers():
+    with _breakers_lock:
+        _breakers.clear()
+
+
+@dataclass
+class RetryPolicy:
+    """
+    Exponential backoff with full jitter: attempt n sleeps a random time up to min(max_delay, base_delay * multiplier**n).
+    :param max_attempts: Total attempts including the first; 1 disables retries.
+    :param transient_sqlstates: SQLSTATEs that are retried.
+    :param connectivity_sqlstates: SQLSTATEs that count against the circuit breaker.
+    :param failure_threshold: Consecutive connectivity failures that open a server's circuit breaker.
+    :param reset_timeout: Seconds an open breaker fails fast before letting a probe through.
+    """
+    max_attempts: int = 3
+    base_delay: float = 0.1
+    max_delay: float = 5.0
+    multiplier: float = 2.0
+    transient_sqlstates: frozenset[str] = TRANSIENT_SQLSTATES
+    connectivity_sqlstates: frozenset[str] = CONNECTIVITY_SQLSTATES
+    failure_threshold: int = 5
+    reset_timeout: float = 30.0
+    sleep: Callable[[float], Any] = time.sleep
+    rng: random.Random = field(default_factory=random.Random)
+
+    @classmethod
+    def from_config(cls, config) -> 'RetryPolicy':
+        """ Read retryMaxAttempts, retryBaseDelay, retryMaxDelay, breakerFailureThreshold, breakerResetTimeout. """
+        policy = cls()
+        for attribute, getter, key in (('max_attempts', config.get_int, 'retryMaxAttempts'),
+                                       ('base_delay', config.get_float, 'retryBaseDelay'),
+                                       ('max_delay', config.get_float, 'retryMaxDelay'),
+                                       ('failure_threshold', config.get_int, 'breakerFailureThreshold'),
+                                       ('reset_timeout', config.get_float, 'breakerResetTimeout')):
+            value = getter('DEFAULT', key)
+            if value is not None:
+                setattr(policy, attribute, value)
+        return policy
+
+    def is_transient(self, error: BaseException) -> bool:
+        return sqlstate(error) in self.transient_sqlstates
+
+    def is_connectivity_failure(self, error: BaseException) -> bool:
+        return sqlstate(error) in self.connectivity_sqlstates
+
+    def delay(self, attempt: int) -> float:
+        """ Seconds to sleep after the given zero-based failed attempt. """
+        return self.rng.uniform(0, min(self.max_delay, self.base_delay * self.multiplier ** attempt))
+
+    def breaker(self, server: str) -> CircuitBreaker:
+        return circuit_breaker(server, self.failure_threshold, self.reset_timeout)
+
+    def call(self, func: Callable[[], T], server: str | None = None, description: str = 'call') -> T:
+        """
+        Run func, retrying transient errors. With a server, calls go through that server's circuit breaker:
+        they fail fast with CircuitOpenError while it is open, connectivity failures are recorded against it, and
+        only a server response (a result or a driver error with a SQLSTATE) counts as a success.
+        An error that already gave up in a nested call (e.g. a connect retried by the pool's connect factory)
+        is passed straight through, so retries never multiply across layers.
+        """
+        breaker = self.breaker(server) if server is not None else None
+        attempt = 0
+        while True:
+            if breaker is not None:
+                try:
+                    breaker.before_call()
+                except CircuitOpenError as e:
+                    _mark_retried(e)
+                    raise
+            try:
+                result = func()
+            except Exception as e:
+                if getattr(e, _RETRIED, False):
+                    if breaker is not None:
+                        breaker.release_probe()
+                    raise
+                transient = self.is_transient(e)
+                if breaker is not None:
+                    if self.is_connectivity_failure(e):
+                        breaker.record_failure()
+                    elif sqlstate(e) is not None:
+                        # Any other driver error is the server's answer, so it proves the server is reachable.
+                        breaker.record_success()
+                    else:
+                        # Raised on this side (pool or admission timeouts, plain Python errors): says nothing
+                        # about the server, so neither close the breaker nor count a failure.
+                        breaker.release_probe()
+                attempt += 1
+                if not transient or attempt >= self.max_attempts:
+                    _mark_retried(e)
+                    raise
+                pause = self.delay(attempt - 1)
+                logger.warning(f'{description} failed with {type(e).__name__}: {e}, '
+                               f'attempt {attempt} of {self.max_attempts}, retrying in {pause:.3f}s')
+                self.sleep(pause)
+                continue
+            if breaker is not None:
+                breaker.record_success()
+            return result
+
+
+def resilient_connect(connect: Callable[[str, str, str], Any], policy: RetryPolicy | None = None):
+    """ Wrap a backend connect callable with retries and the per-server circuit breaker. """
+    policy = policy if policy is not None else RetryPolicy()
+
+    def connect_with_retry(server: str, database: str, trusted_connection: str):
+        return policy.call(lambda: connect(server, database, trusted_connection), server=server,
+                           description=f'Connect to {server}/{database}')
+
+    connect_with_retry.__wrapped__ = connect
+    return connect_with_retry
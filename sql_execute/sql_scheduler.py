@@ -0,0 +1,307 @@
+"""
+Priority-aware admission control in front of query execution. Every statement belongs to a workload class
+(interactive, batch, maintenance) with its own concurrency limit and queue depth. When a slot frees up the
+waiting statement with the best priority goes next; waiting raises a statement's priority over time so lower
+classes are never starved. A full queue rejects new work at once with LoadShedError instead of letting it pile up.
+"""
+
+import contextvars
+import itertools
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Any, Callable, Iterable, TypeVar
+
+import timsy_log
+from sql_hooks import Histogram
+from timsy_config import Config
+
+logger = timsy_log.getLogger('SqlScheduler')
+
+T = TypeVar('T')
+
+INTERACTIVE = 'interactive'
+BATCH = 'batch'
+MAINTENANCE = 'maintenance'
+
+DEFAULT_MAX_CONCURRENCY = 8
+DEFAULT_AGING = 5.0
+
+
+@dataclass(frozen=True)
+class WorkloadClass:
+    """
+    :param priority: Lower runs first.
+    :param max_concurrency: Statements of this class running at once.
+    :param max_queue_depth: Statements of this class allowed to wait; further ones are shed.
+    """
+    name: str
+    priority: int
+    max_concurrency: int
+    max_queue_depth: int
+
+
+DEFAULT_CLASSES = (
+    WorkloadClass(INTERACTIVE, priority=0, max_concurrency=8, max_queue_depth=256),
+    WorkloadClass(BATCH, priority=1, max_concurrency=4, max_queue_depth=64),
+    WorkloadClass(MAINTENANCE, priority=2, max_concurrency=2, max_queue_depth=16),
+)
+
+
+class LoadShedError(RuntimeError):
+    """ Raised without queueing when a workload class's queue is full. """
+
+    def __init__(self, workload: str, queued: int):
+        super().__init__(f'Scheduler queue for {workload} work is full ({queued} waiting), statement rejected')
+        self.workload = workload
+        self.queued = queued
+
+
+class AdmissionTimeoutError(TimeoutError):
+    pass
+
+
+_current_workload: contextvars.ContextVar[str | None] = contextvars.ContextVar('workload', default=None)
+
+
+@contextmanager
+def use_workload(workload: str):
+    """ Run the statements issued inside the with block, on this thread or task, as the given workload class. """
+    token = _current_workload.set(workload)
+    try:
+        yield
+    finally:
+        _current_workload.reset(token)
+
+
+def current_workload(default: str = INTERACTIVE) -> str:
+    workload = _current_workload.get()
+    return workload if workload is not None else default
+
+
+@dataclass
+class WorkloadStats:
+    submitted: int = 0
+    admitted: int = 0
+    completed: int = 0
+    shed: int = 0
+    timed_out: int = 0
+    queued: int = 0
+    running: int = 0
+    queue_wait: Histogram = field(default_factory=Histogram)
+    run_time: Histogram = field(default_factory=Histogram)
+
+    def reset(self):
+        """ Zero everything but the queued and running gauges. """
+        self.submitted = self.admitted = self.completed = self.shed = self.timed_out = 0
+        self.queue_wait = Histogram()
+        self.run_time = Histogram()
+
+    def summary(self) -> dict[str, float]:
+        return {'submitted': self.submitted, 'admitted': self.admitted, 'completed': self.completed,
+                'shed': self.shed, 'timed_out': self.timed_out, 'queued': self.queued, 'running': self.running,
+                'queue_wait_p50': self.queue_wait.percentile(50), 'queue_wait_p95': self.queue_wait.percentile(95),
+                'queue_wait_max': self.queue_wait.max,
+                'run_time_p50': self.run_time.percentile(50), 'run_time_p95': self.run_time.percentile(95),
+                'run_time_max': self.run_time.max}
+
+
+@dataclass(eq=False)
+class _Ticket:
+    workload: str
+    sequence: int
+    enqueued_at: float
+    admitted_at: float = 0.0
+    granted: bool = False
+    released: bool = False
+    event: threading.Event = field(default_factory=threading.Event)
+
+
+class QueryScheduler:
+    """
+    Admission control shared by every SqlConn given it. At most max_concurrency statements run at once across
+    all classes, and each class is held to its own max_concurrency. A free slot goes to the queued statement with
+    the lowest priority value, less one for every aging seconds it has waited; ties go to the earliest.
+    Slots are re-entrant per context (thread or asyncio task), so a statement issued while its context already
+    holds a slot from this scheduler is not queued again.
+    :param timeout: Default seconds a statement may wait for a slot before AdmissionTimeoutError; None waits.
+    :param clock: Time source for aging and metrics, replaceable for deterministic tests.
+    """
+
+    def __init__(self, classes: Iterable[WorkloadClass] = DEFAULT_CLASSES,
+                 max_concurrency: int = DEFAULT_MAX_CONCURRENCY, aging: float = DEFAULT_AGING,
+                 timeout: float | None = None, clock: Callable[[], float] = time.monotonic):
+        self.classes = {c.name: c for c in classes}
+        if max_concurrency < 1:
+            raise ValueError('max_concurrency must be at least 1')
+        self.max_concurrency = max_concurrency
+        self.aging = aging
+        self.timeout = timeout
+        self.clock = clock
+        self._queues: dict[str, deque[_Ticket]] = {name: deque() for name in self.classes}
+        self._stats = {name: WorkloadStats() for name in self.classes}
+        self._running = 0
+        self._sequence = itertools.count()
+        self._lock = threading.Lock()
+        # The ticket whose slot the current context holds, checked by identity so slots closed out of order
+        # or on another thread never leave a context believing it holds a slot it doesn't.
+        self._held: contextvars.ContextVar[_Ticket | None] = contextvars.ContextVar('scheduler_slot', default=None)
+
+    @classmethod
+    def from_config(cls, config: Config) -> 'QueryScheduler':
+        """
+        Read schedulerMaxConcurrency, schedulerAging, schedulerTimeout and, per class, <class>Concurrency and
+        <class>QueueDepth, e.g. batchConcurrency.
+        """
+        classes = []
+        for workload in DEFAULT_CLASSES:
+            concurrency = config.get_int('DEFAULT', f'{workload.name}Concurrency')
+            depth = config.get_int('DEFAULT', f'{workload.name}QueueDepth')
+            classes.append(WorkloadClass(workload.name, workload.priority,
+                                         concurrency if concurrency is not None else workload.max_concurrency,
+                                         depth if depth is not None else workload.max_queue_depth))
+        max_concurrency = config.get_int('DEFAULT', 'schedulerMaxConcurrency')
+        aging = config.get_float('DEFAULT', 'schedulerAging')
+        return cls(classes,
+                   max_concurrency=max_concurrency if max_concurrency is not None else DEFAULT_MAX_CONCURRENCY,
+                   aging=aging if aging is not None else DEFAULT_AGING,
+                   timeout=config.get_float('DEFAULT', 'schedulerTimeout'))
+
+    def _workload_class(self, workload: str) -> WorkloadClass:
+        try:
+            return self.classes[workload]
+        except KeyError:
+            raise ValueError(f'Unknown workload class {workload!r}, expected one of {", ".join(self.classes)}') \
+                from None
+
+    def _rank(self, ticket: _Ticket, now: float) -> tuple[float, int]:
+        priority = self.classes[ticket.workload].priority
+        if self.aging > 0:
+            priority -= (now - ticket.enqueued_at) / self.aging
+        return priority, ticket.sequence
+
+    def _dispatch(self):
+        """ Grant free slots to the best queued tickets. Caller holds the lock. """
+        now = self.clock()
+        while self._running < self.max_concurrency:
+            best, best_rank = None, None
+            for name, queue in self._queues.items():
+                if queue and self._stats[name].running < self.classes[name].max_concurrency:
+                    rank = self._rank(queue[0], now)
+                    if best is None or rank < best_rank:
+                        best, best_rank = queue[0], rank
+            if best is None:
+                return
+            self._queues[best.workload].popleft()
+            stats = self._stats[best.workload]
+            stats.queued -= 1
+            stats.running += 1
+            stats.admitted += 1
+            stats.queue_wait.add(now - best.enqueued_at, 0)
+            self._running += 1
+            best.admitted_at = now
+            best.granted = True
+            best.event.set()
+
+    def acquire(self, workload: str = INTERACTIVE, timeout: float | None = None) -> _Ticket:
+        """ Wait for a slot for workload and return the ticket to pass to release(). """
+        workload_class = self._workload_class(workload)
+        timeout = self.timeout if timeout is None else timeout
+        with self._lock:
+            stats = self._stats[workload]
+            stats.submitted += 1
+            queue = self._queues[workload]
+            ticket = _Ticket(workload=workload, sequence=next(self._sequence), enqueued_at=self.clock())
+            queue.append(ticket)
+            stats.queued += 1
+            self._dispatch()
+            # Shed only work that would really have to wait behind a full queue.
+            error = None
+            if not ticket.granted and len(queue) > workload_class.max_queue_depth:
+                queue.remove(ticket)
+                stats.queued -= 1
+                stats.shed += 1
+                error = LoadShedError(workload, len(queue))
+        if error is not None:
+            logger.warning(str(error))
+            raise error
+        if ticket.granted or ticket.event.wait(timeout):
+            return ticket
+        with self._lock:
+            if ticket.granted:
+                return ticket
+            self._queues[workload].remove(ticket)
+            stats.queued -= 1
+            stats.timed_out += 1
+        raise AdmissionTimeoutError(f'No {workload} slot free within {timeout}s')
+
+    def release(self, ticket: _Ticket):
+        with self._lock:
+            stats = self._stats[ticket.workload]
+            stats.running -= 1
+            stats.completed += 1
+            stats.run_time.add(self.clock() - ticket.admitted_at, 0)
+            ticket.released = True
+            self._running -= 1
+            self._dispatch()
+
+    @contextmanager
+    def slot(self, workload: str = INTERACTIVE, timeout: float | None = None):
+        """ Hold a slot for workload for the duration of the with block. """
+        held = self._held.get()
+        if held is not None and not held.released:
+            yield
+            return
+        ticket = self.acquire(workload, timeout)
+        self._held.set(ticket)
+        try:
+            yield
+        finally:
+            if self._held.get() is ticket:
+                self._held.set(held)
+            self.release(ticket)
+
+    def run(self, workload: str, func: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+        with self.slot(workload):
+            return func(*args, **kwargs)
+
+    def stats(self, workload: str | None = None) -> dict[str, WorkloadStats] | WorkloadStats:
+        """ Live metrics per class, or for one class. Read them, don't modify them. """
+        if workload is not None:
+            self._workload_class(workload)
+            return self._stats[workload]
+        return dict(self._stats)
+
+    def summary(self) -> dict[str, dict[str, float]]:
+        with self._lock:
+            return {name: stats.summary() for name, stats in self._stats.items()}
+
+    def reset_stats(self):
+        """
+        Zero the counters and histograms, keeping queued and running. Done in place, so statements waiting for a
+        slot and anyone holding the objects from stats() keep updating the live ones.
+        """
+        with self._lock:
+            for stats in self._stats.values():
+                stats.reset()
+
+
+_default_scheduler: QueryScheduler | None = None
+_default_scheduler_lock = threading.Lock()
+
+
+def get_default_scheduler(config: Config | None = None) -> QueryScheduler:
+    """ Process-wide scheduler shared by every SqlConn with scheduleQueries on, built from config on first use. """
+    global _default_scheduler
+    with _default_scheduler_lock:
+        if _default_scheduler is None:
+            _default_scheduler = QueryScheduler.from_config(config if config is not None else Config())
+        return _default_scheduler
+
+
+def set_default_scheduler(scheduler: QueryScheduler | None):
+    global _default_scheduler
+    with _default_scheduler_lock:
+        _default_scheduler = scheduler
@@ -0,0 +1,230 @@
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, asdict
+from pathlib import Path
+from typing import Callable, Union
+
+import timsy_log
+from sql_conn import SqlConn, iter_rows
+
+logger = timsy_log.getLogger('SchemaCache')
+
+CACHE_FORMAT_VERSION = 2
+
+
+@dataclass(frozen=True)
+class TableInfo:
+    catalog: str | None
+    schema: str | None
+    name: str
+    table_type: str | None = None
+
+
+@dataclass(frozen=True)
+class ColumnInfo:
+    catalog: str | None
+    schema: str | None
+    table: str
+    name: str
+    type_name: str | None
+    data_type: int | None
+    size: int | None
+    decimal_digits: int | None
+    nullable: bool
+    ordinal: int | None
+
+
+@dataclass
+class SchemaCacheStats:
+    hits: int = 0
+    misses: int = 0
+    evictions: int = 0
+    expirations: int = 0
+
+
+def _table_from_row(row) -> TableInfo:
+    return TableInfo(catalog=row.table_cat, schema=row.table_schem, name=row.table_name, table_type=row.table_type)
+
+
+def _column_from_row(row) -> ColumnInfo:
+    return ColumnInfo(catalog=row.table_cat, schema=row.table_schem, table=row.table_name, name=row.column_name,
+                      type_name=row.type_name, data_type=row.data_type, size=row.column_size,
+                      decimal_digits=row.decimal_digits, nullable=bool(row.nullable),
+                      ordinal=row.ordinal_position)
+
+
+def fetch_tables(sql_conn: SqlConn, table: str | None = None, schema: str | None = None,
+                 catalog: str | None = None) -> tuple[TableInfo, ...]:
+    with sql_conn.borrow_connection() as conn:
+        cursor = conn.cursor()
+        try:
+            return tuple(_table_from_row(r) for r in iter_rows(cursor.tables(table=table, schema=schema,
+                                                                             catalog=catalog)))
+        finally:
+            cursor.close()
+
+
+def fetch_columns(sql_conn: SqlConn, table: str | None = None, schema: str | None = None,
+                  catalog: str | None = None) -> tuple[ColumnInfo, ...]:
+    with sql_conn.borrow_connection() as conn:
+        cursor = conn.cursor()
+        try:
+            return tuple(_column_from_row(r) for r in iter_rows(cursor.columns(table=table, schema=schema,
+                                                                               catalog=catalog)))
+        finally:
+            cursor.close()
+
+
+def _norm(value: str | None) -> str | None:
+    # SQL Server's default collations compare identifiers case-insensitively.
+    return value.lower() if value is not None else None
+
+
+class SchemaCache:
+    """
+    In-memory TTL/LRU cache of catalog metadata layered on a SqlConn.
+    :param ttl: Seconds before a cached lookup is re-queried. None keeps entries until evicted or invalidated.
+    :param max_entries: Number of cached lookups kept before the least recently used is evicted.
+    :param path: Optional JSON file the cache is loaded from on creation and written to by save(). The file
+        records the server and database it was saved from and is ignored when loaded against another one.
+    """
+
+    def __init__(self, sql_conn: SqlConn | None = None, ttl: float | None = 3600.0, max_entries: int = 4096,
+                 path: Union[str, Path, None] = None, clock: Callable[[], float] = time.time):
+        self.sql_conn = sql_conn if sql_conn is not None else SqlConn()
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.path = Path(path) if path is not None else None
+        self.clock = clock
+        self.stats = SchemaCacheStats()
+        self._entries: OrderedDict[tuple, tuple[float, tuple]] = OrderedDict()
+        self._lock = threading.Lock()
+        if self.path is not None and self.path.exists():
+            self.load()
+
+    def _target(self) -> tuple[str | None, str | None]:
+        """ Server and database the lookups run against; catalog=None means this database. """
+        return _norm(self.sql_conn.server), _norm(self.sql_conn.database)
+
+    def _key(self, kind: str, catalog: str | None, schema: str | None, table: str | None) -> tuple:
+        return (kind, *self._target(), _norm(catalog), _norm(schema), _norm(table))
+
+    def _get(self, key: tuple) -> tuple | None:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if self.ttl is not None and self.clock() - entry[0] >= self.ttl:
+                    del self._entries[key]
+                    self.stats.expirations += 1
+                else:
+                    self._entries.move_to_end(key)
+                    self.stats.hits += 1
+                    return entry[1]
+            self.stats.misses += 1
+            return None
+
+    def _put(self, key: tuple, value: tuple, stored_at: float | None = None):
+        with self._lock:
+            self._entries[key] = (self.clock() if stored_at is None else stored_at, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.stats.evictions += 1
+
+    def get_tables(self, table: str | None = None, schema: str | None = None,
+                   catalog: str | None = None) -> tuple[TableInfo, ...]:
+        key = self._key('tables', catalog, schema, table)
+        tables = self._get(key)
+        if tables is None:
+            tables = fetch_tables(self.sql_conn, table=table, schema=schema, catalog=catalog)
+            self._put(key, tables)
+        return tables
+
+    def get_columns(self, table: str, schema: str | None = None,
+                    catalog: str | None = None) -> tuple[ColumnInfo, ...]:
+        key = self._key('columns', catalog, schema, table)
+        columns = self._get(key)
+        if columns is None:
+            columns = fetch_columns(self.sql_conn, table=table, schema=schema, catalog=catalog)
+            self._put(key, columns)
+        return columns
+
+    def get_column(self, table: str, column: str, schema: str | None = None,
+                   catalog: str | None = None) -> ColumnInfo | None:
+        column = _norm(column)
+        return next((c for c in self.get_columns(table, schema, catalog) if _norm(c.name) == column), None)
+
+    def warm(self, schema: str | None = None, catalog: str | None = None) -> int:
+        """
+        Populate column metadata for every table in scope with one catalog query.
+        Entries are keyed by the table's own catalog and schema as well as by the requested scope,
+        so later lookups hit whether or not they name the catalog/schema. Returns the number of tables cached.
+        """
+        grouped: dict[tuple, list[ColumnInfo]] = {}
+        for column in fetch_columns(self.sql_conn, schema=schema, catalog=catalog):
+            grouped.setdefault((column.catalog, column.schema, column.table), []).append(column)
+        for (table_catalog, table_schema, table), columns in grouped.items():
+            columns = tuple(sorted(columns, key=lambda c: c.ordinal or 0))
+            for key_catalog, key_schema in {(table_catalog, table_schema), (catalog, schema)}:
+                self._put(self._key('columns', key_catalog, key_schema, table), columns)
+        logger.info(f'Schema cache warmed with {len(grouped)} tables')
+        return len(grouped)
+
+    def invalidate(self, table: str | None = None, schema: str | None = None, catalog: str | None = None) -> int:
+        """ Drop cached lookups matching every given name. No arguments clears the cache. Returns entries dropped. """
+        wanted = (_norm(catalog), _norm(schema), _norm(table))
+        with self._lock:
+            stale = [key for key in self._entries
+                     if all(w is None or k is None or w == k for w, k in zip(wanted, key[3:]))]
+            for key in stale:
+                del self._entries[key]
+        return len(stale)
+
+    def save(self, path: Union[str, Path, None] = None):
+        """ Write unexpired entries to path atomically, so a cold start can skip the catalog queries. """
+        path = Path(path) if path is not None else self.path
+        if path is None:
+            raise ValueError('No path given to save the schema cache to')
+        with self._lock:
+            entries = [{'key': list(key), 'stored_at': stored_at, 'items': [asdict(i) for i in items]}
+                       for key, (stored_at, items) in self._entries.items()]
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_name(f'{path.name}.tmp')
+        with open(tmp_path, 'w') as file:
+            server, database = self._target()
+            json.dump({'version': CACHE_FORMAT_VERSION, 'server': server, 'database': database,
+                       'entries': entries}, file)
+        os.replace(tmp_path, path)
+
+    def load(self, path: Union[str, Path, None] = None) -> int:
+        """
+        Load entries saved by save(), skipping expired ones. A file saved against another server or database
+        is rejected. Returns the number loaded.
+        """
+        path = Path(path) if path is not None else self.path
+        try:
+            with open(path, 'r') as file:
+                data = json.load(file)
+        except (OSError, ValueError) as e:
+            logger.warning(f'Could not load schema cache {path}: {type(e).__name__}: {e}')
+            return 0
+        if data.get('version') != CACHE_FORMAT_VERSION:
+            return 0
+        target = self._target()
+        if (data.get('server'), data.get('database')) != target:
+            logger.warning(f'Schema cache {path} was saved for {data.get("server")}/{data.get("database")}, '
+                           f'not {target[0]}/{target[1]}; ignoring it')
+            return 0
+        loaded = 0
+        now = self.clock()
+        for entry in data['entries']:
+            if self.ttl is not None and now - entry['stored_at'] >= self.ttl:
+                continue
+            key = tuple(entry['key'])
+            item_type = TableInfo if key[0] == 'tables' else ColumnInfo
+            self._put(key, tuple(item_type(**i) for i in entry['items']), stored_at=entry['stored_at'])
+            loaded += 1
+        return loaded
@@ -0,0 +1,10 @@
+from .harness import (
+    BenchContext,
+    Timing,
+    benchmark,
+    measure,
+    run_benchmarks,
+    compare_results,
+    load_results,
+    save_results,
+)
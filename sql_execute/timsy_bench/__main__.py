@@ -0,0 +1,43 @@
+"""
+Run the benchmark suite from the sql_execute directory:
+    python -m timsy_bench --output bench.json
+    python -m timsy_bench --baseline bench.json --threshold 0.15
+Exits with status 1 when any metric regressed past the threshold.
+"""
+
+import argparse
+import sys
+
+import timsy_log
+
+from . import benchmarks  # noqa: F401 - registers the benchmarks
+from .harness import run_benchmarks, save_results, load_results, compare_results
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(prog='timsy_bench', description='SqlConn hot path benchmarks')
+    parser.add_argument('names', nargs='*', help='Benchmarks to run, default all')
+    parser.add_argument('--output', help='Write JSON results to this file')
+    parser.add_argument('--baseline', help='Compare against JSON results saved by a previous run')
+    parser.add_argument('--threshold', type=float, default=0.10, help='Allowed slowdown ratio, default 0.10')
+    parser.add_argument('--scale', type=float, default=1.0, help='Workload size multiplier, default 1.0')
+    parser.add_argument('--verbose', action='store_true', help='Keep INFO console logging during the run')
+    args = parser.parse_args(argv)
+
+    timsy_log.init_root_logger()
+
+    results = run_benchmarks(args.names or None, scale=args.scale, quiet=not args.verbose)
+    if args.output:
+        save_results(results, args.output)
+    if args.baseline:
+        regressions = compare_results(results, load_results(args.baseline), args.threshold)
+        for regression in regressions:
+            print(f'REGRESSION {regression}', file=sys.stderr)
+        if regressions:
+            return 1
+        print(f'No regressions beyond {args.threshold:.0%}', file=sys.stderr)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
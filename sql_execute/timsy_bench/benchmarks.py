@@ -0,0 +1,455 @@
+""" Benchmarks for the SqlConn hot paths, run against the sqlite backend so no SQL Server is needed. """
+
+import logging
+import os
+import queue
+import statistics
+import subprocess
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+from sql_backend import LatencyInjector, sqlite_connect
+from sql_conn import SqlConn, precursor
+from sql_fanout import FanOut
+from sql_hooks import QueryHook, LatencyHistogram, instrument, register_hook, registered_hooks, unregister_hook
+from sql_leaks import disable_leak_tracking, enable_leak_tracking, tracker
+from sql_pool import SqlConnPool
+from sql_scheduler import BATCH, QueryScheduler, WorkloadClass, use_workload
+from timsy_config import Config
+from timsy_file.sql_file import get_scripts
+from timsy_file.sql_manifest import ScriptManifest
+from timsy_log import BatchRotatingFileHandler, BoundedQueueHandler
+from timsy_log.queue_logging import BatchingQueueListener
+from timsy_temp_service.appdata_service import AppDataService
+
+from .harness import BenchContext, benchmark, measure
+
+FETCH_BATCH_SIZES = (1, 100, 1000, 10000)
+LOG_THREADS = 8
+IMPORT_MODULES = ('timsy_log', 'timsy_config', 'timsy_file.sql_file', 'sql_conn')
+# Modules that must only be imported on first use, never as a side effect of importing the package.
+DEFERRED_MODULES = ('pyodbc', 'logging.handlers', 'sqlite3', 'gzip', 'sql_backend', 'sql_columnar', 'sql_export',
+                    'sql_pipeline', 'sql_result_cache', 'sql_retry', 'sql_scheduler')
+PACKAGE_DIR = Path(__file__).resolve().parent.parent
+
+
+def write_config(ctx: BenchContext) -> Path:
+    path = ctx.work_dir / 'config.ini'
+    path.write_text('[DEFAULT]\n'
+                    'driver = sqlite\n'
+                    'server = local\n'
+                    f'database = {ctx.work_dir / "bench.db"}\n'
+                    'trusted_connection = yes\n'
+                    'loggerName = TimsyAppLogger\n'
+                    'sqlCount = 86\n')
+    return path
+
+
+@contextmanager
+def bench_sql_conn(ctx: BenchContext):
+    """ SqlConn on a private sqlite pool, closed on exit so repeated runs don't leave connections open. """
+    config = Config(config_file=str(write_config(ctx)))
+    pool = SqlConnPool(sqlite_connect)
+    try:
+        yield SqlConn(config=config, pool=pool)
+    finally:
+        pool.close()
+
+
+def seed_rows(sql_conn: SqlConn, rows: int):
+    sql_conn.execute('CREATE TABLE IF NOT EXISTS bench (id INTEGER, name VARCHAR(30), amount REAL)')
+    sql_conn.bulk_insert('bench', ['id', 'name', 'amount'], ((i, f'name{i % 100}', i * 0.25) for i in range(rows)))
+
+
+@precursor
+def _select_one(sql_conn: SqlConn, cursor=None):
+    cursor.execute('SELECT 1')
+    cursor.fetchall()
+
+
+@benchmark('connect')
+def bench_connect(ctx: BenchContext) -> dict[str, float]:
+    database = str(ctx.work_dir / 'bench.db')
+    raw = measure(lambda: sqlite_connect('local', database, 'yes').close(), number=ctx.n(200))
+    pool = SqlConnPool(sqlite_connect)
+
+    def checkout():
+        with pool.connection('local', database, 'yes'):
+            pass
+
+    try:
+        pooled = measure(checkout, number=ctx.n(5000))
+    finally:
+        pool.close()
+    return {'raw_connect_s': raw.median, 'pooled_checkout_s': pooled.median}
+
+
+@benchmark('precursor')
+def bench_precursor(ctx: BenchContext) -> dict[str, float]:
+    with bench_sql_conn(ctx) as sql_conn:
+        with sql_conn.borrow_connection() as conn:
+            cursor = conn.cursor()
+
+            def direct():
+                cursor.execute('SELECT 1')
+                cursor.fetchall()
+
+            direct_timing = measure(direct, number=ctx.n(5000))
+            cursor.close()
+        wrapped_timing = measure(lambda: _select_one(sql_conn), number=ctx.n(5000))
+        return {
+            'direct_query_s': direct_timing.median,
+            'precursor_query_s': wrapped_timing.median,
+            'precursor_overhead_s': max(0.0, wrapped_timing.median - direct_timing.median),
+        }
+
+
+@benchmark('hooks')
+def bench_hooks(ctx: BenchContext) -> dict[str, float]:
+    """
+    Cost of the precursor path with no hooks, a no-op hook and the latency histogram registered, and of the
+    instrument() call every cursor goes through when no hooks are registered.
+    """
+    with bench_sql_conn(ctx) as sql_conn:
+        number = ctx.n(5000)
+        if registered_hooks():
+            raise RuntimeError('Hooks are already registered; the no-hooks timings would include them')
+        with sql_conn.borrow_connection() as conn:
+            cursor = conn.cursor()
+            metrics = {'instrument_no_hooks_s': measure(lambda: instrument(cursor, 'bench'),
+                                                        number=ctx.n(100000)).median}
+            cursor.close()
+        metrics['no_hooks_query_s'] = measure(lambda: _select_one(sql_conn), number=number).median
+        for label, hook in (('noop_hook', QueryHook()), ('histogram_hook', LatencyHistogram())):
+            register_hook(hook)
+            try:
+                metrics[f'{label}_query_s'] = measure(lambda: _select_one(sql_conn), number=number).median
+            finally:
+                unregister_hook(hook)
+        metrics['hook_overhead_s'] = max(0.0, metrics['histogram_hook_query_s'] - metrics['no_hooks_query_s'])
+        return metrics
+
+
+@benchmark('leak_tracking')
+def bench_leak_tracking(ctx: BenchContext) -> dict[str, float]:
+    """ Cost of the precursor path with connection and cursor tracking off and on. """
+    with bench_sql_conn(ctx) as sql_conn:
+        number = ctx.n(5000)
+        metrics = {'untracked_query_s': measure(lambda: _select_one(sql_conn), number=number).median}
+        enable_leak_tracking()
+        try:
+            metrics['tracked_query_s'] = measure(lambda: _select_one(sql_conn), number=number).median
+            # The query timings are noisy next to the few microseconds tracking costs; time one resource directly.
+            metrics['track_untrack_s'] = measure(lambda: tracker.untrack(tracker.track('cursor', 'bench')),
+                                                 number=ctx.n(100000)).median
+        finally:
+            disable_leak_tracking()
+        metrics['tracking_overhead_s'] = max(0.0, metrics['tracked_query_s'] - metrics['untracked_query_s'])
+        return metrics
+
+
+@benchmark('fetch')
+def bench_fetch(ctx: BenchContext) -> dict[str, float]:
+    with bench_sql_conn(ctx) as sql_conn:
+        rows = ctx.n(200000)
+        seed_rows(sql_conn, rows)
+        metrics = {}
+        for batch_size in FETCH_BATCH_SIZES:
+            timing = measure(lambda: sum(1 for _ in sql_conn.stream('SELECT * FROM bench', batch_size=batch_size)),
+                             number=1, repeat=3)
+            metrics[f'stream_batch_{batch_size}_rows_per_sec'] = rows / timing.median
+
+        def fetchall():
+            with sql_conn.borrow_connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute('SELECT * FROM bench')
+                cursor.fetchall()
+                cursor.close()
+
+        metrics['fetchall_rows_per_sec'] = rows / measure(fetchall, number=1, repeat=3).median
+        metrics['columnar_rows_per_sec'] = rows / measure(lambda: sql_conn.fetch_columnar('SELECT * FROM bench'),
+                                                          number=1, repeat=3).median
+        return metrics
+
+
+@benchmark('export')
+def bench_export(ctx: BenchContext) -> dict[str, float]:
+    with bench_sql_conn(ctx) as sql_conn:
+        rows = ctx.n(200000)
+        seed_rows(sql_conn, rows)
+        metrics = {}
+        for format, name in (('csv', 'export.csv'), ('jsonl', 'export.jsonl'), ('columnar', 'export.col'),
+                             ('csv', 'export.csv.gz')):
+            label = name.replace('export.', '').replace('.', '_')
+            results = [sql_conn.export('SELECT * FROM bench', str(ctx.work_dir / name), format=format)
+                       for _ in range(3)]
+            metrics[f'export_{label}_rows_per_sec'] = sorted(r.rows_per_second for r in results)[1]
+        return metrics
+
+
+@benchmark('fan_out')
+def bench_fan_out(ctx: BenchContext) -> dict[str, float]:
+    """ One query over several databases behind a 10ms link, one SqlConn after another versus FanOut. """
+    with bench_sql_conn(ctx) as sql_conn:
+        seed_rows(sql_conn, ctx.n(2000))
+        query = 'SELECT name, COUNT(*), SUM(amount) FROM bench GROUP BY name'
+        targets = [{'name': f'tenant{i}', 'database': str(ctx.work_dir / 'bench.db')} for i in range(max(4, ctx.n(16)))]
+        pool = SqlConnPool(LatencyInjector(sqlite_connect, round_trip=0.01), max_size=8)
+
+        def sequential():
+            for target in targets:
+                list(SqlConn(config=sql_conn.config, config_override=target, pool=pool).stream(query))
+
+        def fanned_out():
+            FanOut(targets, max_concurrency=8, config=sql_conn.config, pool=pool).fetch(query)
+
+        try:
+            metrics = {'sequential_s': measure(sequential, number=1, repeat=3).median,
+                       'fan_out_s': measure(fanned_out, number=1, repeat=3).median}
+        finally:
+            pool.close()
+        metrics['fan_out_speedup'] = metrics['sequential_s'] / metrics['fan_out_s']
+        return metrics
+
+
+STAGE_STATEMENTS = ('DROP TABLE IF EXISTS stage',
+                    'CREATE TABLE stage (id INTEGER, name VARCHAR(30))',
+                    'INSERT INTO stage SELECT id, name FROM bench WHERE id < ?',
+                    'SELECT name, COUNT(*) FROM stage GROUP BY name',
+                    'DROP TABLE IF EXISTS stage')
+
+
+@precursor
+def _stage_one_by_one(sql_conn: SqlConn, cursor=None):
+    for statement in STAGE_STATEMENTS:
+        cursor.execute(statement, [100]) if '?' in statement else cursor.execute(statement)
+        if cursor.description is not None:
+            cursor.fetchall()
+    cursor.connection.commit()
+
+
+@benchmark('pipeline')
+def bench_pipeline(ctx: BenchContext) -> dict[str, float]:
+    """ The five statement stage-temp-table pattern behind a 5ms link, one execute each versus one pipeline. """
+    with bench_sql_conn(ctx) as sql_conn:
+        seed_rows(sql_conn, ctx.n(2000))
+        latency = LatencyInjector(sqlite_connect, round_trip=0.005)
+        slow_conn = SqlConn(config=sql_conn.config, pool=SqlConnPool(latency))
+
+        def pipelined():
+            pipeline = slow_conn.pipeline()
+            for statement in STAGE_STATEMENTS:
+                pipeline.add(statement, [100] if '?' in statement else None)
+            pipeline.run()
+
+        number = ctx.n(20)
+        try:
+            metrics = {'one_by_one_s': measure(lambda: _stage_one_by_one(slow_conn), number=number).median,
+                       'pipelined_s': measure(pipelined, number=number).median}
+            latency.round_trips = 0
+            _stage_one_by_one(slow_conn)
+            metrics['one_by_one_round_trips'] = latency.round_trips
+            latency.round_trips = 0
+            pipelined()
+            metrics['pipelined_round_trips'] = latency.round_trips
+        finally:
+            slow_conn.pool.close()
+        metrics['pipeline_speedup'] = metrics['one_by_one_s'] / metrics['pipelined_s']
+        return metrics
+
+
+@benchmark('scheduler')
+def bench_scheduler(ctx: BenchContext) -> dict[str, float]:
+    """
+    Latency of short interactive lookups while eight threads run 50ms batch reports through a pool of four
+    connections, first with every statement competing for the pool, then with batch work capped at two slots.
+    """
+    config = Config(config_file=str(write_config(ctx)))
+    latency = LatencyInjector(sqlite_connect, round_trip=0.001, durations=lambda sql: 0.05 if 'report' in sql else 0)
+    lookups = ctx.n(20)
+
+    def interactive_latencies(scheduler: QueryScheduler | None) -> list[float]:
+        sql_conn = SqlConn(config=config, pool=SqlConnPool(latency, max_size=4), scheduler=scheduler)
+        stop = threading.Event()
+
+        def reports():
+            with use_workload(BATCH):
+                # A short pause between reports, or a releasing thread barges straight back into the pool.
+                while not stop.wait(0.005):
+                    sql_conn.execute("SELECT 'report'")
+
+        workers = [threading.Thread(target=reports) for _ in range(8)]
+        latencies = []
+        try:
+            for worker in workers:
+                worker.start()
+            time.sleep(0.1)
+            for _ in range(lookups):
+                started = time.perf_counter()
+                sql_conn.execute('SELECT 1')
+                latencies.append(time.perf_counter() - started)
+        finally:
+            stop.set()
+            for worker in workers:
+                if worker.is_alive():
+                    worker.join()
+            sql_conn.pool.close()
+        return sorted(latencies)
+
+    unscheduled = interactive_latencies(None)
+    scheduler = QueryScheduler((WorkloadClass('interactive', 0, 4, 64), WorkloadClass(BATCH, 1, 2, 64)),
+                               max_concurrency=4)
+    scheduled = interactive_latencies(scheduler)
+    p95 = int(lookups * 0.95) - 1
+    return {'unscheduled_p50_s': statistics.median(unscheduled), 'unscheduled_p95_s': unscheduled[p95],
+            'scheduled_p50_s': statistics.median(scheduled), 'scheduled_p95_s': scheduled[p95],
+            'batch_queue_wait_p95_s': scheduler.stats(BATCH).queue_wait.percentile(95)}
+
+
+@benchmark('bulk_load')
+def bench_bulk_load(ctx: BenchContext) -> dict[str, float]:
+    with bench_sql_conn(ctx) as sql_conn:
+        rows = ctx.n(100000)
+        sql_conn.execute('CREATE TABLE bench (id INTEGER, name VARCHAR(30), amount REAL)')
+        samples = []
+        for _ in range(3):
+            sql_conn.execute('DELETE FROM bench')
+            samples.append(sql_conn.bulk_insert('bench', ['id', 'name', 'amount'],
+                                                ((i, f'name{i % 100}', i * 0.25) for i in range(rows))).rows_per_second)
+        return {'bulk_insert_rows_per_sec': sorted(samples)[1]}
+
+
+@benchmark('script_discovery')
+def bench_script_discovery(ctx: BenchContext) -> dict[str, float]:
+    scripts_dir = ctx.work_dir / 'scripts'
+    scripts_dir.mkdir()
+    files = ctx.n(20000)
+    for i in range(files):
+        suffix = '.sql' if i % 10 else '.txt'
+        (scripts_dir / f'script_{i:06d}{suffix}').write_text(f'SELECT {i};\nGO\n')
+    timing = measure(lambda: get_scripts(scripts_dir), number=1, repeat=5)
+    scripts = get_scripts(scripts_dir)
+    cold = measure(lambda: ScriptManifest(ctx.work_dir / 'manifest.json').hash_scripts(scripts), number=1, repeat=3)
+    manifest = ScriptManifest(ctx.work_dir / 'manifest.json')
+    manifest.hash_scripts(scripts)
+    warm = measure(lambda: manifest.hash_scripts(scripts), number=1, repeat=3)
+    return {'get_scripts_s': timing.median, 'get_scripts_files_per_sec': files / timing.median,
+            'manifest_hash_cold_s': cold.median, 'manifest_hash_warm_s': warm.median}
+
+
+@benchmark('appdata')
+def bench_appdata(ctx: BenchContext) -> dict[str, float]:
+    """ Per-call cost of saving app data written through, write-behind and as journaled updates. """
+    number = ctx.n(200)
+    state = {f'script_{i}': {'ok': True, 'elapsed': i / 10} for i in range(200)}
+    through = AppDataService('bench', ctx.work_dir / 'through', ctx.work_dir / 'through_local', flush_interval=None)
+    behind = AppDataService('bench', ctx.work_dir / 'behind', ctx.work_dir / 'behind_local', flush_interval=1.0)
+    journaled = AppDataService('bench', ctx.work_dir / 'journal', ctx.work_dir / 'journal_local',
+                               flush_interval=None)
+    try:
+        metrics = {
+            'save_write_through_s': measure(lambda: through.save_data('state.json', state), number=number).median,
+            'save_write_behind_s': measure(lambda: behind.save_data('state.json', state), number=number).median,
+            'update_journaled_s': measure(lambda: journaled.update_data('state.json', {'script_0': {'ok': False}}),
+                                          number=number).median}
+    finally:
+        for service in (through, behind, journaled):
+            service.close()
+    return metrics
+
+
+@benchmark('config')
+def bench_config(ctx: BenchContext) -> dict[str, float]:
+    path = str(write_config(ctx))
+    config = Config(config_file=path)
+    lookups = measure(lambda: config.get('DEFAULT', 'server'), number=ctx.n(20000))
+    typed = measure(lambda: config.get_int('DEFAULT', 'sqlCount'), number=ctx.n(20000))
+    construct = measure(lambda: Config(config_file=path), number=ctx.n(500))
+    return {'config_get_s': lookups.median, 'config_get_int_s': typed.median, 'config_init_s': construct.median}
+
+
+def _log_call_latency(logger: logging.Logger, threads: int, calls: int) -> float:
+    """ Mean seconds per logger.info call with threads logging concurrently. """
+    start = threading.Barrier(threads + 1)
+    elapsed = []
+
+    def worker():
+        start.wait()
+        began = time.perf_counter()
+        for i in range(calls):
+            logger.info(f'Getting key{i} from DEFAULT')
+        elapsed.append(time.perf_counter() - began)
+
+    workers = [threading.Thread(target=worker) for _ in range(threads)]
+    for w in workers:
+        w.start()
+    start.wait()
+    for w in workers:
+        w.join()
+    return sum(elapsed) / (threads * calls)
+
+
+@benchmark('logging')
+def bench_logging(ctx: BenchContext) -> dict[str, float]:
+    """ Per-call latency of a synchronous FileHandler versus queue mode, under concurrent threads. """
+    calls = ctx.n(5000)
+    formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    logger = logging.getLogger('timsy_bench.logging')
+    logger.propagate = False
+    logger.setLevel(logging.DEBUG)
+
+    sync_handler = logging.FileHandler(ctx.work_dir / 'sync.log')
+    sync_handler.setFormatter(formatter)
+    logger.addHandler(sync_handler)
+    sync = _log_call_latency(logger, LOG_THREADS, calls)
+    logger.removeHandler(sync_handler)
+    sync_handler.close()
+
+    file_handler = BatchRotatingFileHandler(ctx.work_dir / 'queued.log', maxBytes=64 * 1024 * 1024, backupCount=1)
+    file_handler.setFormatter(formatter)
+    log_queue = queue.Queue(maxsize=100000)
+    queue_handler = BoundedQueueHandler(log_queue)
+    listener = BatchingQueueListener(log_queue, [file_handler])
+    listener.start()
+    logger.addHandler(queue_handler)
+    queued = _log_call_latency(logger, LOG_THREADS, calls)
+    logger.removeHandler(queue_handler)
+    drain_started = time.perf_counter()
+    listener.stop()
+    drain = time.perf_counter() - drain_started
+    file_handler.close()
+    return {'sync_log_call_s': sync, 'queue_log_call_s': queued, 'queue_shutdown_flush_s': drain,
+            'queue_log_speedup': sync / queued}
+
+
+def _import_time(module: str, cwd: Path) -> float:
+    """ Cumulative seconds python -X importtime reports for module in a fresh interpreter. """
+    check = f'import sys, {module}; print(*[m for m in {DEFERRED_MODULES!r} if m in sys.modules])'
+    env = {**os.environ, 'PYTHONPATH': os.pathsep.join(filter(None, [str(PACKAGE_DIR), os.environ.get('PYTHONPATH')]))}
+    proc = subprocess.run([sys.executable, '-X', 'importtime', '-c', check], cwd=cwd, env=env,
+                          capture_output=True, text=True, check=True)
+    if proc.stdout.strip():
+        raise RuntimeError(f'Importing {module} eagerly imported {proc.stdout.strip()}')
+    for line in reversed(proc.stderr.splitlines()):
+        parts = [p.strip() for p in line.split('|')]
+        if len(parts) == 3 and parts[2] == module:
+            return int(parts[1]) / 1e6
+    raise RuntimeError(f'No importtime line for {module}')
+
+
+@benchmark('import')
+def bench_import(ctx: BenchContext) -> dict[str, float]:
+    """ Cold import time per module, failing if an import creates files or pulls in a deferred dependency. """
+    metrics = {}
+    for module in IMPORT_MODULES:
+        cwd = ctx.work_dir / module
+        cwd.mkdir()
+        _import_time(module, cwd)  # warm-up run, discarded
+        metrics[f'import_{module.replace(".", "_")}_s'] = statistics.median(
+            _import_time(module, cwd) for _ in range(ctx.n(5)))
+        if any(cwd.iterdir()):
+            raise RuntimeError(f'Importing {module} created {", ".join(p.name for p in cwd.iterdir())}')
+    return metrics
@@ -0,0 +1,135 @@
+""" Minimal benchmark harness: registry, timing, JSON results and baseline comparison. """
+
+import json
+import logging
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Callable
+
+# Metric name suffixes decide the direction of a regression.
+LOWER_IS_BETTER = ('_s', '_bytes')
+HIGHER_IS_BETTER = ('_per_sec', '_speedup')
+
+_registry: dict[str, Callable[['BenchContext'], dict[str, float]]] = {}
+
+
+@dataclass
+class BenchContext:
+    """ Shared scratch space for one run. scale shrinks or grows every benchmark's workload. """
+    work_dir: Path
+    scale: float = 1.0
+    extra: dict = field(default_factory=dict)
+
+    def n(self, count: int) -> int:
+        return max(1, int(count * self.scale))
+
+
+@dataclass
+class Timing:
+    per_op: list[float]
+
+    @property
+    def best(self) -> float:
+        return min(self.per_op)
+
+    @property
+    def median(self) -> float:
+        return statistics.median(self.per_op)
+
+
+def benchmark(name: str):
+    """ Register fn(ctx) -> {metric: value} under name. """
+    def decorator(fn):
+        _registry[name] = fn
+        return fn
+
+    return decorator
+
+
+def measure(func: Callable[[], object], number: int = 1000, repeat: int = 5) -> Timing:
+    """ Seconds per call of func, one sample per repeat of number calls. """
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        for _ in range(number):
+            func()
+        samples.append((time.perf_counter() - started) / number)
+    return Timing(per_op=samples)
+
+
+def _quiet_console():
+    """ Raise console handlers to WARNING so INFO logging on hot paths doesn't flood the terminal. """
+    changed = []
+    for handler in logging.getLogger().handlers:
+        if type(handler) is logging.StreamHandler and handler.level < logging.WARNING:
+            changed.append((handler, handler.level))
+            handler.setLevel(logging.WARNING)
+    return changed
+
+
+def run_benchmarks(names: list[str] | None = None, scale: float = 1.0, quiet: bool = True) -> dict:
+    selected = names or list(_registry)
+    unknown = [n for n in selected if n not in _registry]
+    if unknown:
+        raise ValueError(f'Unknown benchmarks: {", ".join(unknown)}')
+    restore = _quiet_console() if quiet else []
+    results = {}
+    try:
+        for name in selected:
+            with tempfile.TemporaryDirectory(prefix=f'timsy_bench_{name}_') as work_dir:
+                ctx = BenchContext(work_dir=Path(work_dir), scale=scale)
+                started = time.perf_counter()
+                metrics = _registry[name](ctx)
+                results[name] = {k: float(v) for k, v in metrics.items()}
+                print(f'{name}: ' + ', '.join(f'{k}={v:.6g}' for k, v in results[name].items())
+                      + f' ({time.perf_counter() - started:.1f}s)', file=sys.stderr)
+    finally:
+        for handler, level in restore:
+            handler.setLevel(level)
+    return {
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'scale': scale,
+        'timestamp': time.time(),
+        'results': results,
+    }
+
+
+def save_results(results: dict, path: str | Path):
+    with open(path, 'w') as f:
+        json.dump(results, f, indent=2, sort_keys=True)
+
+
+def load_results(path: str | Path) -> dict:
+    with open(path, 'r') as f:
+        return json.load(f)
+
+
+def compare_results(current: dict, baseline: dict, threshold: float = 0.10) -> list[str]:
+    """
+    Describe every metric that got worse than baseline by more than threshold (0.10 = 10%).
+    Metrics without a known direction suffix, or missing from either side, are not compared.
+    """
+    regressions = []
+    for name, metrics in current['results'].items():
+        base_metrics = baseline.get('results', {}).get(name, {})
+        for metric, value in metrics.items():
+            base = base_metrics.get(metric)
+            if not base:
+                continue
+            if metric.endswith(LOWER_IS_BETTER):
+                change = (value - base) / base
+            elif metric.endswith(HIGHER_IS_BETTER):
+                change = (base - value) / base
+            else:
+                continue
+            if change > threshold:
+                regressions.append(f'{name}.{metric}: {base:.6g} -> {value:.6g} ({change:+.1%} worse)')
+    return regressions
@@ -1,4 +1,9 @@
 LOGGER_NAME = 'TimsyConfig'
 from .config import (
     Config
-)
\ No newline at end of file
+)
+from .registry import (
+    ConfigSnapshot,
+    reload_config,
+    set_poll_interval
+)
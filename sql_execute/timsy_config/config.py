@@ -1,7 +1,8 @@
 import configparser
-from pathlib import Path
+import os
 
 import timsy_log as logging
+from .registry import _MISSING, ConfigSnapshot, registry
 
 CONFIG_FILE = 'config.ini'
 # module_logger = logging.getLogger(f'MainAppLogger.{__name__}')
@@ -49,54 +50,78 @@ def reset_default_config_file():
 @config_error_handler
 def check_config_file(config_file: str = CONFIG_FILE):
     # Check if the config file exists
-    if not Path(config_file).exists():
+    if not os.path.exists(config_file):
         raise FileNotFoundError(f"Config file '{config_file}' not found.")
     # Check reader can open config file
     with open(config_file, 'r') as f:
         return True
 
 
+def _recreate_default_config(config_file: str):
+    module_logger.error(f"FileNotFoundError: Config file '{config_file}' not found.")
+    reset_default_config_file()
+
+
 class Config:
+    """
+    Read-only view of a config file. Files are parsed once per process into an immutable snapshot shared by
+    every Config on the same path, so constructing one does not touch the filesystem. The snapshot is swapped
+    when the file changes on disk, checked at most once per poll interval or on demand with reload_config().
+    """
+
     def __init__(self, config_file: str = CONFIG_FILE):
-        try:
-            check_config_file(config_file)
-        except FileNotFoundError as fnfe:
-            reset_default_config_file()
-        self.config = configparser.ConfigParser()
-        self.config.read(config_file)
+        self._source = registry.source(config_file, on_missing=_recreate_default_config)
         self.logger = module_logger
 
-    @config_error_handler
+    @property
+    def config(self) -> configparser.ConfigParser:
+        """ The parser behind the current snapshot. Shared between instances, do not modify. """
+        return self._source.current().parser
+
+    def snapshot(self) -> ConfigSnapshot:
+        """ The current snapshot, for reading several values that must come from the same version of the file. """
+        return self._source.current()
+
+    def _lookup(self, table: str, section: str, key: str, parse: str | None = None):
+        snapshot = self._source.current()
+        value = snapshot.lookup(getattr(snapshot, table), section, key, _MISSING)
+        if value is not _MISSING:
+            return value
+        if parse is not None and snapshot.has(section, key):
+            # Present but not convertible: let configparser raise its usual error.
+            return config_error_handler(getattr(snapshot.parser, parse))(section, key)
+        module_logger.debug(f'{key} not found in {section}')
+        return None
+
     def get(self, section='DEFAULT', key=''):
-        module_logger.info(f'Getting {key} from {section}')
-        return self.config[section][key]
+        return self._lookup('sections', section, key)
 
-    @config_error_handler
     def get_int(self, section='DEFAULT', key=''):
-        return self.config.getint(section, key)
+        return self._lookup('ints', section, key, 'getint')
 
-    @config_error_handler
     def get_float(self, section='DEFAULT', key=''):
-        return self.config.getfloat(section, key)
+        return self._lookup('floats', section, key, 'getfloat')
 
-    @config_error_handler
     def get_boolean(self, section='DEFAULT', key=''):
-        return self.config.getboolean(section, key)
+        return self._lookup('bools', section, key, 'getboolean')
 
-    @config_error_handler
     def get_list(self, section='DEFAULT', key=''):
-        return self.config[section][key].split(',')
+        values = self._lookup('lists', section, key)
+        return list(values) if values is not None else None
 
-    @config_error_handler
     def get_section(self, section='DEFAULT'):
-        return dict(self.config[section])
+        values = self._source.current().sections.get(section)
+        if values is None:
+            module_logger.warning(f"KeyError: '{section}'")
+            return None
+        return dict(values)
 
-    @config_error_handler
     def get_sections(self):
-        return self.config.sections()
+        return list(self._source.current().section_names)
 
 
 if __name__ == '__main__':
+    logging.init_root_logger()
     config = Config(config_file='../config.ini')
     print(config.get('DEFAULT', 'applicationIcon'))
     print(config.get('DEFAULT', 'sqlFolder'))
@@ -0,0 +1,171 @@
+""" Process-wide registry of parsed config files, served from immutable snapshots. """
+
+import configparser
+import os
+import threading
+import time
+from dataclasses import dataclass
+from types import MappingProxyType
+from typing import Callable, Mapping
+
+import timsy_log as logging
+
+module_logger = logging.getLogger(__name__)
+
+DEFAULT_POLL_INTERVAL = 1.0
+_MISSING = object()
+
+
+def _typed(values: Mapping[str, str], convert: Callable[[str], object]) -> Mapping[str, object]:
+    converted = {}
+    for key, value in values.items():
+        try:
+            converted[key] = convert(value)
+        except ValueError:
+            pass
+    return MappingProxyType(converted)
+
+
+def _to_bool(value: str) -> bool:
+    try:
+        return configparser.ConfigParser.BOOLEAN_STATES[value.lower()]
+    except KeyError:
+        raise ValueError(f'Not a boolean: {value}') from None
+
+
+@dataclass(frozen=True)
+class ConfigSnapshot:
+    """ One parse of a config file with every value pre-converted. Never mutated after creation. """
+    path: str
+    signature: tuple[int, int] | None
+    parser: configparser.ConfigParser
+    sections: Mapping[str, Mapping[str, str]]
+    ints: Mapping[str, Mapping[str, int]]
+    floats: Mapping[str, Mapping[str, float]]
+    bools: Mapping[str, Mapping[str, bool]]
+    lists: Mapping[str, Mapping[str, tuple[str, ...]]]
+    section_names: tuple[str, ...]
+
+    @classmethod
+    def parse(cls, path: str, signature: tuple[int, int] | None) -> 'ConfigSnapshot':
+        parser = configparser.ConfigParser()
+        parser.read(path)
+        sections = {name: MappingProxyType(dict(parser[name])) for name in [parser.default_section,
+                                                                            *parser.sections()]}
+        return cls(
+            path=path,
+            signature=signature,
+            parser=parser,
+            sections=MappingProxyType(sections),
+            ints=MappingProxyType({s: _typed(v, int) for s, v in sections.items()}),
+            floats=MappingProxyType({s: _typed(v, float) for s, v in sections.items()}),
+            bools=MappingProxyType({s: _typed(v, _to_bool) for s, v in sections.items()}),
+            lists=MappingProxyType({s: MappingProxyType({k: tuple(x.split(',')) for k, x in v.items()})
+                                    for s, v in sections.items()}),
+            section_names=tuple(parser.sections()),
+        )
+
+    def lookup(self, table: Mapping[str, Mapping[str, object]], section: str, key: str, default=None):
+        values = table.get(section)
+        if values is None:
+            return default
+        value = values.get(key, _MISSING)
+        if value is _MISSING:
+            # configparser stores keys lower-cased.
+            value = values.get(key.lower(), _MISSING)
+        return default if value is _MISSING else value
+
+    def has(self, section: str, key: str) -> bool:
+        return self.lookup(self.sections, section, key, _MISSING) is not _MISSING
+
+
+def _signature(path: str) -> tuple[int, int] | None:
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return stat.st_mtime_ns, stat.st_size
+
+
+class ConfigSource:
+    """
+    The current snapshot of one file. current() re-stats the file at most once per poll_interval and swaps
+    in a new snapshot when its mtime or size changed; readers never take a lock.
+    """
+
+    def __init__(self, path: str, poll_interval: float | None = DEFAULT_POLL_INTERVAL,
+                 on_missing: Callable[[str], None] | None = None):
+        self.path = path
+        self.poll_interval = poll_interval
+        self.on_missing = on_missing
+        self._reload_lock = threading.Lock()
+        self._next_check = 0.0
+        self.snapshot: ConfigSnapshot = self._load()
+
+    def _load(self) -> ConfigSnapshot:
+        signature = _signature(self.path)
+        if signature is None and self.on_missing is not None:
+            self.on_missing(self.path)
+            signature = _signature(self.path)
+        snapshot = ConfigSnapshot.parse(self.path, signature)
+        if self.poll_interval is not None:
+            self._next_check = time.monotonic() + self.poll_interval
+        return snapshot
+
+    def current(self) -> ConfigSnapshot:
+        if self.poll_interval is not None and time.monotonic() >= self._next_check:
+            self.reload_if_changed()
+        return self.snapshot
+
+    def reload_if_changed(self) -> bool:
+        """ Re-parse when the file changed on disk. Returns True if a new snapshot was swapped in. """
+        with self._reload_lock:
+            if self.poll_interval is not None:
+                self._next_check = time.monotonic() + self.poll_interval
+            if _signature(self.path) == self.snapshot.signature:
+                return False
+            self.snapshot = self._load()
+        module_logger.info(f'Reloaded config {self.path}')
+        return True
+
+
+class ConfigRegistry:
+    def __init__(self, poll_interval: float | None = DEFAULT_POLL_INTERVAL):
+        self.poll_interval = poll_interval
+        self._sources: dict[str, ConfigSource] = {}
+        self._lock = threading.Lock()
+
+    def source(self, config_file: str, on_missing: Callable[[str], None] | None = None) -> ConfigSource:
+        key = os.path.abspath(config_file)
+        source = self._sources.get(key)
+        if source is None:
+            with self._lock:
+                source = self._sources.get(key)
+                if source is None:
+                    # Stat the absolute path, so a later chdir doesn't point change checks at another file.
+                    source = self._sources[key] = ConfigSource(key, self.poll_interval, on_missing)
+        return source
+
+    def reload(self, config_file: str | None = None) -> int:
+        """ Check one file, or every registered file, for changes now. Returns how many were reloaded. """
+        sources = [self._sources[os.path.abspath(config_file)]] if config_file else list(self._sources.values())
+        return sum(source.reload_if_changed() for source in sources)
+
+    def clear(self):
+        with self._lock:
+            self._sources.clear()
+
+
+registry = ConfigRegistry()
+
+
+def set_poll_interval(poll_interval: float | None):
+    """ Seconds between change checks for every config file; None disables polling (reload on demand only). """
+    registry.poll_interval = poll_interval
+    for source in list(registry._sources.values()):
+        source.poll_interval = poll_interval
+        source._next_check = 0.0
+
+
+def reload_config(config_file: str | os.PathLike | None = None) -> int:
+    return registry.reload(str(config_file) if config_file is not None else None)
@@ -0,0 +1,193 @@
+""" Content-hash manifest of executed scripts, so a run only executes new, changed or previously failed scripts. """
+
+import hashlib
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import Iterable, Protocol, Union
+
+import timsy_log
+
+logger = timsy_log.getLogger('SqlManifest')
+
+MANIFEST_FORMAT_VERSION = 2
+HASH_CHUNK_SIZE = 1024 * 1024
+DEFAULT_MANIFEST_NAME = 'script_manifest.json'
+
+
+class ManifestStore(Protocol):
+    """ Anything with AppDataService's load_data/save_data signature. """
+
+    def load_data(self, filename: str): ...
+
+    def save_data(self, filename: str, data): ...
+
+
+def hash_file(path: Union[str, Path], chunk_size: int = HASH_CHUNK_SIZE) -> str:
+    """ SHA-256 of the file contents, read in chunks so large scripts are never held in memory whole. """
+    digest = hashlib.sha256()
+    with open(path, 'rb') as file:
+        while chunk := file.read(chunk_size):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def script_key(script: Union[str, Path]) -> str:
+    """ Name a script is referred to by in depends comments: its file name lower-cased, without .sql. """
+    name = Path(script).name.strip()
+    return name[:-4].lower() if name.lower().endswith('.sql') else name.lower()
+
+
+@dataclass
+class ManifestEntry:
+    hash: str
+    ok: bool
+    ran_at: float
+    elapsed: float = 0.0
+    error: str | None = None
+
+
+@dataclass
+class _FileHash:
+    mtime_ns: int
+    size: int
+    hash: str
+
+
+class ScriptManifest:
+    """
+    Last result of every script per target (server/database), keyed by the script's path relative to root, plus
+    a stat-signature cache of file hashes so unchanged files are not re-read.
+    Stored in a local JSON file (path) or through an AppDataService-style store under name.
+    :param root: Directory the scripts live under, the current directory when None. Scripts with the same file
+        name in different subdirectories get separate entries.
+    """
+
+    def __init__(self, path: Union[str, Path, None] = None, store: ManifestStore | None = None,
+                 name: str = DEFAULT_MANIFEST_NAME, root: Union[str, Path, None] = None):
+        if path is None and store is None:
+            raise ValueError('ScriptManifest needs a path or a store')
+        self.path = Path(path) if path is not None else None
+        self.root = os.path.abspath(root if root is not None else os.curdir)
+        self.store = store
+        self.name = name
+        self._targets: dict[str, dict[str, ManifestEntry]] = {}
+        self._hashes: dict[str, _FileHash] = {}
+        self._lock = threading.Lock()
+        self.load()
+
+    @staticmethod
+    def target(server: str, database: str) -> str:
+        return f'{server}/{database}'
+
+    def key(self, script: Union[str, Path]) -> str:
+        """ Entry key of a script: its path relative to root with / separators, lower-cased, without .sql. """
+        resolved = os.path.abspath(script)
+        try:
+            relative = os.path.relpath(resolved, self.root)
+        except ValueError:
+            # On another drive than root (Windows): no relative path exists, keep the absolute one.
+            relative = resolved
+        relative = relative.replace(os.sep, '/').strip().lower()
+        return relative[:-4] if relative.endswith('.sql') else relative
+
+    def load(self) -> int:
+        """ (Re)load from storage. Returns the number of script entries loaded. """
+        try:
+            if self.store is not None:
+                data = self.store.load_data(self.name)
+            else:
+                with open(self.path, 'r') as file:
+                    data = json.load(file)
+        except FileNotFoundError:
+            data = None
+        except (OSError, ValueError) as e:
+            logger.warning(f'Could not load script manifest: {type(e).__name__}: {e}')
+            data = None
+        if not data or data.get('version') != MANIFEST_FORMAT_VERSION:
+            return 0
+        with self._lock:
+            self._targets = {target: {key: ManifestEntry(**entry) for key, entry in entries.items()}
+                             for target, entries in data.get('targets', {}).items()}
+            self._hashes = {path: _FileHash(**h) for path, h in data.get('hashes', {}).items()}
+            return sum(len(entries) for entries in self._targets.values())
+
+    def save(self):
+        """ Persist the manifest; local files are written to a temporary name and renamed into place. """
+        with self._lock:
+            data = {'version': MANIFEST_FORMAT_VERSION,
+                    'targets': {target: {key: asdict(e) for key, e in entries.items()}
+                                for target, entries in self._targets.items()},
+                    'hashes': {path: asdict(h) for path, h in self._hashes.items()}}
+        if self.store is not None:
+            self.store.save_data(self.name, data)
+            return
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.path.with_name(f'{self.path.name}.tmp')
+        with open(tmp_path, 'w') as file:
+            json.dump(data, file)
+        os.replace(tmp_path, self.path)
+
+    def _cached_hash(self, resolved: str, stat: os.stat_result) -> str | None:
+        cached = self._hashes.get(resolved)
+        if cached is not None and cached.mtime_ns == stat.st_mtime_ns and cached.size == stat.st_size:
+            return cached.hash
+        return None
+
+    def _hash(self, resolved: str, stat: os.stat_result) -> str:
+        digest = hash_file(resolved)
+        with self._lock:
+            self._hashes[resolved] = _FileHash(mtime_ns=stat.st_mtime_ns, size=stat.st_size, hash=digest)
+        return digest
+
+    def hash_scripts(self, scripts: Iterable[Path], max_workers: int = 8) -> dict[Path, str]:
+        """
+        Content hash of every script. Files whose mtime and size match the last hash are not re-read; the
+        rest are hashed on a thread pool, since hashlib releases the GIL while digesting.
+        """
+        digests: dict[Path, str] = {}
+        misses: list[tuple[Path, str, os.stat_result]] = []
+        for script in scripts:
+            resolved = os.path.abspath(script)
+            stat = os.stat(resolved)
+            digest = self._cached_hash(resolved, stat)
+            if digest is None:
+                misses.append((script, resolved, stat))
+            else:
+                digests[script] = digest
+        if max_workers <= 1 or len(misses) < 2:
+            digests.update((script, self._hash(resolved, stat)) for script, resolved, stat in misses)
+            return digests
+        with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='SqlManifest') as executor:
+            hashed = executor.map(lambda miss: self._hash(miss[1], miss[2]), misses)
+            digests.update(zip((miss[0] for miss in misses), hashed))
+        return digests
+
+    def entry(self, server: str, database: str, script: Union[str, Path]) -> ManifestEntry | None:
+        return self._targets.get(self.target(server, database), {}).get(self.key(script))
+
+    def is_current(self, server: str, database: str, script: Union[str, Path], digest: str) -> bool:
+        """ True when this exact content already succeeded against the target. """
+        entry = self.entry(server, database, script)
+        return entry is not None and entry.ok and entry.hash == digest
+
+    def record(self, server: str, database: str, script: Union[str, Path], digest: str, ok: bool,
+               elapsed: float = 0.0, error: str | None = None):
+        entry = ManifestEntry(hash=digest, ok=ok, ran_at=time.time(), elapsed=elapsed, error=error)
+        with self._lock:
+            self._targets.setdefault(self.target(server, database), {})[self.key(script)] = entry
+
+    def forget(self, server: str, database: str, scripts: Iterable[Union[str, Path]] | None = None):
+        """ Drop entries for the target, or only the given scripts, so they run again next time. """
+        with self._lock:
+            entries = self._targets.get(self.target(server, database))
+            if entries is None:
+                return
+            if scripts is None:
+                entries.clear()
+            for script in scripts or ():
+                entries.pop(self.key(script), None)
@@ -0,0 +1,173 @@
+""" T-SQL script parsing: GO batch splitting, placeholder extraction and a stat-keyed parse cache. """
+
+import os
+import re
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Union
+
+_GO_LINE = r'[ \t]*[Gg][Oo](?:[ \t]+(?P<count>\d+))?[ \t]*(?:--[^\n]*)?(?=\r?\n|\Z)'
+_LEADING_GO = re.compile(_GO_LINE)
+
+# Each match skips a run of plain SQL, then consumes one construct that can hide a GO. Strings and
+# identifiers use unrolled loops and also accept end of input, so scanning stays linear even when a
+# literal is left unterminated. IGNORECASE is avoided on purpose: it defeats the fast character-run skip.
+_TOKEN = re.compile(r"""[^'"\[\-/$?\n]*(?:
+      (?P<string>'[^']*(?:''[^']*)*(?:'|\Z))
+    | (?P<quoted>"[^"]*(?:""[^"]*)*(?:"|\Z))
+    | (?P<bracket>\[[^\]]*(?:\]\][^\]]*)*(?:\]|\Z))
+    | (?P<line_comment>--[^\n]*)
+    | (?P<block_comment>/\*)
+    | (?P<go>\n""" + _GO_LINE + r""")
+    | (?P<variable>\$\((?P<variable_name>[A-Za-z_]\w*)\))
+    | (?P<placeholder>\?)
+    | (?P<other>[\s\S])
+)""", re.VERBOSE)
+
+_BLOCK_EDGE = re.compile(r'/\*|\*/')
+
+
+@dataclass(frozen=True)
+class SqlBatch:
+    text: str
+    line: int
+    repeat: int = 1
+    placeholders: int = 0
+    variables: tuple[str, ...] = ()
+
+
+@dataclass(frozen=True)
+class ParsedScript:
+    batches: tuple[SqlBatch, ...]
+    path: Path | None = None
+
+    @property
+    def placeholders(self) -> int:
+        return sum(b.placeholders for b in self.batches)
+
+    @property
+    def variables(self) -> tuple[str, ...]:
+        return tuple(dict.fromkeys(v for b in self.batches for v in b.variables))
+
+
+def _skip_block_comment(text: str, pos: int) -> int:
+    """ Position just past the block comment opened before pos. T-SQL block comments nest. """
+    depth = 1
+    while depth:
+        edge = _BLOCK_EDGE.search(text, pos)
+        if edge is None:
+            return len(text)
+        depth += 1 if edge.group() == '/*' else -1
+        pos = edge.end()
+    return pos
+
+
+def parse_sql(text: str, path: Path | None = None) -> ParsedScript:
+    """ Split a T-SQL script into GO separated batches, ignoring GO inside literals, identifiers and comments. """
+    batches = []
+    batch_start = 0
+    batch_line = 1
+    line = 1
+    line_counted_to = 0
+    placeholders = 0
+    variables: dict[str, None] = {}
+
+    def close_batch(end: int, repeat: int):
+        nonlocal placeholders, variables
+        chunk = text[batch_start:end]
+        stripped = chunk.strip()
+        if stripped:
+            leading = chunk[:len(chunk) - len(chunk.lstrip())].count('\n')
+            batches.append(SqlBatch(text=stripped, line=batch_line + leading, repeat=repeat,
+                                    placeholders=placeholders, variables=tuple(variables)))
+        placeholders = 0
+        variables = {}
+
+    pos = 0
+    leading_go = _LEADING_GO.match(text)
+    if leading_go is not None:
+        pos = batch_start = leading_go.end()
+    while True:
+        match = _TOKEN.match(text, pos)
+        if match is None:
+            break
+        kind = match.lastgroup
+        if kind == 'block_comment':
+            pos = _skip_block_comment(text, match.end())
+            continue
+        pos = match.end()
+        if kind == 'other':
+            continue
+        if kind == 'go':
+            close_batch(match.start('go'), int(match.group('count') or 1))
+            line += text.count('\n', line_counted_to, pos)
+            line_counted_to = pos
+            batch_start = pos
+            batch_line = line
+        elif kind == 'placeholder':
+            placeholders += 1
+        elif kind == 'variable':
+            variables[match.group('variable_name')] = None
+    close_batch(len(text), 1)
+    return ParsedScript(batches=tuple(batches), path=path)
+
+
+@dataclass
+class ParseCacheStats:
+    hits: int = 0
+    misses: int = 0
+
+
+@dataclass
+class ParseCache:
+    """ Parsed scripts keyed by resolved path, reused while the file's mtime and size are unchanged. """
+    max_entries: int = 1024
+    stats: ParseCacheStats = field(default_factory=ParseCacheStats)
+    _entries: OrderedDict = field(default_factory=OrderedDict, init=False, repr=False)
+    _lock: threading.Lock = field(default_factory=threading.Lock, init=False, repr=False)
+
+    def get(self, file_path: Union[str, Path]) -> ParsedScript:
+        path = Path(file_path).resolve()
+        stat = os.stat(path)
+        signature = (stat.st_mtime_ns, stat.st_size)
+        with self._lock:
+            entry = self._entries.get(path)
+            if entry is not None and entry[0] == signature:
+                self._entries.move_to_end(path)
+                self.stats.hits += 1
+                return entry[1]
+            self.stats.misses += 1
+        with open(path, 'r') as file:
+            parsed = parse_sql(file.read(), path=path)
+        with self._lock:
+            self._entries[path] = (signature, parsed)
+            self._entries.move_to_end(path)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return parsed
+
+    def invalidate(self, file_path: Union[str, Path, None] = None):
+        with self._lock:
+            if file_path is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(Path(file_path).resolve(), None)
+
+
+default_parse_cache = ParseCache()
+
+
+def parse_script(file_path: Union[str, Path], cache: ParseCache | None = default_parse_cache) -> ParsedScript:
+    if cache is None:
+        with open(file_path, 'r') as file:
+            return parse_sql(file.read(), path=Path(file_path))
+    return cache.get(file_path)
+
+
+if __name__ == '__main__':
+    from .sql_file import get_scripts
+
+    for s in get_scripts():
+        print(s.name, [b.text for b in parse_script(s).batches])
@@ -0,0 +1,220 @@
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import TYPE_CHECKING, Iterable
+
+import timsy_log
+
+from .sql_file import file_names
+from .sql_manifest import ScriptManifest, script_key
+from .sql_parser import ParseCache, default_parse_cache
+
+if TYPE_CHECKING:
+    from sql_conn import SqlConn
+
+logger = timsy_log.getLogger('SqlRunner')
+
+DEPENDS_PATTERN = re.compile(r'^--\s*depends(?:[-_ ]on)?\s*:\s*(.+)$', re.IGNORECASE)
+
+
+@dataclass
+class ScriptResult:
+    path: Path
+    ok: bool = False
+    skipped: bool = False
+    unchanged: bool = False
+    elapsed: float = 0.0
+    error: str | None = None
+
+
+@dataclass
+class RunReport:
+    results: list[ScriptResult] = field(default_factory=list)
+    wall_clock: float = 0.0
+
+    @property
+    def succeeded(self) -> list[ScriptResult]:
+        return [r for r in self.results if r.ok and not r.unchanged]
+
+    @property
+    def unchanged(self) -> list[ScriptResult]:
+        return [r for r in self.results if r.unchanged]
+
+    @property
+    def failed(self) -> list[ScriptResult]:
+        return [r for r in self.results if not r.ok and not r.skipped]
+
+    @property
+    def skipped(self) -> list[ScriptResult]:
+        return [r for r in self.results if r.skipped]
+
+    @property
+    def total_duration(self) -> float:
+        return sum(r.elapsed for r in self.results)
+
+    @property
+    def speedup(self) -> float:
+        return self.total_duration / self.wall_clock if self.wall_clock > 0 else 0.0
+
+    def summary(self) -> str:
+        return (f'{len(self.succeeded)} succeeded, {len(self.failed)} failed, {len(self.skipped)} skipped, '
+                f'{len(self.unchanged)} unchanged; '
+                f'wall clock {self.wall_clock:.3f}s vs {self.total_duration:.3f}s summed '
+                f'({self.speedup:.2f}x speedup)')
+
+
+def read_dependencies(script: Path) -> list[str]:
+    """
+    Prerequisites declared in the script's leading comment block, e.g.
+    -- depends: create_tables.sql, seed_lookups
+    """
+    dependencies = []
+    with open(script, 'r') as file:
+        for line in file:
+            line = line.strip()
+            if not line:
+                continue
+            if not line.startswith('--'):
+                break
+            match = DEPENDS_PATTERN.match(line)
+            if match:
+                dependencies.extend(d for d in (p.strip() for p in match.group(1).split(',')) if d)
+    return dependencies
+
+
+def build_dependency_graph(scripts: list[Path]) -> dict[Path, set[Path]]:
+    """ Map each script to the scripts it depends on. Raises ValueError on unknown names or cycles. """
+    by_key = {script_key(p.name): p for p in scripts}
+    graph: dict[Path, set[Path]] = {}
+    for script in scripts:
+        prerequisites = set()
+        for name in read_dependencies(script):
+            dependency = by_key.get(script_key(name))
+            if dependency is None:
+                raise ValueError(f'{script.name} depends on unknown script {name}')
+            prerequisites.add(dependency)
+        graph[script] = prerequisites
+
+    visiting, done = set(), set()
+    for start in graph:
+        stack = [(start, iter(graph[start]))]
+        visiting.add(start)
+        while stack:
+            node, children = stack[-1]
+            child = next(children, None)
+            if child is None:
+                stack.pop()
+                visiting.discard(node)
+                done.add(node)
+            elif child in visiting:
+                raise ValueError(f'Dependency cycle between {node.name} and {child.name}')
+            elif child not in done:
+                visiting.add(child)
+                stack.append((child, iter(graph[child])))
+    return graph
+
+
+def _run_one(sql_conn: 'SqlConn', script: Path, parse_cache: ParseCache) -> ScriptResult:
+    result = ScriptResult(path=script)
+    started = time.perf_counter()
+    try:
+        parsed = parse_cache.get(script)
+        sql_conn.execute_batches(b.text for b in parsed.batches for _ in range(b.repeat))
+        result.ok = True
+    except Exception as e:
+        result.error = f'{type(e).__name__}: {e}'
+    result.elapsed = time.perf_counter() - started
+    return result
+
+
+def run_scripts(scripts: list[Path], sql_conn: 'SqlConn', max_workers: int = 4,
+                use_dependencies: bool = True, parse_cache: ParseCache = default_parse_cache,
+                manifest: ScriptManifest | None = None, force: bool | Iterable[str | Path] = False) -> RunReport:
+    """
+    Execute scripts concurrently on at most max_workers pooled connections, each script's GO batches in order.
+    Scripts start once every prerequisite has succeeded; dependents of a failed script are skipped.
+    With a manifest, scripts whose current content already succeeded against the same server and database are
+    reported unchanged instead of run, and every executed script's outcome is recorded and saved.
+    :param force: Scripts to run even when unchanged, or True to run everything. A bare name (create_tables.sql)
+        forces every script with that name, a path only that script.
+    """
+    if max_workers < 1:
+        raise ValueError('max_workers must be at least 1')
+    graph = build_dependency_graph(scripts) if use_dependencies else {s: set() for s in scripts}
+    dependents: dict[Path, list[Path]] = {s: [] for s in graph}
+    for script, prerequisites in graph.items():
+        for prerequisite in prerequisites:
+            dependents[prerequisite].append(script)
+    remaining = {s: len(p) for s, p in graph.items()}
+    results: dict[Path, ScriptResult] = {}
+
+    hashes: dict[Path, str] = {}
+    if manifest is not None:
+        forced_names, forced_keys = set(), set()
+        for forced in () if isinstance(force, bool) else force:
+            # A bare name forces every script of that name, a path only the script at it.
+            if len(Path(forced).parts) == 1:
+                forced_names.add(script_key(forced))
+            else:
+                forced_keys.add(manifest.key(forced))
+        hashes = manifest.hash_scripts(scripts)
+        for script in scripts:
+            if force is True or script_key(script) in forced_names or manifest.key(script) in forced_keys:
+                continue
+            if not manifest.is_current(sql_conn.server, sql_conn.database, script, hashes[script]):
+                continue
+            results[script] = ScriptResult(path=script, ok=True, unchanged=True)
+            for dependent in dependents[script]:
+                remaining[dependent] -= 1
+
+    def skip(script: Path, reason: str):
+        pending = [script]
+        while pending:
+            current = pending.pop()
+            if current in results:
+                continue
+            results[current] = ScriptResult(path=current, skipped=True, error=reason)
+            pending.extend(dependents[current])
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='SqlRunner') as executor:
+        running = {executor.submit(_run_one, sql_conn, s, parse_cache): s for s, n in remaining.items()
+                   if n == 0 and s not in results}
+        while running:
+            finished, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in finished:
+                script = running.pop(future)
+                result = future.result()
+                results[script] = result
+                if manifest is not None:
+                    manifest.record(sql_conn.server, sql_conn.database, script, hashes[script], result.ok,
+                                    elapsed=result.elapsed, error=result.error)
+                if result.ok:
+                    logger.info(f'{script.name} succeeded in {result.elapsed:.3f}s')
+                else:
+                    logger.error(f'{script.name} failed in {result.elapsed:.3f}s: {result.error}')
+                for dependent in dependents[script]:
+                    if not result.ok:
+                        skip(dependent, f'Prerequisite {script.name} did not succeed')
+                        continue
+                    remaining[dependent] -= 1
+                    if remaining[dependent] == 0 and dependent not in results:
+                        running[executor.submit(_run_one, sql_conn, dependent, parse_cache)] = dependent
+
+    if manifest is not None:
+        manifest.save()
+    report = RunReport(results=[results[s] for s in scripts], wall_clock=time.perf_counter() - started)
+    logger.info(report.summary())
+    return report
+
+
+if __name__ == '__main__':
+    from sql_conn import SqlConn
+    from .sql_file import get_scripts
+
+    timsy_log.init_root_logger()
+    s = get_scripts()
+    print(file_names(s))
+    print(run_scripts(s, SqlConn()).summary())
@@ -1,8 +1,4 @@
-import os
-
-# check if directory "logs" exists
-if not os.path.isdir("logs"):
-    os.makedirs("logs", exist_ok=True)
+""" Importing timsy_log has no side effects; call init_root_logger() (or init_queue_logger()) at startup. """
 
 from ._constants import get_logger_initialized
 
@@ -13,8 +9,28 @@ from .logging_misc import (
 )
 
 from .timsy_logger import (
+    LOG_DIR,
+    ensure_log_dir,
     init_root_logger,
     getLogger
 )
 
-init_root_logger()
+# Queue mode pulls in logging.handlers (socket, pickle); load it on first use.
+_QUEUE_LOGGING_NAMES = (
+    'POLICY_BLOCK',
+    'POLICY_DROP',
+    'BoundedQueueHandler',
+    'BatchRotatingFileHandler',
+    'init_queue_logger',
+    'stop_queue_logger',
+    'queue_logger_dropped',
+)
+
+
+def __getattr__(name: str):
+    if name not in _QUEUE_LOGGING_NAMES:
+        raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
+    from . import queue_logging
+    value = getattr(queue_logging, name)
+    globals()[name] = value
+    return value
@@ -1,4 +1,5 @@
 import logging
+import os
 
 
 class InfoFilter(logging.Filter):
@@ -24,7 +25,8 @@ def file_handler_factory(log_level: int = logging.DEBUG, log_formatter: logging.
                          use_info_filter: bool = False) -> logging.Handler:
     log_formatter = log_formatter if log_formatter else logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - '
                                                                           '%(message)s')
-    fh = logging.FileHandler(f'logs/{file_name}')
+    os.makedirs('logs', exist_ok=True)
+    fh = logging.FileHandler(f'logs/{file_name}', delay=True)
     fh.setLevel(log_level)
     fh.setFormatter(log_formatter)
     log_filter = log_filter if log_filter else (InfoFilter() if use_info_filter else None)
@@ -33,7 +35,7 @@ def file_handler_factory(log_level: int = logging.DEBUG, log_formatter: logging.
     return fh
 
 
-def print_logger_details(logger: logging.Logger, display_method=print()):
+def print_logger_details(logger: logging.Logger, display_method=print):
     """
     Print the details of a logger, including its name, level, handlers, and filters.
     :param display_method: Callback function to display the output. Default is print.
@@ -0,0 +1,179 @@
+""" Queue-backed logging: callers enqueue records, a background listener writes them in batches. """
+
+import atexit
+import logging
+import os
+import queue
+import threading
+from logging.handlers import QueueHandler, RotatingFileHandler
+
+from ._constants import set_logger_initialized
+from .logging_misc import InfoFilter
+
+POLICY_BLOCK = 'block'
+POLICY_DROP = 'drop'
+
+_DEFAULT_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+
+
+class BoundedQueueHandler(QueueHandler):
+    """
+    QueueHandler over a bounded queue. When the queue is full the block policy waits up to block_timeout
+    seconds and the drop policy discards the record immediately; dropped records are counted.
+    """
+
+    def __init__(self, log_queue: queue.Queue, policy: str = POLICY_BLOCK, block_timeout: float | None = 1.0):
+        if policy not in (POLICY_BLOCK, POLICY_DROP):
+            raise ValueError(f'Unknown queue policy {policy!r}, expected {POLICY_BLOCK!r} or {POLICY_DROP!r}')
+        super().__init__(log_queue)
+        self.policy = policy
+        self.block_timeout = block_timeout
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Records never leave the process, so skip the default copy-and-format: merge the message args
+        # now, while they still hold the caller's values, and let the listener thread do the formatting.
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            if self.policy == POLICY_BLOCK:
+                self.queue.put(record, timeout=self.block_timeout)
+            else:
+                self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+class BatchRotatingFileHandler(RotatingFileHandler):
+    """ Rotating file handler that writes a whole batch under one lock and flushes once at the end. """
+
+    def handle_batch(self, records: list[logging.LogRecord]):
+        self.acquire()
+        try:
+            for record in records:
+                if record.levelno < self.level or not self.filter(record):
+                    continue
+                try:
+                    if self.shouldRollover(record):
+                        self.doRollover()
+                    if self.stream is None:
+                        self.stream = self._open()
+                    self.stream.write(self.format(record) + self.terminator)
+                except Exception:
+                    self.handleError(record)
+            if self.stream is not None:
+                self.stream.flush()
+        finally:
+            self.release()
+
+
+class BatchingQueueListener(threading.Thread):
+    """ Drains the queue in batches of up to batch_size records and hands each batch to the handlers. """
+    _sentinel = object()
+
+    def __init__(self, log_queue: queue.Queue, handlers: list[logging.Handler], batch_size: int = 256):
+        super().__init__(name='TimsyLogListener', daemon=True)
+        self.queue = log_queue
+        self.handlers = handlers
+        self.batch_size = batch_size
+
+    def _dispatch(self, batch: list[logging.LogRecord]):
+        for handler in self.handlers:
+            if hasattr(handler, 'handle_batch'):
+                handler.handle_batch(batch)
+                continue
+            for record in batch:
+                if record.levelno >= handler.level:
+                    handler.handle(record)
+
+    def run(self):
+        stopping = False
+        while not stopping:
+            record = self.queue.get()
+            batch = []
+            while True:
+                if record is self._sentinel:
+                    stopping = True
+                else:
+                    batch.append(record)
+                if stopping or len(batch) >= self.batch_size:
+                    break
+                try:
+                    record = self.queue.get_nowait()
+                except queue.Empty:
+                    break
+            if batch:
+                self._dispatch(batch)
+
+    def stop(self, timeout: float | None = 5.0):
+        """ Write everything already queued, then stop the thread. """
+        self.queue.put(self._sentinel)
+        self.join(timeout)
+
+
+_listener: BatchingQueueListener | None = None
+_queue_handler: BoundedQueueHandler | None = None
+_lock = threading.Lock()
+_atexit_registered = False
+
+
+def init_queue_logger(file_name: str = 'logs/timsy_app.log', queue_size: int = 10000,
+                      policy: str = POLICY_BLOCK, block_timeout: float | None = 1.0, batch_size: int = 256,
+                      max_bytes: int = 10 * 1024 * 1024, backup_count: int = 5,
+                      log_formatter: logging.Formatter | None = None) -> BoundedQueueHandler:
+    """
+    Opinionated root logger in queue mode: the root logger only enqueues, and a background listener writes
+    DEBUG and up to a rotating file and INFO to the console. Replaces any handlers already on the root logger.
+    """
+    global _listener, _queue_handler, _atexit_registered
+    with _lock:
+        stop_queue_logger()
+        if not _atexit_registered:
+            atexit.register(stop_queue_logger)
+            _atexit_registered = True
+        os.makedirs(os.path.dirname(file_name) or '.', exist_ok=True)
+        log_formatter = log_formatter if log_formatter else logging.Formatter(_DEFAULT_FORMAT)
+        fh = BatchRotatingFileHandler(file_name, maxBytes=max_bytes, backupCount=backup_count, delay=True)
+        fh.setLevel(logging.DEBUG)
+        fh.setFormatter(log_formatter)
+        ch = logging.StreamHandler()
+        ch.setLevel(logging.INFO)
+        ch.setFormatter(log_formatter)
+        ch.addFilter(InfoFilter())
+
+        log_queue = queue.Queue(maxsize=queue_size)
+        _queue_handler = BoundedQueueHandler(log_queue, policy=policy, block_timeout=block_timeout)
+        _listener = BatchingQueueListener(log_queue, [fh, ch], batch_size=batch_size)
+        _listener.start()
+
+        root = logging.getLogger()
+        for handler in list(root.handlers):
+            root.removeHandler(handler)
+            handler.close()
+        root.setLevel(logging.DEBUG)
+        root.addHandler(_queue_handler)
+        set_logger_initialized(True)
+        return _queue_handler
+
+
+def stop_queue_logger():
+    """ Flush queued records and stop the listener. Safe to call when queue mode is not active. """
+    global _listener, _queue_handler
+    listener, handler = _listener, _queue_handler
+    _listener = _queue_handler = None
+    if handler is not None:
+        logging.getLogger().removeHandler(handler)
+    if listener is not None:
+        listener.stop()
+        for h in listener.handlers:
+            h.close()
+        if handler.dropped:
+            logging.getLogger(__name__).warning(f'{handler.dropped} log records were dropped, queue was full')
+
+
+def queue_logger_dropped() -> int:
+    return _queue_handler.dropped if _queue_handler is not None else 0
+
@@ -1,15 +1,22 @@
 import logging
+import os
 # import timsy_log._constants as c
-from ._constants import set_logger_initialized
+from ._constants import get_logger_initialized, set_logger_initialized
 
 from .logging_misc import (
     console_handler_factory,
     file_handler_factory
 )
 
+LOG_DIR = 'logs'
+
 logger = logging.getLogger()
 
 
+def ensure_log_dir(log_dir: str = LOG_DIR):
+    os.makedirs(log_dir, exist_ok=True)
+
+
 def setup_logger():
     class InfoFilter(logging.Filter):
         def filter(self, record):
@@ -18,6 +25,7 @@ def setup_logger():
     logger.setLevel(logging.DEBUG)
     log_formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
 
+    ensure_log_dir()
     fh = logging.FileHandler('logs/timsy_app.log')
     fh.setLevel(logging.DEBUG)
     fh.setFormatter(log_formatter)
@@ -30,9 +38,14 @@ def setup_logger():
     logger.addHandler(ch)
 
 
-def init_root_logger():
-    """ Opinionated Default Root Logger """
-    # global TIMSY_LOGGER_INITIALIZED
+def init_root_logger(force: bool = False):
+    """
+    Opinionated Default Root Logger. Creates logs/ and attaches the file and console handlers; does nothing
+    if a root logger was already initialized, unless force is True.
+    """
+    if get_logger_initialized() and not force:
+        return
+    ensure_log_dir()
     logger = logging.getLogger()
     logger.setLevel(logging.DEBUG)
     fh = file_handler_factory()
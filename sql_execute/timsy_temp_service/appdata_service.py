@@ -1,103 +1,384 @@
 ''' A Service class for handling of saving and reading data from %appdata% folder '''
 
-import os
+import atexit
 import json
+import os
+import tempfile
+import threading
+import time
+import weakref
+from dataclasses import dataclass
+from typing import Any
+
+_JOURNAL_SUFFIX = '.journal'
+
+
+def default_data_dirs(app_name: str) -> tuple[str, str]:
+    """
+    (roaming, local) data folders for app_name: %APPDATA% and %LOCALAPPDATA% on Windows, otherwise
+    $XDG_DATA_HOME (~/.local/share) and $XDG_STATE_HOME (~/.local/state).
+    """
+    home = os.path.expanduser('~')
+    roaming = os.getenv('APPDATA') or os.getenv('XDG_DATA_HOME') or os.path.join(home, '.local', 'share')
+    local = os.getenv('LOCALAPPDATA') or os.getenv('XDG_STATE_HOME') or os.path.join(home, '.local', 'state')
+    return os.path.join(roaming, app_name), os.path.join(local, app_name)
+
+
+def atomic_write_json(file_path: str, data, fsync: bool = True):
+    """ Write data as JSON to a temporary file in the same folder and rename it over file_path. """
+    folder = os.path.dirname(file_path) or '.'
+    os.makedirs(folder, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(prefix=f'.{os.path.basename(file_path)}.', suffix='.tmp', dir=folder)
+    try:
+        with os.fdopen(fd, 'w') as file:
+            json.dump(data, file)
+            if fsync:
+                file.flush()
+                os.fsync(file.fileno())
+        os.replace(tmp_path, file_path)
+    except BaseException:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
+
+
+@dataclass
+class _CachedFile:
+    data: Any
+    dirty: bool = False
+    journal_entries: int = 0
 
 
 class AppDataService:
+    """
+    JSON files under the app's data folder, served from an in-memory cache.
+    Saves are write-behind: they update the cache and a background thread writes each dirty file at most once
+    per flush_interval, so bursts of saves coalesce into one write. Every write goes to a temporary file that is
+    renamed into place, so a crash leaves either the old or the new file. flush_interval=None writes through.
+    update_data appends small changes to a per-file journal instead of rewriting the file; the journal is folded
+    into a fresh snapshot once it holds compact_after entries, on flush() and on close().
+    """
     _backup_folder = 'Backup'
     _recovery_folder = 'Recovery'
 
-    def __init__(self, app_name):
+    def __init__(self, app_name, appdata_path: str | None = None, appdata_local_path: str | None = None,
+                 flush_interval: float | None = 1.0, compact_after: int = 1000, fsync: bool = True):
         self.app_name = app_name
-        self.appdata_path = os.path.join(os.getenv('APPDATA'), app_name)
-        if not os.path.exists(self.appdata_path):
-            # TODO: Removed during testing - os.makedirs(self.appdata_path)
-            print(self.appdata_path)
-        self.appdata_local_path = os.path.join(os.getenv('LOCALAPPDATA'), app_name)
-        if not os.path.exists(self.appdata_local_path):
-            # TODO: Removed during testing - os.makedirs(self.appdata_local_path)
-            print(self.appdata_local_path)
+        default_path, default_local_path = default_data_dirs(app_name)
+        self.appdata_path = appdata_path or default_path
+        self.appdata_local_path = appdata_local_path or default_local_path
+        self.flush_interval = flush_interval
+        self.compact_after = compact_after
+        self.fsync = fsync
+        self._cache: dict[str, _CachedFile] = {}
+        self._journals: dict[str, Any] = {}
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wakeup = threading.Condition(self._lock)
+        self._dirty_since: float | None = None
+        self._flusher: threading.Thread | None = None
+        self._closed = False
+        _services.add(self)
 
     def _init_appdata_folders(self):
         """ Create the appdata folders if they don't exist"""
-        if not os.path.exists(self.appdata_path):
-            # TODO: Removed during testing - os.makedirs(self.appdata_path)
-            print(self.appdata_path)
-        self.appdata_local_path = os.path.join(os.getenv('LOCALAPPDATA'), self.app_name)
-        if not os.path.exists(self.appdata_local_path):
-            # TODO: Removed during testing - os.makedirs(self.appdata_local_path)
-            print(self.appdata_local_path)
-
-    def _init_backup_folder(self):
+        os.makedirs(self.appdata_path, exist_ok=True)
+        os.makedirs(self.appdata_local_path, exist_ok=True)
+
+    def _init_backup_folder(self) -> str:
         """
         Verify that the backup folder exists
         Create the backup folder if it doesn't exist
         """
         backup_folder = os.path.join(self.appdata_local_path, self._backup_folder)
-        if not os.path.exists(backup_folder):
-            os.makedirs(backup_folder)
+        os.makedirs(backup_folder, exist_ok=True)
+        return backup_folder
 
-    def _init_recovery_folder(self):
+    def _init_recovery_folder(self) -> str:
         """
         Verify that the recovery folder exists
         Create the recovery folder if it doesn't exist
         """
         recovery_folder = os.path.join(self.appdata_local_path, self._recovery_folder)
-        if not os.path.exists(recovery_folder):
-            os.makedirs(recovery_folder)
+        os.makedirs(recovery_folder, exist_ok=True)
+        return recovery_folder
+
+    def _path(self, filename: str) -> str:
+        return os.path.join(self.appdata_path, filename)
+
+    def _start_flusher(self):
+        """ Caller holds the lock. """
+        if self._flusher is None and self.flush_interval:
+            self._flusher = threading.Thread(target=self._flush_loop, name=f'AppDataFlush-{self.app_name}',
+                                             daemon=True)
+            self._flusher.start()
+
+    def _mark_dirty(self, cached: _CachedFile):
+        """ Caller holds the lock. The first dirty file starts the flush_interval countdown. """
+        cached.dirty = True
+        if self._dirty_since is None:
+            self._dirty_since = time.monotonic()
+            self._wakeup.notify_all()
+
+    def _flush_loop(self):
+        while True:
+            with self._lock:
+                while not self._closed and self._dirty_since is None:
+                    self._wakeup.wait()
+                # Let further saves land until flush_interval after the first one, so a burst costs one write.
+                while not self._closed and self._dirty_since is not None:
+                    remaining = self._dirty_since + self.flush_interval - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._wakeup.wait(remaining)
+                if self._closed:
+                    return
+                if self._dirty_since is None:
+                    continue
+            self.flush()
+
+    def _store(self, file_path: str, data):
+        with self._lock:
+            if self._closed:
+                raise RuntimeError('AppDataService is closed')
+            cached = self._cache.get(file_path)
+            if cached is None:
+                cached = self._cache[file_path] = _CachedFile(data=data)
+            cached.data = data
+            self._mark_dirty(cached)
+            if self.flush_interval:
+                self._start_flusher()
+                return
+        self.flush(file_path)
 
     def save_user_data(self, filename, data):
         if not filename.endswith('.json'):
             filename += '.json'
-        file_path = os.path.join(self.appdata_path, filename)
-        with open(file_path, 'w') as file:
-            json.dump(data, file)
+        self._store(self._path(filename), data)
 
     def save_data(self, filename, data):
-        file_path = os.path.join(self.appdata_path, filename)
-        with open(file_path, 'w') as file:
-            json.dump(data, file)
+        self._store(self._path(filename), data)
+
+    def update_data(self, filename, changes: dict | None = None, delete: list | tuple = ()):
+        """
+        Merge changes into a dict-valued file and drop the delete keys, appending the change to the file's
+        journal instead of rewriting it. Cheap enough for high-frequency small updates of run state.
+        """
+        file_path = self._path(filename)
+        entry = {'set': changes or {}, 'delete': list(delete)}
+        line = json.dumps(entry) + '\n'
+        compact = False
+        with self._lock:
+            if self._closed:
+                raise RuntimeError('AppDataService is closed')
+            cached = self._load_cached(file_path)
+            if cached.data is None:
+                cached.data = {}
+            if not isinstance(cached.data, dict):
+                raise TypeError(f'{filename} does not hold a JSON object')
+            _apply(cached.data, entry)
+            journal = self._journals.get(file_path)
+            if journal is None:
+                os.makedirs(os.path.dirname(file_path), exist_ok=True)
+                journal = self._journals[file_path] = open(file_path + _JOURNAL_SUFFIX, 'a')
+            journal.write(line)
+            journal.flush()
+            if self.fsync:
+                os.fsync(journal.fileno())
+            cached.journal_entries += 1
+            if cached.journal_entries >= self.compact_after:
+                self._mark_dirty(cached)
+                if self.flush_interval:
+                    self._start_flusher()
+                else:
+                    compact = True
+        if compact:
+            self.flush(file_path)
+
+    def _load_cached(self, file_path: str) -> _CachedFile:
+        """ Cache entry for file_path, read from disk with its journal replayed on first use. Caller holds the lock. """
+        cached = self._cache.get(file_path)
+        if cached is not None:
+            return cached
+        data = None
+        if os.path.exists(file_path):
+            with open(file_path, 'r') as file:
+                data = json.load(file)
+        entries = 0
+        journal_path = file_path + _JOURNAL_SUFFIX
+        if os.path.exists(journal_path):
+            with open(journal_path, 'r') as journal:
+                for line in journal:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        break  # torn final line from a crash mid-append
+                    if data is None:
+                        data = {}
+                    _apply(data, entry)
+                    entries += 1
+        cached = self._cache[file_path] = _CachedFile(data=data, journal_entries=entries)
+        return cached
+
+    def flush(self, file_path: str | None = None):
+        """ Write dirty files now (one file when file_path is given) and fold journals into their snapshots. """
+        with self._flush_lock:
+            with self._lock:
+                paths = [file_path] if file_path is not None else list(self._cache)
+                pending = []
+                for path in paths:
+                    cached = self._cache.get(path)
+                    if cached is None or not (cached.dirty or cached.journal_entries):
+                        continue
+                    # Serialize under the lock so the snapshot and the journal truncation line up.
+                    pending.append((path, json.loads(json.dumps(cached.data)), cached.journal_entries))
+                    cached.dirty = False
+                if not any(c.dirty for c in self._cache.values()):
+                    self._dirty_since = None
+                    self._wakeup.notify_all()
+            for path, data, journal_entries in pending:
+                if data is None:
+                    continue
+                try:
+                    atomic_write_json(path, data, fsync=self.fsync)
+                except OSError:
+                    with self._lock:
+                        if path in self._cache:
+                            self._mark_dirty(self._cache[path])
+                    raise
+                if journal_entries:
+                    self._truncate_journal(path, journal_entries)
 
-    def save_backup(self, filename, data):
+    def _truncate_journal(self, file_path: str, written_entries: int):
+        with self._lock:
+            cached = self._cache.get(file_path)
+            if cached is None:
+                return
+            if cached.journal_entries != written_entries:
+                # Updates arrived while the snapshot was being written; they are in the cache, so the next flush
+                # folds them in. Keep the journal until then.
+                self._mark_dirty(cached)
+                return
+            journal = self._journals.pop(file_path, None)
+            if journal is not None:
+                journal.close()
+            try:
+                os.remove(file_path + _JOURNAL_SUFFIX)
+            except FileNotFoundError:
+                pass
+            cached.journal_entries = 0
 
-        self._init_backup_folder()
+    def save_backup(self, filename, data=None):
+        """ Write a backup copy, by default of the file's current data, to Backup/~filename. """
+        backup_folder = self._init_backup_folder()
+        if data is None:
+            data = self.load_data(filename)
         if not filename.startswith('~'):
             filename = '~' + filename
-        file_path = os.path.join(self.appdata_local_path, 'backup', filename)
+        file_path = os.path.join(backup_folder, filename)
+        atomic_write_json(file_path, data, fsync=self.fsync)
+        return file_path
 
-    def write_recovery(self, filename, data):
-        self._init_recovery_folder()
+    def load_backup(self, filename):
         if not filename.startswith('~'):
             filename = '~' + filename
-        if not filename.endswith('.bak'):
-            filename += '.bak'
-        file_path = os.path.join(self.appdata_local_path, 'recovery', filename)
+        return _read_json(os.path.join(self.appdata_local_path, self._backup_folder, filename))
+
+    def write_recovery(self, filename, data):
+        """ Write a recovery snapshot to Recovery/~filename.bak. """
+        recovery_folder = self._init_recovery_folder()
+        file_path = os.path.join(recovery_folder, _recovery_name(filename))
+        atomic_write_json(file_path, data, fsync=self.fsync)
+        return file_path
+
+    def read_recovery(self, filename):
+        return _read_json(os.path.join(self.appdata_local_path, self._recovery_folder, _recovery_name(filename)))
+
+    def clear_recovery(self, filename):
+        try:
+            os.remove(os.path.join(self.appdata_local_path, self._recovery_folder, _recovery_name(filename)))
+        except FileNotFoundError:
+            pass
 
     def load_data(self, filename):
-        file_path = os.path.join(self.appdata_path, filename)
-        if os.path.exists(file_path):
-            with open(file_path, 'r') as file:
-                return json.load(file)
-        else:
-            return None
+        """ The file's data from the cache, read from disk on first use. The returned object is shared; save
+        it back with save_data after changing it. """
+        with self._lock:
+            return self._load_cached(self._path(filename)).data
 
     def delete_data(self, filename):
-        file_path = os.path.join(self.appdata_path, filename)
-        if os.path.exists(file_path):
-            os.remove(file_path)
+        file_path = self._path(filename)
+        with self._lock:
+            self._cache.pop(file_path, None)
+            journal = self._journals.pop(file_path, None)
+            if journal is not None:
+                journal.close()
+            for path in (file_path, file_path + _JOURNAL_SUFFIX):
+                if os.path.exists(path):
+                    os.remove(path)
 
     def list_files(self):
-        return os.listdir(self.appdata_path)
+        on_disk = set(os.listdir(self.appdata_path)) if os.path.isdir(self.appdata_path) else set()
+        on_disk = {f for f in on_disk if not f.endswith(_JOURNAL_SUFFIX) and not f.endswith('.tmp')}
+        with self._lock:
+            cached = {os.path.basename(p) for p, c in self._cache.items() if c.data is not None}
+        return sorted(on_disk | cached)
+
+    def close(self):
+        """ Flush everything and stop the background writer. """
+        self.flush()
+        with self._lock:
+            self._closed = True
+            self._wakeup.notify_all()
+            journals, self._journals = self._journals, {}
+        for journal in journals.values():
+            journal.close()
+        if self._flusher is not None:
+            self._flusher.join()
+            self._flusher = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+
+def _apply(data: dict, entry: dict):
+    data.update(entry.get('set', {}))
+    for key in entry.get('delete', ()):
+        data.pop(key, None)
+
+
+def _recovery_name(filename: str) -> str:
+    if not filename.startswith('~'):
+        filename = '~' + filename
+    if not filename.endswith('.bak'):
+        filename += '.bak'
+    return filename
+
+
+def _read_json(file_path: str):
+    if not os.path.exists(file_path):
+        return None
+    with open(file_path, 'r') as file:
+        return json.load(file)
+
+
+_services: 'weakref.WeakSet[AppDataService]' = weakref.WeakSet()
+
+
+@atexit.register
+def _flush_all():
+    for service in list(_services):
+        if not service._closed:
+            service.close()
 
 
 if __name__ == '__main__':
-    # appdata_service = AppDataService('timsy_temp_service')
-    print(os.getenv('LOCALAPPDATA'))
-    lp = os.path.join(os.getenv('LOCALAPPDATA'), 'AppName', 'recovery', '~filename.json.bak')
-    rp = os.path.join(os.getenv('LOCALAPPDATA'), 'AppName', 'recovery', '~filename', '.json')
-    print(lp)
-    print(rp)
-    # env_vars = os.environ.keys()
-    # for var in env_vars:
-    #     print(var)
+    appdata_service = AppDataService('timsy_temp_service')
+    print(appdata_service.appdata_path)
+    print(appdata_service.appdata_local_path)
+    print(os.path.join(appdata_service.appdata_local_path, 'Recovery', _recovery_name('filename.json')))
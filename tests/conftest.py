@@ -0,0 +1,47 @@
+import sys
+from pathlib import Path
+
+import pytest
+
+PACKAGE_DIR = Path(__file__).resolve().parent.parent / 'sql_execute'
+if str(PACKAGE_DIR) not in sys.path:
+    sys.path.insert(0, str(PACKAGE_DIR))
+
+from sql_backend import sqlite_connect  # noqa: E402
+from sql_conn import SqlConn  # noqa: E402
+from sql_pool import SqlConnPool  # noqa: E402
+from sql_retry import reset_circuit_breakers  # noqa: E402
+from timsy_config import Config  # noqa: E402
+
+
+@pytest.fixture
+def sqlite_config(tmp_path) -> Config:
+    path = tmp_path / 'config.ini'
+    path.write_text('[DEFAULT]\n'
+                    'driver = sqlite\n'
+                    'server = local\n'
+                    f'database = {tmp_path / "test.db"}\n'
+                    'trusted_connection = yes\n')
+    return Config(config_file=str(path))
+
+
+@pytest.fixture
+def make_sql_conn(sqlite_config):
+    """ SqlConn factory on a private pool over a sqlite file, optionally through a wrapping connect factory. """
+    pools = []
+
+    def make(connect=sqlite_connect, **kwargs) -> SqlConn:
+        pool = SqlConnPool(connect)
+        pools.append(pool)
+        return SqlConn(config=sqlite_config, pool=pool, **kwargs)
+
+    yield make
+    for pool in pools:
+        pool.close()
+
+
+@pytest.fixture(autouse=True)
+def _fresh_breakers():
+    reset_circuit_breakers()
+    yield
+    reset_circuit_breakers()
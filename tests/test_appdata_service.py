@@ -0,0 +1,76 @@
+import json
+import time
+
+import pytest
+
+from timsy_temp_service import appdata_service
+from timsy_temp_service.appdata_service import AppDataService
+
+
+@pytest.fixture
+def writes(monkeypatch):
+    """ Count atomic snapshot writes. """
+    count = [0]
+    original = appdata_service.atomic_write_json
+
+    def counting(*args, **kwargs):
+        count[0] += 1
+        return original(*args, **kwargs)
+
+    monkeypatch.setattr(appdata_service, 'atomic_write_json', counting)
+    return count
+
+
+def service(tmp_path, **kwargs) -> AppDataService:
+    return AppDataService('test', appdata_path=str(tmp_path / 'roaming'), appdata_local_path=str(tmp_path / 'local'),
+                          fsync=False, **kwargs)
+
+
+def test_burst_of_saves_coalesces_into_few_writes(tmp_path, writes):
+    store = service(tmp_path, flush_interval=0.2)
+    try:
+        for i in range(100):
+            store.save_data('state.json', {'i': i})
+            time.sleep(0.002)
+        time.sleep(0.3)
+        # 100 saves over ~0.2s: one write per flush_interval, not one per save.
+        assert 1 <= writes[0] <= 3
+    finally:
+        store.close()
+    assert json.loads((tmp_path / 'roaming' / 'state.json').read_text()) == {'i': 99}
+
+
+def test_write_through_without_flush_interval(tmp_path, writes):
+    store = service(tmp_path, flush_interval=None)
+    store.save_data('state.json', {'a': 1})
+    assert writes[0] == 1
+    assert json.loads((tmp_path / 'roaming' / 'state.json').read_text()) == {'a': 1}
+    store.close()
+
+
+def test_journal_replays_after_crash_ignoring_torn_line(tmp_path):
+    store = service(tmp_path, flush_interval=None)
+    store.update_data('run.json', {'step': 1})
+    store.update_data('run.json', {'step': 2, 'done': False}, delete=['missing'])
+    journal = tmp_path / 'roaming' / 'run.json.journal'
+    with open(journal, 'a') as file:
+        file.write('{"set": {"step": 3')  # torn final line from a crash mid-append
+    # Simulate a crash: drop the service without flushing.
+    reopened = service(tmp_path, flush_interval=None)
+    assert reopened.load_data('run.json') == {'step': 2, 'done': False}
+    reopened.close()
+
+
+def test_close_folds_journal_into_snapshot(tmp_path):
+    store = service(tmp_path, flush_interval=1.0)
+    store.update_data('run.json', {'step': 1})
+    store.close()
+    assert not (tmp_path / 'roaming' / 'run.json.journal').exists()
+    assert json.loads((tmp_path / 'roaming' / 'run.json').read_text()) == {'step': 1}
+
+
+def test_closed_service_rejects_saves(tmp_path):
+    store = service(tmp_path)
+    store.close()
+    with pytest.raises(RuntimeError):
+        store.save_data('state.json', {})
@@ -0,0 +1,86 @@
+import os
+
+import pytest
+
+from timsy_config import Config, reload_config, set_poll_interval
+from timsy_config.registry import DEFAULT_POLL_INTERVAL
+
+
+def write(path, **values):
+    path.write_text('[DEFAULT]\n' + ''.join(f'{k} = {v}\n' for k, v in values.items()) + '[EXTRA]\nname = extra\n')
+
+
+def bump_mtime(path):
+    stat = os.stat(path)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+
+
+@pytest.fixture
+def polling_disabled():
+    set_poll_interval(None)
+    yield
+    set_poll_interval(DEFAULT_POLL_INTERVAL)
+
+
+def test_typed_lookups(tmp_path):
+    path = tmp_path / 'config.ini'
+    write(path, count=86, ratio=0.5, enabled='yes', items='a,b', name='x')
+    config = Config(config_file=str(path))
+    assert config.get_int('DEFAULT', 'count') == 86
+    assert config.get_float('DEFAULT', 'ratio') == 0.5
+    assert config.get_boolean('DEFAULT', 'enabled') is True
+    assert config.get_list('DEFAULT', 'items') == ['a', 'b']
+    assert config.get('DEFAULT', 'Name') == 'x'
+    assert config.get('DEFAULT', 'missing') is None
+    assert config.get_section('EXTRA')['name'] == 'extra'
+    assert config.get_sections() == ['EXTRA']
+    with pytest.raises(ValueError):
+        config.get_int('DEFAULT', 'name')
+
+
+def test_instances_share_one_snapshot(tmp_path):
+    path = tmp_path / 'config.ini'
+    write(path, name='x')
+    assert Config(config_file=str(path)).snapshot() is Config(config_file=str(path)).snapshot()
+
+
+def test_reload_swaps_in_a_new_snapshot_on_change(tmp_path, polling_disabled):
+    path = tmp_path / 'config.ini'
+    write(path, name='before')
+    config = Config(config_file=str(path))
+    old = config.snapshot()
+    assert reload_config(path) == 0
+    write(path, name='after')
+    bump_mtime(path)
+    assert config.get('DEFAULT', 'name') == 'before'
+    assert reload_config(path) == 1
+    assert config.get('DEFAULT', 'name') == 'after'
+    assert old.sections['DEFAULT']['name'] == 'before'
+
+
+def test_polling_picks_up_changes(tmp_path):
+    path = tmp_path / 'config.ini'
+    write(path, name='before')
+    config = Config(config_file=str(path))
+    write(path, name='after')
+    bump_mtime(path)
+    set_poll_interval(0.0)
+    try:
+        assert config.get('DEFAULT', 'name') == 'after'
+    finally:
+        set_poll_interval(DEFAULT_POLL_INTERVAL)
+
+
+def test_relative_path_keeps_tracking_the_same_file_after_chdir(tmp_path, monkeypatch, polling_disabled):
+    (tmp_path / 'app').mkdir()
+    (tmp_path / 'elsewhere').mkdir()
+    path = tmp_path / 'app' / 'config.ini'
+    write(path, name='before')
+    monkeypatch.chdir(tmp_path / 'app')
+    config = Config(config_file='config.ini')
+    monkeypatch.chdir(tmp_path / 'elsewhere')
+    write(path, name='after')
+    bump_mtime(path)
+    assert reload_config(path) == 1
+    assert config.get('DEFAULT', 'name') == 'after'
+    assert not (tmp_path / 'elsewhere' / 'config.ini').exists()
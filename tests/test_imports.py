@@ -0,0 +1,18 @@
+import os
+import subprocess
+import sys
+
+import pytest
+
+from timsy_bench.benchmarks import DEFERRED_MODULES, IMPORT_MODULES, PACKAGE_DIR
+
+
+@pytest.mark.parametrize('module', IMPORT_MODULES)
+def test_import_defers_optional_features(module, tmp_path):
+    """ A cold import pulls in no deferred module and creates no files; run in a fresh interpreter. """
+    check = f'import sys, {module}; print(*[m for m in {DEFERRED_MODULES!r} if m in sys.modules])'
+    env = {**os.environ, 'PYTHONPATH': str(PACKAGE_DIR)}
+    proc = subprocess.run([sys.executable, '-c', check], cwd=tmp_path, env=env, capture_output=True, text=True,
+                          check=True)
+    assert proc.stdout.split() == []
+    assert list(tmp_path.iterdir()) == []
@@ -0,0 +1,103 @@
+import logging
+import queue
+import threading
+
+import pytest
+
+from timsy_log._constants import get_logger_initialized, set_logger_initialized
+from timsy_log.queue_logging import POLICY_DROP, BatchRotatingFileHandler, BatchingQueueListener, \
+    BoundedQueueHandler, init_queue_logger, queue_logger_dropped, stop_queue_logger
+
+
+def record(message: str, *args, level: int = logging.INFO) -> logging.LogRecord:
+    return logging.LogRecord('test', level, __file__, 1, message, args, None)
+
+
+class BatchCollector(logging.Handler):
+    def __init__(self):
+        super().__init__()
+        self.batches = []
+
+    def handle_batch(self, records):
+        self.batches.append([r.getMessage() for r in records])
+
+
+def test_prepare_merges_args_while_they_hold_the_caller_values():
+    log_queue = queue.Queue()
+    handler = BoundedQueueHandler(log_queue)
+    state = ['before']
+    handler.emit(record('state %s', state))
+    state[0] = 'after'
+    queued = log_queue.get_nowait()
+    assert (queued.msg, queued.args) == ("state ['before']", None)
+
+
+def test_full_queue_drops_and_counts():
+    handler = BoundedQueueHandler(queue.Queue(maxsize=1), policy=POLICY_DROP)
+    for i in range(3):
+        handler.emit(record(f'message {i}'))
+    assert handler.dropped == 2
+
+
+def test_block_policy_gives_up_after_block_timeout():
+    handler = BoundedQueueHandler(queue.Queue(maxsize=1), block_timeout=0.01)
+    handler.emit(record('kept'))
+    handler.emit(record('dropped'))
+    assert handler.dropped == 1
+
+
+def test_unknown_policy_is_rejected():
+    with pytest.raises(ValueError):
+        BoundedQueueHandler(queue.Queue(), policy='spill')
+
+
+def test_listener_batches_and_stop_writes_everything_queued():
+    log_queue = queue.Queue()
+    collector = BatchCollector()
+    for i in range(5):
+        log_queue.put(record(f'message {i}'))
+    listener = BatchingQueueListener(log_queue, [collector], batch_size=2)
+    listener.start()
+    listener.stop()
+    assert not listener.is_alive()
+    assert collector.batches == [['message 0', 'message 1'], ['message 2', 'message 3'], ['message 4']]
+
+
+def test_batch_file_handler_applies_level_and_filters(tmp_path):
+    handler = BatchRotatingFileHandler(tmp_path / 'app.log', delay=True)
+    handler.setLevel(logging.INFO)
+    handler.addFilter(lambda r: 'secret' not in r.getMessage())
+    handler.handle_batch([record('debug', level=logging.DEBUG), record('one'), record('secret'), record('two')])
+    handler.close()
+    assert (tmp_path / 'app.log').read_text().splitlines() == ['one', 'two']
+
+
+def test_queue_logger_writes_from_many_threads_and_flushes_on_stop(tmp_path):
+    root = logging.getLogger()
+    saved_handlers, saved_level, saved_initialized = list(root.handlers), root.level, get_logger_initialized()
+    for handler in saved_handlers:
+        root.removeHandler(handler)
+    path = tmp_path / 'logs' / 'app.log'
+    try:
+        init_queue_logger(str(path), log_formatter=logging.Formatter('%(message)s'))
+        logger = logging.getLogger('queue_test')
+
+        def worker(n):
+            for i in range(100):
+                logger.debug(f'worker {n} line {i}')
+
+        threads = [threading.Thread(target=worker, args=(n,)) for n in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert queue_logger_dropped() == 0
+    finally:
+        stop_queue_logger()
+        for handler in saved_handlers:
+            root.addHandler(handler)
+        root.setLevel(saved_level)
+        set_logger_initialized(saved_initialized)
+    lines = path.read_text().splitlines()
+    assert len(lines) == 400
+    assert lines.index('worker 2 line 10') < lines.index('worker 2 line 11')
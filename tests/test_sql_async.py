@@ -0,0 +1,139 @@
+import asyncio
+import threading
+import time
+from contextlib import aclosing
+
+import pytest
+
+from sql_async import AsyncSqlConn, QueryTimeoutError
+from sql_backend import sqlite_connect
+from sql_scheduler import INTERACTIVE, QueryScheduler, WorkloadClass
+
+
+class BlockingBackend:
+    """
+    Connect factory over sqlite whose cursors block like a driver waiting on the server: statements containing
+    WAITFOR block until cursor.cancel() is called, and statements containing SLEEP hold the thread briefly.
+    """
+
+    def __init__(self, sleep: float = 0.03):
+        self.sleep = sleep
+        self.started = threading.Event()
+        self.cancels = 0
+        self.running = 0
+        self.peak = 0
+        self._lock = threading.Lock()
+
+    def __call__(self, server: str, database: str, trusted_connection: str):
+        return _BlockingConnection(sqlite_connect(server, database, trusted_connection), self)
+
+
+class _BlockingConnection:
+    def __init__(self, conn, backend: BlockingBackend):
+        self._conn = conn
+        self._backend = backend
+
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
+    def cursor(self):
+        return _BlockingCursor(self._conn.cursor(), self)
+
+
+class _BlockingCursor:
+    def __init__(self, cursor, connection: _BlockingConnection):
+        self._cursor = cursor
+        self.connection = connection
+        self._cancelled = threading.Event()
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+    def execute(self, sql: str, *params):
+        backend = self.connection._backend
+        if 'WAITFOR' in sql:
+            backend.started.set()
+            if self._cancelled.wait(5):
+                raise RuntimeError('HY008', 'Operation canceled')
+        elif 'SLEEP' in sql:
+            with backend._lock:
+                backend.running += 1
+                backend.peak = max(backend.peak, backend.running)
+            time.sleep(backend.sleep)
+            with backend._lock:
+                backend.running -= 1
+            sql = 'SELECT 1'
+        self._cursor.execute(sql, *params)
+        return self
+
+    def cancel(self):
+        with self.connection._backend._lock:
+            self.connection._backend.cancels += 1
+        self._cancelled.set()
+
+
+def checked_out(sql_conn) -> int:
+    return sql_conn.pool.size(sql_conn.server, sql_conn.database, sql_conn.trusted_connection)[1]
+
+
+def test_timeout_cancels_the_statement(make_sql_conn):
+    backend = BlockingBackend()
+    sql_conn = make_sql_conn(backend)
+
+    async def main():
+        async with AsyncSqlConn(sql_conn) as aconn:
+            with pytest.raises(QueryTimeoutError):
+                await aconn.fetch('WAITFOR DELAY', timeout=0.05)
+
+    asyncio.run(main())
+    assert backend.cancels == 1
+    assert checked_out(sql_conn) == 0
+
+
+def test_task_cancellation_cancels_the_statement_and_returns_the_connection(make_sql_conn):
+    backend = BlockingBackend()
+    sql_conn = make_sql_conn(backend)
+
+    async def main():
+        async with AsyncSqlConn(sql_conn) as aconn:
+            task = asyncio.create_task(aconn.execute('WAITFOR DELAY'))
+            await asyncio.get_running_loop().run_in_executor(None, backend.started.wait, 5)
+            task.cancel()
+            with pytest.raises(asyncio.CancelledError):
+                await task
+
+    asyncio.run(main())
+    assert backend.cancels == 1
+    assert checked_out(sql_conn) == 0
+
+
+def test_gather_respects_max_concurrency(make_sql_conn):
+    backend = BlockingBackend()
+    sql_conn = make_sql_conn(backend)
+
+    async def main():
+        async with AsyncSqlConn(sql_conn, max_workers=4, max_concurrency=2) as aconn:
+            return await asyncio.gather(*(aconn.fetch('SELECT SLEEP') for _ in range(6)))
+
+    assert len(asyncio.run(main())) == 6
+    assert backend.peak == 2
+
+
+def test_stream_closed_early_releases_connection_and_scheduler_slot(make_sql_conn):
+    scheduler = QueryScheduler((WorkloadClass(INTERACTIVE, 0, 1, 8),), max_concurrency=1)
+    sql_conn = make_sql_conn(scheduler=scheduler)
+    sql_conn.execute('CREATE TABLE t (id INTEGER)')
+    sql_conn.bulk_insert('t', ['id'], [(i,) for i in range(10)])
+
+    async def main():
+        async with AsyncSqlConn(sql_conn, max_workers=2) as aconn:
+            async with aclosing(aconn.stream('SELECT id FROM t ORDER BY id', batch_size=2)) as rows:
+                async for row in rows:
+                    assert scheduler.stats(INTERACTIVE).running == 1
+                    break
+            assert checked_out(sql_conn) == 0
+            assert scheduler.stats(INTERACTIVE).running == 0
+            # The freed slot admits the next statement instead of leaving it queued.
+            return await aconn.fetch('SELECT COUNT(*) FROM t', timeout=5)
+
+    assert asyncio.run(main())[0][0] == 10
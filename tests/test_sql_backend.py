@@ -0,0 +1,92 @@
+import pytest
+
+import sql_backend
+from sql_backend import FaultInjector, InjectedFault, LatencyInjector, get_backend, register_backend, \
+    sqlite_connect
+
+
+@pytest.fixture
+def cursor():
+    conn = sqlite_connect('local', ':memory:', 'yes')
+    yield conn.cursor()
+    conn.close()
+
+
+def test_rows_have_pyodbc_attribute_access(cursor):
+    cursor.execute('SELECT 1 AS id, ? AS name', ['a'])
+    row = cursor.fetchone()
+    assert row == (1, 'a')
+    assert (row.id, row.name) == (1, 'a')
+    assert [d[:2] for d in row.cursor_description] == [('id', int), ('name', str)]
+
+
+def test_fetchmany_uses_arraysize(cursor):
+    cursor.execute('WITH RECURSIVE n(i) AS (SELECT 1 UNION ALL SELECT i + 1 FROM n WHERE i < 5) SELECT i FROM n')
+    cursor.arraysize = 2
+    assert [len(cursor.fetchmany()) for _ in range(4)] == [2, 2, 1, 0]
+
+
+def test_multi_statement_batch_yields_one_result_per_statement(cursor):
+    cursor.execute("CREATE TABLE t (id INTEGER, note VARCHAR(10));\n"
+                   "INSERT INTO t VALUES (?, 'a;b');\n"
+                   "-- trailing; comment\n"
+                   "SELECT id, note FROM t WHERE id = ?;", 1, 1)
+    assert cursor.description is None
+    assert cursor.nextset()
+    assert cursor.rowcount == 1
+    assert cursor.nextset()
+    assert cursor.fetchall() == [(1, 'a;b')]
+    assert not cursor.nextset()
+
+
+def test_error_in_a_batch_stops_the_statements_after_it(cursor):
+    cursor.execute('CREATE TABLE t (id INTEGER)')
+    with pytest.raises(Exception):
+        cursor.execute('INSERT INTO t VALUES (1); INSERT INTO missing VALUES (1); INSERT INTO t VALUES (3)')
+        while cursor.nextset():
+            pass
+    cursor.execute('SELECT id FROM t')
+    assert cursor.fetchall() == [(1,)]
+
+
+def test_catalog_functions(cursor):
+    cursor.execute('CREATE TABLE Orders (id INTEGER NOT NULL, total DECIMAL(10, 2))')
+    assert [(r.table_name, r.table_type) for r in cursor.tables(table='ord%').fetchall()] == [('Orders', 'TABLE')]
+    columns = cursor.columns(table='orders').fetchall()
+    assert [(c.column_name, c.column_size, c.decimal_digits, c.nullable) for c in columns] == \
+        [('id', None, None, 0), ('total', 10, 2, 1)]
+
+
+def test_register_backend_and_unknown_backend(monkeypatch):
+    monkeypatch.setattr(sql_backend, '_backends', dict(sql_backend._backends))
+    register_backend('Fake', sqlite_connect)
+    assert get_backend('fake') is sqlite_connect
+    assert get_backend('sqlite') is sqlite_connect
+    with pytest.raises(ValueError):
+        get_backend('nope')
+
+
+def test_fault_injector_follows_its_script():
+    injector = FaultInjector(sqlite_connect, connect_faults=['08001'], execute_faults=[None, '40001'])
+    with pytest.raises(InjectedFault) as raised:
+        injector('local', ':memory:', 'yes')
+    assert raised.value.args[0] == '08001'
+    cursor = injector('local', ':memory:', 'yes').cursor()
+    cursor.execute('SELECT 1')
+    with pytest.raises(InjectedFault):
+        cursor.execute('SELECT 1')
+    assert cursor.execute('SELECT 1').fetchone() == (1,)
+    assert (injector.connects, injector.executes, injector.faults) == (2, 3, 2)
+
+
+def test_latency_injector_counts_round_trips():
+    delays = []
+    injector = LatencyInjector(sqlite_connect, round_trip=0.01, sleep=delays.append,
+                               durations=lambda sql: 1.0 if 'slow' in sql else 0.0)
+    conn = injector('local', ':memory:', 'yes')
+    cursor = conn.cursor()
+    cursor.execute('SELECT 1 AS slow; SELECT 2')
+    cursor.nextset()
+    conn.commit()
+    assert delays == [0.01, 1.01, 0.01]
+    assert injector.round_trips == 3
@@ -0,0 +1,68 @@
+from array import array
+
+import pytest
+
+from sql_columnar import build_columnar
+
+
+class FakeCursor:
+    """ Executed cursor stand-in that records the size of every fetchmany call. """
+
+    def __init__(self, description, rows):
+        self.description = description
+        self._rows = iter(rows)
+        self.fetches = []
+
+    def fetchmany(self, size):
+        self.fetches.append(size)
+        return [r for _, r in zip(range(size), self._rows)]
+
+
+def test_numeric_columns_are_packed_with_null_masks():
+    cursor = FakeCursor([('id', int), ('amount', float)], [(1, 1.5), (2, None), (3, 2.5)])
+    result = build_columnar(cursor, batch_size=2)
+    assert len(result) == 3
+    assert isinstance(result['id'].values, array) and result['id'].values.typecode == 'q'
+    assert result['id'].null_mask is None
+    assert result['amount'].to_pylist() == [1.5, None, 2.5]
+    assert result['amount'].null_count == 1
+    assert cursor.fetches == [2, 2, 2]
+
+
+def test_dictionary_encoding_for_selected_columns():
+    rows = [('open', 'a'), ('closed', 'b'), ('open', None)]
+    result = build_columnar(FakeCursor([('status', str), ('note', str)], rows), dictionary_encode=['status'])
+    status = result['status']
+    assert status.dictionary == ['open', 'closed']
+    assert list(status.values) == [0, 1, 0]
+    assert result['note'].dictionary is None
+    assert result['note'].to_pylist() == ['a', 'b', None]
+
+
+def test_values_outside_the_packed_type_fall_back_to_objects():
+    rows = [(1,), (2 ** 70,), (3,)]
+    result = build_columnar(FakeCursor([('big', int)], rows), batch_size=2)
+    assert result['big'].to_pylist() == [1, 2 ** 70, 3]
+
+
+def test_statement_without_result_set_is_rejected():
+    with pytest.raises(ValueError):
+        build_columnar(FakeCursor(None, []))
+
+
+def test_fetch_columnar_on_sqlite(make_sql_conn):
+    sql_conn = make_sql_conn()
+    sql_conn.execute('CREATE TABLE t (id INTEGER, name VARCHAR(10))')
+    sql_conn.bulk_insert('t', ['id', 'name'], [(i, 'even' if i % 2 == 0 else 'odd') for i in range(5)])
+    result = sql_conn.fetch_columnar('SELECT id, name FROM t ORDER BY id', batch_size=2, dictionary_encode=True)
+    assert result.names == ['id', 'name']
+    assert list(result['id'].values) == [0, 1, 2, 3, 4]
+    assert result['name'].dictionary == ['even', 'odd']
+
+
+def test_to_numpy_masks_nulls():
+    numpy = pytest.importorskip('numpy')
+    result = build_columnar(FakeCursor([('id', int)], [(1,), (None,)]))
+    data = result.to_numpy()['id']
+    assert isinstance(data, numpy.ma.MaskedArray)
+    assert data.mask.tolist() == [False, True]
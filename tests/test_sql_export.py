@@ -0,0 +1,108 @@
+import csv
+import gzip
+import json
+
+import pytest
+
+from sql_export import compression_for, export_cursor, read_columnar
+
+
+class FakeCursor:
+    """ Executed cursor stand-in serving rows in fetchmany batches. """
+
+    def __init__(self, description, rows):
+        self.description = description
+        self._rows = iter(rows)
+        self.arraysize = 1
+
+    def fetchmany(self, size):
+        return [r for _, r in zip(range(size), self._rows)]
+
+
+DESCRIPTION = [('id', int), ('name', str), ('amount', float)]
+ROWS = [(i, None if i % 3 == 0 else f'name {i % 2}', i / 2) for i in range(7)]
+
+
+def test_csv_export_writes_header_and_rows(tmp_path):
+    path = tmp_path / 'out.csv'
+    progress = []
+    result = export_cursor(FakeCursor(DESCRIPTION, ROWS), path, batch_size=3,
+                           on_progress=lambda r: progress.append(r.rows))
+    with open(path, newline='') as f:
+        lines = list(csv.reader(f))
+    assert lines[0] == ['id', 'name', 'amount']
+    assert lines[2] == ['1', 'name 1', '0.5']
+    assert len(lines) == 8
+    assert (result.rows, result.batches, result.compression) == (7, 3, None)
+    assert progress == [3, 6, 7]
+    assert result.bytes_written == path.stat().st_size
+    assert not (tmp_path / 'out.csv.part').exists()
+
+
+def test_jsonl_export_with_gzip_inferred_from_suffix(tmp_path):
+    path = tmp_path / 'out.jsonl.gz'
+    result = export_cursor(FakeCursor(DESCRIPTION, ROWS), path, format='jsonl', batch_size=2)
+    assert result.compression == 'gzip'
+    with gzip.open(path, 'rt', encoding='utf-8') as f:
+        records = [json.loads(line) for line in f]
+    assert records[0] == {'id': 0, 'name': None, 'amount': 0.0}
+    assert [r['id'] for r in records] == list(range(7))
+
+
+@pytest.mark.parametrize('suffix', ['.tsyc', '.tsyc.gz'])
+def test_columnar_export_round_trips(tmp_path, suffix):
+    path = tmp_path / f'out{suffix}'
+    export_cursor(FakeCursor(DESCRIPTION, ROWS), path, format='columnar', batch_size=4)
+    batches = list(read_columnar(str(path)))
+    assert [len(b) for b in batches] == [4, 3]
+    assert batches[0]['id'].values.typecode == 'q'
+    assert batches[0]['name'].dictionary == ['name 1', 'name 0']
+    for name, index in (('id', 0), ('name', 1), ('amount', 2)):
+        assert [v for b in batches for v in b[name].to_pylist()] == [r[index] for r in ROWS]
+
+
+def test_columnar_stores_unpackable_values_as_text(tmp_path):
+    path = tmp_path / 'big.tsyc'
+    export_cursor(FakeCursor([('big', int)], [(1,), (2 ** 70,)]), path, format='columnar')
+    (batch,) = read_columnar(str(path))
+    assert batch['big'].to_pylist() == ['1', str(2 ** 70)]
+
+
+def test_zstd_export_round_trips(tmp_path):
+    pytest.importorskip('zstandard')
+    path = tmp_path / 'out.tsyc.zst'
+    assert compression_for(str(path)) == 'zstd'
+    export_cursor(FakeCursor(DESCRIPTION, ROWS), path, format='columnar')
+    assert sum(len(b) for b in read_columnar(str(path))) == 7
+
+
+def test_failed_export_leaves_no_file(tmp_path):
+    class FailingCursor(FakeCursor):
+        def fetchmany(self, size):
+            raise RuntimeError('connection lost')
+
+    path = tmp_path / 'out.csv'
+    with pytest.raises(RuntimeError):
+        export_cursor(FailingCursor(DESCRIPTION, ROWS), path)
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_invalid_arguments_are_rejected(tmp_path):
+    with pytest.raises(ValueError):
+        export_cursor(FakeCursor(DESCRIPTION, ROWS), tmp_path / 'out.xml', format='xml')
+    with pytest.raises(ValueError):
+        export_cursor(FakeCursor(DESCRIPTION, ROWS), tmp_path / 'out.csv', batch_size=0)
+    with pytest.raises(ValueError):
+        export_cursor(FakeCursor(None, []), tmp_path / 'out.csv')
+    with pytest.raises(ValueError):
+        export_cursor(FakeCursor(DESCRIPTION, ROWS), tmp_path / 'out.csv', compression='lz4')
+
+
+def test_sql_conn_export_on_sqlite(make_sql_conn, tmp_path):
+    sql_conn = make_sql_conn()
+    sql_conn.execute('CREATE TABLE t (id INTEGER, name VARCHAR(10))')
+    sql_conn.bulk_insert('t', ['id', 'name'], [(i, f'n{i}') for i in range(5)])
+    path = tmp_path / 'out.jsonl'
+    result = sql_conn.export('SELECT id, name FROM t WHERE id >= ? ORDER BY id', path, format='jsonl', params=[2])
+    assert result.rows == 3
+    assert [json.loads(line)['name'] for line in path.read_text().splitlines()] == ['n2', 'n3', 'n4']
@@ -0,0 +1,92 @@
+import time
+
+import pytest
+
+from sql_backend import sqlite_connect
+from sql_fanout import FanOut, Target, as_target, targets_from_config
+from sql_pool import SqlConnPool
+from timsy_config import Config
+
+SLOW_QUERY = 'WITH RECURSIVE n(i) AS (SELECT 1 UNION ALL SELECT i + 1 FROM n) SELECT COUNT(*) FROM n'
+
+
+@pytest.fixture
+def pool():
+    pool = SqlConnPool(sqlite_connect)
+    yield pool
+    pool.close()
+
+
+@pytest.fixture
+def tenants(make_sql_conn, tmp_path):
+    """ Three tenant databases with tenant i holding i + 1 rows in t; the last one has no t at all. """
+    targets = []
+    for i in range(3):
+        database = str(tmp_path / f'tenant{i}.db')
+        sql_conn = make_sql_conn(config_override={'database': database})
+        sql_conn.execute('CREATE TABLE t (id INTEGER)')
+        sql_conn.bulk_insert('t', ['id'], [(n,) for n in range(i + 1)])
+        targets.append(Target(name=f'tenant{i}', database=database))
+    targets.append(Target(name='empty', database=str(tmp_path / 'empty.db')))
+    return targets
+
+
+def test_target_parsing(sqlite_config, tmp_path):
+    assert as_target('sql01/Sales') == Target(name='sql01/Sales', server='sql01', database='Sales')
+    assert as_target('Sales') == Target(name='Sales', database='Sales')
+    assert as_target({'server': 'sql01', 'database': 'Sales'}).name == 'sql01/Sales'
+    path = tmp_path / 'fanout.ini'
+    path.write_text('[DEFAULT]\nserver = local\n[Tenants]\ntargets = reporting, sql02/Stock\n'
+                    '[reporting]\ndatabase = Reporting\n')
+    assert targets_from_config(Config(config_file=str(path)), 'Tenants') == \
+        [Target(name='reporting', server='local', database='Reporting'), Target(name='sql02/Stock', server='sql02',
+                                                                                 database='Stock')]
+    with pytest.raises(ValueError):
+        FanOut(['a', 'a'], config=sqlite_config)
+
+
+def test_fetch_reports_each_target_and_isolates_failures(sqlite_config, pool, tenants):
+    report = FanOut(tenants, max_concurrency=2, config=sqlite_config, pool=pool).fetch('SELECT id FROM t')
+    assert [(r.target.name, r.ok, r.row_count) for r in report.results] == \
+        [('tenant0', True, 1), ('tenant1', True, 2), ('tenant2', True, 3), ('empty', False, 0)]
+    assert report.results[2].rows == [(0,), (1,), (2,)]
+    assert report.failed[0].error.startswith('OperationalError') and not report.failed[0].timed_out
+    assert report.row_count == 6
+
+
+def test_stream_tags_batches_with_their_target(sqlite_config, pool, tenants):
+    with FanOut(tenants[:3], config=sqlite_config, pool=pool).stream('SELECT id FROM t', batch_size=2) as results:
+        rows = {}
+        for batch in results:
+            rows.setdefault(batch.target.name, []).extend(batch.rows)
+    assert rows == {f'tenant{i}': [(n,) for n in range(i + 1)] for i in range(3)}
+    assert [r.batches for r in results.report.results] == [1, 1, 2]
+
+
+def test_slow_statement_is_cancelled_at_the_deadline(sqlite_config, pool, tenants):
+    started = time.perf_counter()
+    report = FanOut(tenants[:2], timeout=0.2, config=sqlite_config, pool=pool).fetch(SLOW_QUERY)
+    assert time.perf_counter() - started < 5
+    assert all(r.timed_out for r in report.results)
+    assert report.results[0].error.startswith('TargetTimeoutError')
+
+
+def test_slow_consumer_times_the_target_out(sqlite_config, pool, tenants):
+    fan_out = FanOut(tenants[2:3], timeout=0.2, config=sqlite_config, pool=pool, queue_depth=1)
+    with fan_out.stream('SELECT id FROM t', batch_size=1) as results:
+        time.sleep(0.5)
+        delivered = sum(len(batch.rows) for batch in results)
+    (result,) = results.report.results
+    assert result.timed_out and 'consumer' in result.error
+    assert delivered < 3
+    assert pool.size('local', tenants[2].database, 'yes') == (1, 0)
+
+
+def test_closing_early_cancels_the_rest(sqlite_config, pool, tenants):
+    targets = [Target(name='slow', database=tenants[0].database)] + tenants[1:3]
+    fan_out = FanOut(targets, max_concurrency=1, config=sqlite_config, pool=pool)
+    results = fan_out.stream(SLOW_QUERY)
+    time.sleep(0.1)
+    results.close()
+    assert [r.error.split(':')[0] for r in sorted(results.report.results, key=lambda r: r.target.name)] == \
+        ['FanOutCancelled'] * 3
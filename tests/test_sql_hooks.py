@@ -0,0 +1,121 @@
+import pytest
+
+from sql_hooks import Histogram, LatencyHistogram, QueryHook, fingerprint, instrument, register_hook, \
+    unregister_hook
+
+
+class Recorder(QueryHook):
+    def __init__(self):
+        self.calls = []
+        self.events = []
+
+    def on_cursor_open(self, cursor_event):
+        self.calls.append('open')
+
+    def on_execute_start(self, event):
+        self.calls.append('start')
+
+    def on_execute_end(self, event):
+        self.calls.append('end')
+
+    def on_fetch_end(self, event):
+        self.calls.append('fetched')
+        self.events.append(event)
+
+    def on_close(self, cursor_event):
+        self.calls.append('close')
+
+
+class Broken(QueryHook):
+    def on_execute_start(self, event):
+        raise RuntimeError('hook bug')
+
+
+@pytest.fixture
+def hook():
+    recorder = register_hook(Recorder())
+    yield recorder
+    unregister_hook(recorder)
+
+
+def test_fingerprint_replaces_literals():
+    assert fingerprint("SELECT *  FROM t WHERE id IN (1, 2, 3) AND name = N'x' AND v > -1.5") == \
+        'SELECT * FROM t WHERE id IN (?) AND name = ? AND v > ?'
+    assert fingerprint('SELECT col1 FROM [t2]') == 'SELECT col1 FROM [t2]'
+
+
+def test_instrument_returns_the_cursor_untouched_without_hooks():
+    cursor = object()
+    assert instrument(cursor, 'test') is cursor
+
+
+def test_statement_events_reach_hooks(make_sql_conn, hook):
+    sql_conn = make_sql_conn()
+    sql_conn.execute('CREATE TABLE t (id INTEGER)')
+    sql_conn.bulk_insert('t', ['id'], [(i,) for i in range(3)])
+    hook.calls.clear()
+    hook.events.clear()
+    assert len(list(sql_conn.stream('SELECT id FROM t WHERE id < 10', batch_size=2))) == 3
+    assert hook.calls == ['open', 'start', 'end', 'fetched', 'close']
+    event = hook.events[0]
+    assert (event.operation, event.fingerprint, event.rows) == ('stream', 'SELECT id FROM t WHERE id < ?', 3)
+    assert event.duration >= event.execute_time >= 0
+
+
+def test_failing_statement_and_catalog_calls_are_reported(make_sql_conn, hook):
+    sql_conn = make_sql_conn()
+    with pytest.raises(Exception):
+        sql_conn.execute('SELECT * FROM missing')
+    assert hook.events[-1].error is not None
+    with sql_conn.borrow_connection() as conn:
+        cursor = instrument(conn.cursor(), 'catalog')
+        cursor.tables(table='missing').fetchall()
+        cursor.close()
+    assert hook.events[-1].fingerprint == '{tables}'
+
+
+def test_broken_hook_does_not_break_the_query(make_sql_conn, hook):
+    broken = register_hook(Broken())
+    try:
+        assert make_sql_conn().fetch_prepared('SELECT 1') == [(1,)]
+    finally:
+        unregister_hook(broken)
+    assert 'fetched' in hook.calls
+
+
+def test_histogram_percentiles_are_within_a_bucket():
+    histogram = Histogram()
+    for i in range(1, 101):
+        histogram.add(i / 1000, rows=1)
+    assert histogram.count == 100 and histogram.rows == 100
+    assert histogram.percentile(50) == pytest.approx(0.050, rel=0.2)
+    assert histogram.percentile(99) == pytest.approx(0.099, rel=0.2)
+    assert histogram.percentile(100) <= histogram.max
+
+
+def test_latency_histogram_groups_by_fingerprint(make_sql_conn):
+    histogram = register_hook(LatencyHistogram())
+    try:
+        sql_conn = make_sql_conn()
+        for i in range(3):
+            sql_conn.fetch_prepared(f'SELECT {i}')
+    finally:
+        unregister_hook(histogram)
+    summary = histogram.summary()
+    assert summary['SELECT ?']['count'] == 3
+
+
+def test_failing_catalog_call_finishes_its_event(hook):
+    class FailingCatalogCursor:
+        def tables(self, **kwargs):
+            raise RuntimeError('HYT00', 'Timeout expired')
+
+        def close(self):
+            pass
+
+    cursor = instrument(FailingCatalogCursor(), 'catalog')
+    with pytest.raises(RuntimeError):
+        cursor.tables(table='t')
+    cursor.close()
+    assert hook.calls == ['open', 'start', 'end', 'fetched', 'close']
+    assert hook.events[0].error.startswith('RuntimeError')
@@ -0,0 +1,107 @@
+import logging
+import threading
+
+import pytest
+
+from sql_leaks import ResourceTracker, disable_leak_tracking, enable_leak_tracking, live_resources, tracker
+
+
+@pytest.fixture
+def leak_tracking():
+    enable_leak_tracking(warn_after=60.0, stack_sample_rate=1)
+    yield tracker
+    disable_leak_tracking()
+
+
+def open_resource(resources: ResourceTracker, kind: str = 'cursor') -> int | None:
+    return resources.track(kind, 'SELECT 1')
+
+
+def test_disabled_tracker_records_nothing():
+    resources = ResourceTracker()
+    assert resources.track('cursor') is None
+    resources.untrack(None)
+    assert resources.live_count() == 0
+
+
+def test_track_and_untrack_count_by_kind():
+    resources = ResourceTracker()
+    resources.enabled = True
+    connection = resources.track('connection', 'local/db')
+    cursors = [resources.track('cursor') for _ in range(2)]
+    assert (resources.live_count(), resources.live_count('cursor'), resources.live_count('connection')) == (3, 2, 1)
+    resources.untrack(cursors[0])
+    resources.untrack(cursors[0])
+    assert resources.live_count('cursor') == 1
+    resources.untrack(connection)
+    assert [r.kind for r in resources.outstanding()] == ['cursor']
+
+
+def test_stacks_are_sampled():
+    resources = ResourceTracker(stack_sample_rate=4)
+    resources.enabled = True
+    for _ in range(8):
+        open_resource(resources)
+    sampled = [r for r in resources.outstanding() if r.stack]
+    assert len(sampled) == 2
+    assert 'open_resource' in sampled[0].format_stack()
+    resources.capture_stacks = False
+    for _ in range(4):
+        open_resource(resources)
+    assert len([r for r in resources.outstanding() if r.stack]) == 2
+
+
+def test_check_warns_once_per_resource(caplog):
+    resources = ResourceTracker(warn_after=0.0, stack_sample_rate=1)
+    resources.enabled = True
+    token = open_resource(resources)
+    with caplog.at_level(logging.WARNING, logger='SqlLeaks'):
+        held = resources.check()
+        assert resources.check() == []
+    assert [(r.kind, r.description, r.thread_name, r.warned) for r in held] == \
+        [('cursor', 'SELECT 1', threading.current_thread().name, True)]
+    assert len(caplog.records) == 1
+    assert 'cursor SELECT 1 held for' in caplog.text and 'open_resource' in caplog.text
+    resources.untrack(token)
+    assert resources.outstanding() == []
+
+
+def test_check_skips_resources_younger_than_warn_after():
+    resources = ResourceTracker(warn_after=60.0)
+    resources.enabled = True
+    open_resource(resources)
+    assert resources.check() == []
+    assert len(resources.outstanding()) == 1
+    assert resources.outstanding(older_than=60.0) == []
+
+
+def test_enable_rejects_bad_sample_rate():
+    with pytest.raises(ValueError):
+        enable_leak_tracking(stack_sample_rate=0)
+    assert not tracker.enabled
+
+
+def test_disable_clears_tracked_resources(leak_tracking):
+    open_resource(leak_tracking)
+    assert live_resources() == 1
+    disable_leak_tracking()
+    assert live_resources() == 0
+    assert open_resource(leak_tracking) is None
+
+
+def test_pooled_connections_and_cursors_are_tracked_while_in_use(make_sql_conn, leak_tracking):
+    sql_conn = make_sql_conn()
+    with sql_conn.borrow_connection() as conn:
+        assert live_resources('connection') == 1
+        conn.cursor().close()
+    assert sql_conn.fetch_prepared('SELECT 1') == [(1,)]
+    assert live_resources() == 0
+
+
+def test_dedicated_connection_is_untracked_by_the_context_manager(make_sql_conn, leak_tracking):
+    with make_sql_conn() as sql_conn:
+        sql_conn.open_connection()
+        assert live_resources('connection') == 1
+        assert 'dedicated' in leak_tracking.outstanding()[0].description
+    assert not sql_conn.is_connected
+    assert live_resources() == 0
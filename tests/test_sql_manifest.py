@@ -0,0 +1,94 @@
+import json
+
+from timsy_file.sql_manifest import ScriptManifest, hash_file
+from timsy_file.sql_parser import ParseCache
+from timsy_file.sql_runner import run_scripts
+
+from .test_sql_runner import RecordingConn, write
+
+
+class MemoryStore:
+    def __init__(self):
+        self.data = {}
+
+    def load_data(self, filename):
+        return self.data.get(filename)
+
+    def save_data(self, filename, data):
+        self.data[filename] = json.loads(json.dumps(data))
+
+
+def run(scripts, manifest, conn=None, **kwargs):
+    return run_scripts(scripts, conn or RecordingConn(), parse_cache=ParseCache(), manifest=manifest, **kwargs)
+
+
+def test_entries_are_keyed_by_path_relative_to_root(tmp_path):
+    manifest = ScriptManifest(tmp_path / 'manifest.json', root=tmp_path)
+    (tmp_path / 'Schema').mkdir()
+    assert manifest.key(tmp_path / 'Schema' / 'Create.SQL') == 'schema/create'
+    assert manifest.key(tmp_path / 'create.sql') == 'create'
+
+
+def test_same_name_in_different_directories_gets_separate_entries(tmp_path):
+    for directory in ('sales', 'stock'):
+        (tmp_path / directory).mkdir()
+    sales = write(tmp_path / 'sales', 'load.sql', 'SELECT 1')
+    stock = write(tmp_path / 'stock', 'load.sql', 'SELECT 2')
+    manifest = ScriptManifest(tmp_path / 'manifest.json', root=tmp_path)
+    assert len(run([sales, stock], manifest).succeeded) == 2
+    stock.write_text('SELECT 3')
+    conn = RecordingConn()
+    report = run([sales, stock], ScriptManifest(tmp_path / 'manifest.json', root=tmp_path), conn)
+    assert [r.path for r in report.unchanged] == [sales]
+    assert conn.executed == ['SELECT 3']
+
+
+def test_unchanged_scripts_are_skipped_per_target_and_failures_rerun(tmp_path):
+    store = MemoryStore()
+    scripts = [write(tmp_path, 'a.sql', 'SELECT 1'), write(tmp_path, 'b.sql', 'SELECT broken')]
+    run(scripts, ScriptManifest(store=store, root=tmp_path), RecordingConn(fail_on='broken'))
+    manifest = ScriptManifest(store=store, root=tmp_path)
+    assert manifest.entry('local', 'test', scripts[0]).hash == hash_file(scripts[0])
+    assert manifest.entry('local', 'test', scripts[1]).error == 'RuntimeError: scripted failure'
+    conn = RecordingConn()
+    report = run(scripts, manifest, conn)
+    assert [r.path for r in report.unchanged] == [scripts[0]]
+    assert conn.executed == ['SELECT broken']
+    conn.database = 'other'
+    assert len(run(scripts, manifest, conn).unchanged) == 0
+
+
+def test_force_by_name_path_or_everything(tmp_path):
+    (tmp_path / 'sub').mkdir()
+    scripts = [write(tmp_path, 'a.sql', 'SELECT 1'), write(tmp_path / 'sub', 'a.sql', 'SELECT 2'),
+               write(tmp_path, 'b.sql', 'SELECT 3')]
+    manifest = ScriptManifest(tmp_path / 'manifest.json', root=tmp_path)
+    run(scripts, manifest)
+    assert [r.path for r in run(scripts, manifest, force=['A.sql']).unchanged] == [scripts[2]]
+    conn = RecordingConn()
+    run(scripts, manifest, conn, force=[tmp_path / 'sub' / 'a.sql'])
+    assert conn.executed == ['SELECT 2']
+    assert len(run(scripts, manifest, force=True).succeeded) == 3
+
+
+def test_unchanged_prerequisite_still_releases_its_dependents(tmp_path):
+    create = write(tmp_path, 'create.sql', 'SELECT 1')
+    load = write(tmp_path, 'load.sql', '-- depends: create\nSELECT 2')
+    manifest = ScriptManifest(tmp_path / 'manifest.json', root=tmp_path)
+    run([create, load], manifest)
+    load.write_text('-- depends: create\nSELECT 3')
+    conn = RecordingConn()
+    report = run([create, load], manifest, conn)
+    assert [r.path for r in report.unchanged] == [create]
+    assert conn.executed == ['-- depends: create\nSELECT 3']
+
+
+def test_forget_and_stat_cache(tmp_path):
+    script = write(tmp_path, 'a.sql', 'SELECT 1')
+    manifest = ScriptManifest(tmp_path / 'manifest.json', root=tmp_path)
+    run([script], manifest)
+    manifest.forget('local', 'test', [script])
+    assert manifest.entry('local', 'test', script) is None
+    digest = manifest.hash_scripts([script])[script]
+    script.write_text('SELECT 22')
+    assert manifest.hash_scripts([script])[script] != digest
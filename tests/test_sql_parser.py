@@ -0,0 +1,80 @@
+import os
+
+from timsy_file.sql_parser import ParseCache, parse_script, parse_sql
+
+
+def texts(sql: str) -> list[str]:
+    return [b.text for b in parse_sql(sql).batches]
+
+
+def test_splits_on_go_lines():
+    assert texts('SELECT 1\nGO\nSELECT 2\ngo -- done\nSELECT 3') == ['SELECT 1', 'SELECT 2', 'SELECT 3']
+
+
+def test_go_inside_literals_comments_and_identifiers_is_not_a_separator():
+    sql = ("SELECT 'a\nGO\nb'\n"
+           'SELECT "x\nGO\ny"\n'
+           'SELECT [col\nGO\n]\n'
+           '-- GO\n'
+           '/* outer /* nested\nGO\n*/ still comment\nGO\n*/\n'
+           'SELECT 1')
+    assert texts(sql) == [sql]
+
+
+def test_go_with_repeat_count():
+    batches = parse_sql('INSERT INTO t VALUES (1)\nGO 3\nSELECT 1\n').batches
+    assert [(b.text, b.repeat) for b in batches] == [('INSERT INTO t VALUES (1)', 3), ('SELECT 1', 1)]
+
+
+def test_crlf_line_endings():
+    batches = parse_sql('SELECT 1\r\nGO\r\n\r\nSELECT 2\r\nGO 2\r\n').batches
+    assert [(b.text, b.line, b.repeat) for b in batches] == [('SELECT 1', 1, 1), ('SELECT 2', 4, 2)]
+
+
+def test_goto_and_labels_are_not_separators():
+    sql = 'IF 1 = 1\nGOTO done\nSELECT 1\ndone:\nGO_ON:\nSELECT 2'
+    assert texts(sql) == [sql]
+
+
+def test_leading_go_and_empty_batches_are_dropped():
+    assert texts('GO\nSELECT 1\nGO\nGO\n') == ['SELECT 1']
+
+
+def test_placeholders_and_variables_per_batch():
+    parsed = parse_sql("SELECT ? , '?' WHERE a = ? -- ?\nGO\nSELECT $(db), $(db), $(table), [?]")
+    assert [b.placeholders for b in parsed.batches] == [2, 0]
+    assert parsed.batches[1].variables == ('db', 'table')
+    assert parsed.placeholders == 2
+
+
+def test_unterminated_literal_keeps_the_rest_in_one_batch():
+    assert texts("SELECT 'open\nGO\nSELECT 2") == ["SELECT 'open\nGO\nSELECT 2"]
+
+
+def test_parse_cache_hits_until_mtime_or_size_changes(tmp_path):
+    path = tmp_path / 'script.sql'
+    path.write_text('SELECT 1')
+    cache = ParseCache()
+    first = parse_script(path, cache)
+    assert parse_script(path, cache) is first
+    assert (cache.stats.hits, cache.stats.misses) == (1, 1)
+
+    path.write_text('SELECT 22')
+    assert parse_script(path, cache).batches[0].text == 'SELECT 22'
+    assert cache.stats.misses == 2
+
+    # Same size, so only the modification time tells the cache the file changed.
+    stat = os.stat(path)
+    path.write_text('SELECT 33')
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+    assert parse_script(path, cache).batches[0].text == 'SELECT 33'
+    assert cache.stats.misses == 3
+
+
+def test_parse_cache_evicts_least_recently_used(tmp_path):
+    cache = ParseCache(max_entries=1)
+    for name in ('a.sql', 'b.sql'):
+        (tmp_path / name).write_text('SELECT 1')
+        cache.get(tmp_path / name)
+    cache.get(tmp_path / 'a.sql')
+    assert cache.stats.misses == 3
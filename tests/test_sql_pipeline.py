@@ -0,0 +1,97 @@
+import pytest
+
+from sql_pipeline import MARKER_COLUMN, PipelineError, StatementPipeline, execute_pipeline
+
+
+def test_statements_run_in_one_batch(make_sql_conn):
+    sql_conn = make_sql_conn()
+    pipeline = sql_conn.pipeline()
+    pipeline.add('CREATE TABLE t (id INTEGER, name VARCHAR(30))')
+    pipeline.add('INSERT INTO t VALUES (?, ?)', [1, 'a'])
+    pipeline.add('INSERT INTO t VALUES (:id, :name)', {'id': 2, 'name': 'b'})
+    select = pipeline.add('SELECT name FROM t ORDER BY id')
+    result = pipeline.run()
+    assert result.ok
+    assert result.round_trips == 2  # the batch and the commit
+    assert [tuple(r) for r in result[select].rows] == [('a',), ('b',)]
+    assert result[1].rowcount == 1
+
+
+def test_failure_rolls_back_and_stops_sqlite_batch(make_sql_conn):
+    sql_conn = make_sql_conn()
+    sql_conn.execute('CREATE TABLE t (id INTEGER)')
+    pipeline = sql_conn.pipeline()
+    pipeline.add('INSERT INTO t VALUES (1)')
+    pipeline.add('INSERT INTO missing VALUES (1)')
+    pipeline.add('INSERT INTO t VALUES (3)')
+    with pytest.raises(PipelineError) as raised:
+        pipeline.run()
+    assert raised.value.index == 1
+    assert [s.executed for s in raised.value.result] == [True, True, False]
+    assert sql_conn.fetch_prepared('SELECT COUNT(*) FROM t')[0][0] == 0
+
+
+class _Connection:
+    def __init__(self):
+        self.calls = []
+
+    def commit(self):
+        self.calls.append('commit')
+
+    def rollback(self):
+        self.calls.append('rollback')
+
+
+class ContinuingCursor:
+    """ Reports results like SQL Server without XACT_ABORT: a failed statement raises, later ones still run. """
+
+    def __init__(self):
+        self.connection = _Connection()
+        self.results = []
+        self.position = -1
+        self.rowcount = -1
+
+    def execute(self, sql, *params):
+        self.results = []
+        for statement in sql.split(';\n'):
+            statement = statement.strip().rstrip(';')
+            if MARKER_COLUMN in statement:
+                self.results.append('marker')
+            else:
+                self.results.append('error' if 'missing' in statement else 'rows')
+        self.position = -1
+        self.nextset()
+        return self
+
+    def nextset(self):
+        self.position += 1
+        if self.position >= len(self.results):
+            return False
+        if self.results[self.position] == 'error':
+            raise RuntimeError('42S02', 'Invalid object name')
+        self.rowcount = 1 if self.results[self.position] == 'rows' else -1
+        return True
+
+    @property
+    def description(self):
+        return [(MARKER_COLUMN,)] if self.results[self.position] == 'marker' else None
+
+
+def test_statements_after_a_continuing_error_are_reported_as_executed():
+    pipeline = StatementPipeline()
+    pipeline.add('INSERT INTO t VALUES (1)')
+    pipeline.add('INSERT INTO missing VALUES (1)')
+    pipeline.add('INSERT INTO t VALUES (3)')
+    cursor = ContinuingCursor()
+    result = execute_pipeline(cursor, pipeline, raise_on_error=False)
+    assert [s.executed for s in result] == [True, True, True]
+    assert [s.error is not None for s in result] == [False, True, False]
+    assert cursor.connection.calls == ['rollback']
+
+
+def test_commit_false_leaves_transaction_open():
+    pipeline = StatementPipeline()
+    pipeline.add('INSERT INTO t VALUES (1)')
+    cursor = ContinuingCursor()
+    execute_pipeline(cursor, pipeline, commit=False)
+    assert cursor.connection.calls == []
@@ -0,0 +1,99 @@
+import threading
+import time
+
+import pytest
+
+from sql_pool import PoolTimeoutError, SqlConnPool
+
+
+class FakeConnection:
+    def __init__(self, key):
+        self.key = key
+        self.closed = False
+
+    def rollback(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+
+def fake_pool(**kwargs) -> SqlConnPool:
+    return SqlConnPool(lambda *key: FakeConnection(key), **kwargs)
+
+
+def test_reuses_released_connection():
+    pool = fake_pool()
+    with pool.connection('s', 'a', 'yes') as first:
+        pass
+    with pool.connection('s', 'a', 'yes') as second:
+        assert second is first
+    assert pool.stats().creates == 1
+    assert pool.stats().checkouts == 2
+
+
+def test_times_out_when_key_is_exhausted():
+    pool = fake_pool(max_size=1)
+    conn = pool.acquire('s', 'a', 'yes')
+    with pytest.raises(PoolTimeoutError):
+        pool.acquire('s', 'a', 'yes', timeout=0.05)
+    pool.release(conn, 's', 'a', 'yes')
+    assert pool.stats('s', 'a', 'yes').waits == 1
+
+
+def test_release_wakes_waiter_for_the_same_key():
+    pool = fake_pool(max_size=1)
+    held_a = pool.acquire('s', 'a', 'yes')
+    held_b = pool.acquire('s', 'b', 'yes')
+    waited = {}
+
+    def wait_for(database):
+        started = time.perf_counter()
+        conn = pool.acquire('s', database, 'yes', timeout=3)
+        waited[database] = time.perf_counter() - started
+        pool.release(conn, 's', database, 'yes')
+
+    # The key-b waiter queues first, so a single shared notify() would wake it instead of the key-a waiter.
+    waiter_b = threading.Thread(target=wait_for, args=('b',))
+    waiter_b.start()
+    time.sleep(0.05)
+    waiter_a = threading.Thread(target=wait_for, args=('a',))
+    waiter_a.start()
+    time.sleep(0.05)
+    pool.release(held_a, 's', 'a', 'yes')
+    waiter_a.join(timeout=5)
+    pool.release(held_b, 's', 'b', 'yes')
+    waiter_b.join(timeout=5)
+    assert waited['a'] < 1.0
+    assert 'b' in waited
+
+
+def test_failed_validation_replaces_connection():
+    pool = fake_pool(validate_after=0.0, validator=lambda conn: False)
+    with pool.connection('s', 'a', 'yes') as first:
+        pass
+    with pool.connection('s', 'a', 'yes') as second:
+        assert second is not first
+    assert first.closed
+    assert pool.stats().validation_failures == 1
+
+
+def test_close_refuses_checkouts_and_closes_idle():
+    pool = fake_pool()
+    with pool.connection('s', 'a', 'yes') as conn:
+        pass
+    pool.close()
+    assert conn.closed
+    with pytest.raises(RuntimeError):
+        pool.acquire('s', 'a', 'yes')
+
+
+def test_min_size_connections_open_on_first_checkout_and_survive_eviction():
+    now = [0.0]
+    pool = fake_pool(min_size=2, idle_timeout=10.0, clock=lambda: now[0])
+    with pool.connection('s', 'a', 'yes'):
+        assert pool.size('s', 'a', 'yes') == (1, 1)
+    now[0] = 60.0
+    assert pool.evict_idle() == 0
+    assert pool.size('s', 'a', 'yes') == (2, 0)
+    assert pool.stats().creates == 2
@@ -0,0 +1,71 @@
+import pytest
+
+from sql_prepared import StatementCache, normalize_query, quote_identifier, quote_table_name, \
+    statement_cache_stats
+
+
+class FakeCursor:
+    def __init__(self):
+        self.closed = False
+
+    def close(self):
+        self.closed = True
+
+
+class FakeConnection:
+    def cursor(self):
+        return FakeCursor()
+
+
+def test_quote_identifier_escapes_closing_brackets():
+    assert quote_identifier('Order Details') == '[Order Details]'
+    assert quote_identifier('a]b') == '[a]]b]'
+    for bad in ('', 'a\x00b'):
+        with pytest.raises(ValueError):
+            quote_identifier(bad)
+
+
+def test_quote_table_name_keeps_bracketed_parts():
+    assert quote_table_name('dbo.Person') == '[dbo].[Person]'
+    assert quote_table_name('[my.db].dbo.#Stage') == '[my.db].[dbo].[#Stage]'
+    with pytest.raises(ValueError):
+        quote_table_name('dbo..Person')
+
+
+def test_normalize_rewrites_named_placeholders_and_collapses_whitespace():
+    query = "SELECT  *\n  FROM t -- note\nWHERE a = :a AND b = ':b' AND c = :c /* :d */ AND d::int = 1"
+    normalized, params = normalize_query(query, {'c': 3, 'a': 1})
+    assert normalized == "SELECT * FROM t WHERE a = ? AND b = ':b' AND c = ? AND d::int = 1"
+    assert params == (1, 3)
+
+
+def test_normalize_rejects_mismatched_parameters():
+    with pytest.raises(KeyError):
+        normalize_query('SELECT :a, :b', {'a': 1})
+    with pytest.raises(ValueError):
+        normalize_query('SELECT :a', [1])
+    with pytest.raises(ValueError):
+        normalize_query('SELECT ?', {'a': 1})
+
+
+def test_statement_cache_reuses_cursors_and_closes_evicted():
+    before = statement_cache_stats()
+    cache = StatementCache(FakeConnection(), max_size=2)
+    first = cache.cursor_for('SELECT 1')
+    assert cache.cursor_for('SELECT 1') is first
+    cache.cursor_for('SELECT 2')
+    cache.cursor_for('SELECT 3')
+    assert first.closed
+    after = statement_cache_stats()
+    assert (after.hits - before.hits, after.misses - before.misses, after.evictions - before.evictions) == (1, 3, 1)
+
+
+def test_prepared_statements_reuse_one_cursor_per_query(make_sql_conn):
+    sql_conn = make_sql_conn()
+    sql_conn.execute('CREATE TABLE t (id INTEGER, name VARCHAR(10))')
+    before = statement_cache_stats()
+    for i in range(3):
+        sql_conn.execute_prepared('INSERT INTO t VALUES (:id, :name)', {'id': i, 'name': f'n{i}'})
+    assert sql_conn.fetch_prepared('SELECT name FROM t WHERE id = ?', [2]) == [('n2',)]
+    after = statement_cache_stats()
+    assert (after.hits - before.hits, after.misses - before.misses) == (2, 2)
@@ -0,0 +1,107 @@
+import threading
+import time
+
+import pytest
+
+from sql_result_cache import CachedResult, ResultCache, referenced_tables
+
+QUERY = 'SELECT id FROM dbo.orders o JOIN [customers] c ON c.id = o.customer_id'
+
+
+def result(*values) -> CachedResult:
+    return CachedResult(columns=('id',), rows=tuple((v,) for v in values))
+
+
+def test_referenced_tables_ignores_qualifiers():
+    assert referenced_tables(QUERY) == frozenset({'orders', 'customers'})
+
+
+def test_hit_after_miss():
+    cache = ResultCache()
+    loads = []
+    for _ in range(2):
+        assert cache.get_or_load('k', QUERY, lambda: loads.append(1) or result(1)).rows == ((1,),)
+    assert len(loads) == 1
+    assert cache.stats().hits == 1
+
+
+def test_ttl_expiry():
+    now = [0.0]
+    cache = ResultCache(ttl=10.0, clock=lambda: now[0])
+    cache.get_or_load('k', QUERY, lambda: result(1))
+    now[0] = 11.0
+    assert cache.get_or_load('k', QUERY, lambda: result(2)).rows == ((2,),)
+    assert cache.stats().expirations == 1
+
+
+def test_invalidate_table_drops_dependent_results():
+    cache = ResultCache()
+    cache.get_or_load('k', QUERY, lambda: result(1))
+    assert cache.invalidate_table('dbo.Orders') == 1
+    assert cache.get_or_load('k', QUERY, lambda: result(2)).rows == ((2,),)
+
+
+def test_load_racing_an_invalidation_is_not_cached():
+    cache = ResultCache()
+    loading, finish = threading.Event(), threading.Event()
+
+    def slow_load():
+        loading.set()
+        finish.wait(5)
+        return result('stale')
+
+    loader = threading.Thread(target=cache.get_or_load, args=('k', QUERY, slow_load))
+    loader.start()
+    loading.wait(5)
+    cache.invalidate_table('orders')
+    finish.set()
+    loader.join(5)
+    assert cache.get_or_load('k', QUERY, lambda: result('fresh')).rows == (('fresh',),)
+
+
+def test_concurrent_misses_share_one_load():
+    cache = ResultCache()
+    loading, finish = threading.Event(), threading.Event()
+    loads = []
+
+    def slow_load():
+        loads.append(1)
+        loading.set()
+        finish.wait(5)
+        return result(1)
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(cache.get_or_load('k', QUERY, slow_load)))
+               for _ in range(4)]
+    threads[0].start()
+    loading.wait(5)
+    for thread in threads[1:]:
+        thread.start()
+    while cache.stats().coalesced < 3:
+        time.sleep(0.001)
+    finish.set()
+    for thread in threads:
+        thread.join(5)
+    assert len(loads) == 1
+    assert len(results) == 4
+
+
+def test_byte_budget_evicts_least_recently_used():
+    cache = ResultCache(max_bytes=1)
+    cache.get_or_load('k', QUERY, lambda: result(*range(100)))
+    assert cache.stats().entries == 0
+
+
+def test_sql_conn_fetch_cached_serves_repeats_and_rejects_writes(make_sql_conn):
+    cache = ResultCache()
+    sql_conn = make_sql_conn(result_cache=cache)
+    sql_conn.execute('CREATE TABLE orders (id INTEGER)')
+    sql_conn.execute('INSERT INTO orders VALUES (1)')
+    assert sql_conn.fetch_cached('SELECT id FROM orders WHERE id = :id', {'id': 1}).rows == ((1,),)
+    sql_conn.execute('INSERT INTO orders VALUES (1)')
+    assert sql_conn.fetch_cached('SELECT id FROM orders WHERE id = ?', [1]).rows == ((1,),)
+    cache.invalidate_table('orders')
+    assert sql_conn.fetch_cached('SELECT id FROM orders WHERE id = ?', [1]).rows == ((1,), (1,))
+    assert cache.stats().hits == 1
+    with pytest.raises(ValueError):
+        sql_conn.fetch_cached('DELETE FROM orders')
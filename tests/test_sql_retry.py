@@ -0,0 +1,129 @@
+import pytest
+
+from sql_backend import FaultInjector, InjectedFault, sqlite_connect
+from sql_pool import PoolTimeoutError
+from sql_retry import CLOSED, HALF_OPEN, OPEN, CircuitBreaker, CircuitOpenError, RetryPolicy, circuit_breaker, \
+    resilient_connect
+from sql_scheduler import LoadShedError
+
+
+def no_sleep_policy(**kwargs) -> RetryPolicy:
+    return RetryPolicy(sleep=lambda seconds: None, **kwargs)
+
+
+def failing(*states):
+    """ Callable raising an InjectedFault for each state in turn, then returning 'ok'. """
+    remaining = list(states)
+
+    def call():
+        if remaining:
+            raise InjectedFault(remaining.pop(0), 'scripted failure')
+        return 'ok'
+
+    return call
+
+
+def test_retries_transient_errors():
+    assert no_sleep_policy().call(failing('08S01', '40001')) == 'ok'
+
+
+def test_does_not_retry_other_errors():
+    call = failing('42S02')
+    with pytest.raises(InjectedFault):
+        no_sleep_policy().call(call)
+    assert call() == 'ok'
+
+
+def test_gives_up_after_max_attempts():
+    with pytest.raises(InjectedFault):
+        no_sleep_policy(max_attempts=2).call(failing('08S01', '08S01', '08S01'))
+
+
+def test_connectivity_failures_open_the_breaker():
+    policy = no_sleep_policy(max_attempts=3, failure_threshold=3)
+    with pytest.raises(InjectedFault):
+        policy.call(failing('08S01', '08S01', '08S01'), server='down')
+    assert circuit_breaker('down').state == OPEN
+    with pytest.raises(CircuitOpenError):
+        policy.call(failing(), server='down')
+
+
+def test_deadlocks_and_query_timeouts_do_not_open_the_breaker():
+    policy = no_sleep_policy(max_attempts=10, failure_threshold=3)
+    assert policy.call(failing('40001', 'HYT00', '40001', 'HYT00', '40001'), server='busy') == 'ok'
+    assert circuit_breaker('busy').state == CLOSED
+
+
+def test_half_open_breaker_closes_on_successful_probe():
+    now = [0.0]
+    breaker = CircuitBreaker('flaky', failure_threshold=1, reset_timeout=30.0, clock=lambda: now[0])
+    breaker.record_failure()
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+    now[0] = 31.0
+    assert breaker.state == HALF_OPEN
+    breaker.before_call()
+    breaker.record_success()
+    assert breaker.state == CLOSED
+
+
+def test_connect_failures_are_retried_in_one_layer_only():
+    injector = FaultInjector(sqlite_connect, connect_faults=['08001'] * 10)
+    connect = resilient_connect(injector, no_sleep_policy(max_attempts=3))
+    with pytest.raises(InjectedFault):
+        no_sleep_policy(max_attempts=3).call(lambda: connect('nested', ':memory:', 'yes'), server='nested')
+    assert injector.connects == 3
+
+
+def test_idempotent_precursor_methods_are_retried(make_sql_conn):
+    injector = FaultInjector(sqlite_connect, execute_faults=['08S01'])
+    sql_conn = make_sql_conn(injector, retry_policy=no_sleep_policy())
+    sql_conn.test_query('SELECT 1')
+    assert injector.faults == 1
+
+
+def test_bulk_insert_is_not_retried_after_a_committed_chunk(make_sql_conn):
+    sql_conn = make_sql_conn()
+    sql_conn.execute('CREATE TABLE t (id INTEGER)')
+    injector = FaultInjector(sqlite_connect, execute_faults=[None, '08S01'])
+    faulty = make_sql_conn(injector, retry_policy=no_sleep_policy())
+    with pytest.raises(InjectedFault):
+        faulty.bulk_insert('t', ['id'], [(i,) for i in range(30)], chunk_size=10)
+    # Only the first chunk committed; a retry would have re-inserted it.
+    assert sql_conn.fetch_prepared('SELECT COUNT(*) FROM t')[0][0] == 10
+
+
+
+def local_errors():
+    for error in (PoolTimeoutError('no connection'), LoadShedError('interactive', 3), ValueError('bug')):
+        def call(error=error):
+            raise error
+        yield type(error), call
+
+
+def test_local_errors_do_not_close_a_half_open_breaker():
+    policy = no_sleep_policy(max_attempts=1, failure_threshold=1, reset_timeout=0.0)
+    with pytest.raises(InjectedFault):
+        policy.call(failing('08S01'), server='probe')
+    breaker = circuit_breaker('probe')
+    for error_type, call in local_errors():
+        with pytest.raises(error_type):
+            policy.call(call, server='probe')
+        assert breaker.state == HALF_OPEN
+        assert breaker.failures == 1
+    # Each local error released the probe, so the next call may probe; a server error closes the breaker.
+    with pytest.raises(InjectedFault):
+        policy.call(failing('42S02'), server='probe')
+    assert breaker.state == CLOSED
+
+
+def test_local_errors_do_not_reset_the_failure_count():
+    policy = no_sleep_policy(max_attempts=1, failure_threshold=2)
+    with pytest.raises(InjectedFault):
+        policy.call(failing('08S01'), server='flaky')
+    for error_type, call in local_errors():
+        with pytest.raises(error_type):
+            policy.call(call, server='flaky')
+    with pytest.raises(InjectedFault):
+        policy.call(failing('08S01'), server='flaky')
+    assert circuit_breaker('flaky').state == OPEN
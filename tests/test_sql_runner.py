@@ -0,0 +1,94 @@
+import threading
+import time
+
+import pytest
+
+from timsy_file.sql_parser import ParseCache
+from timsy_file.sql_runner import build_dependency_graph, read_dependencies, run_scripts
+
+
+class RecordingConn:
+    """ Stands in for SqlConn: records the batches each script runs and the peak number running at once. """
+
+    server = 'local'
+    database = 'test'
+
+    def __init__(self, delay: float = 0.0, fail_on: str | None = None):
+        self.delay = delay
+        self.fail_on = fail_on
+        self.executed = []
+        self.running = 0
+        self.peak = 0
+        self._lock = threading.Lock()
+
+    def execute_batches(self, batches):
+        batches = list(batches)
+        with self._lock:
+            self.running += 1
+            self.peak = max(self.peak, self.running)
+        try:
+            time.sleep(self.delay)
+            if self.fail_on is not None and any(self.fail_on in b for b in batches):
+                raise RuntimeError('scripted failure')
+            with self._lock:
+                self.executed.extend(batches)
+        finally:
+            with self._lock:
+                self.running -= 1
+
+
+def write(directory, name: str, text: str):
+    path = directory / name
+    path.write_text(text)
+    return path
+
+
+def test_read_dependencies_from_leading_comments(tmp_path):
+    script = write(tmp_path, 'c.sql', '-- setup\n-- depends: a.sql, b\n\n-- depends-on: d\nSELECT 1\n-- depends: e\n')
+    assert read_dependencies(script) == ['a.sql', 'b', 'd']
+
+
+def test_unknown_dependency_and_cycle_are_rejected(tmp_path):
+    a = write(tmp_path, 'a.sql', '-- depends: b\nSELECT 1')
+    b = write(tmp_path, 'b.sql', '-- depends: a\nSELECT 1')
+    with pytest.raises(ValueError, match='cycle'):
+        build_dependency_graph([a, b])
+    c = write(tmp_path, 'c.sql', '-- depends: missing\nSELECT 1')
+    with pytest.raises(ValueError, match='unknown'):
+        build_dependency_graph([c])
+
+
+def test_dependents_run_after_their_prerequisites(tmp_path):
+    scripts = [write(tmp_path, 'c.sql', '-- depends: b\nSELECT 3'),
+               write(tmp_path, 'b.sql', '-- depends: a\nSELECT 2'),
+               write(tmp_path, 'a.sql', 'SELECT 1')]
+    conn = RecordingConn(delay=0.01)
+    report = run_scripts(scripts, conn, max_workers=3, parse_cache=ParseCache())
+    assert conn.executed == ['SELECT 1', '-- depends: a\nSELECT 2', '-- depends: b\nSELECT 3']
+    assert len(report.succeeded) == 3
+
+
+def test_failed_prerequisite_skips_dependents(tmp_path):
+    scripts = [write(tmp_path, 'a.sql', 'SELECT broken'),
+               write(tmp_path, 'b.sql', '-- depends: a\nSELECT 2'),
+               write(tmp_path, 'c.sql', 'SELECT 3')]
+    report = run_scripts(scripts, RecordingConn(fail_on='broken'), parse_cache=ParseCache())
+    assert [r.path.name for r in report.failed] == ['a.sql']
+    assert [r.path.name for r in report.skipped] == ['b.sql']
+    assert [r.path.name for r in report.succeeded] == ['c.sql']
+
+
+def test_independent_scripts_run_concurrently_up_to_max_workers(tmp_path):
+    scripts = [write(tmp_path, f'{i}.sql', f'SELECT {i}') for i in range(6)]
+    conn = RecordingConn(delay=0.05)
+    run_scripts(scripts, conn, max_workers=3, parse_cache=ParseCache())
+    assert conn.peak == 3
+
+
+def test_go_batches_run_in_order_on_sqlite(tmp_path, make_sql_conn):
+    sql_conn = make_sql_conn()
+    create = write(tmp_path, 'create.sql', 'CREATE TABLE t (id INTEGER)\nGO\nINSERT INTO t VALUES (1)\nGO 2\n')
+    insert = write(tmp_path, 'insert.sql', '-- depends: create\nINSERT INTO t VALUES (2)\n')
+    report = run_scripts([insert, create], sql_conn, parse_cache=ParseCache())
+    assert len(report.succeeded) == 2
+    assert sql_conn.fetch_prepared('SELECT id FROM t ORDER BY id') == [(1,), (1,), (2,)]
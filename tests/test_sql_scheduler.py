@@ -0,0 +1,171 @@
+import threading
+import time
+
+import pytest
+
+from sql_scheduler import (AdmissionTimeoutError, BATCH, INTERACTIVE, LoadShedError, MAINTENANCE, QueryScheduler,
+                           WorkloadClass)
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def scheduler(max_concurrency=1, queue_depth=8, aging=0.0, clock=None) -> QueryScheduler:
+    classes = (WorkloadClass(INTERACTIVE, 0, max_concurrency, queue_depth),
+               WorkloadClass(BATCH, 1, max_concurrency, queue_depth),
+               WorkloadClass(MAINTENANCE, 2, max_concurrency, queue_depth))
+    return QueryScheduler(classes, max_concurrency=max_concurrency, aging=aging, clock=clock or FakeClock())
+
+
+def wait_until(predicate, timeout: float = 5.0):
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        assert time.monotonic() < deadline, 'timed out waiting'
+        time.sleep(0.001)
+
+
+def run_queued(sched: QueryScheduler, workloads: list[str]) -> list[str]:
+    """ Queue one statement per distinct workload behind a held slot, release it and return the admission order. """
+    order = []
+    blocker = sched.acquire(INTERACTIVE)
+    threads = []
+    for workload in workloads:
+        def run(workload=workload):
+            with sched.slot(workload):
+                order.append(workload)
+        thread = threading.Thread(target=run)
+        thread.start()
+        threads.append(thread)
+        wait_until(lambda workload=workload: sched.stats(workload).queued == 1)
+    sched.release(blocker)
+    for thread in threads:
+        thread.join(timeout=5)
+    return order
+
+
+def test_higher_priority_classes_go_first():
+    assert run_queued(scheduler(), [MAINTENANCE, BATCH, INTERACTIVE]) == [INTERACTIVE, BATCH, MAINTENANCE]
+
+
+def test_aging_lets_old_work_overtake_fresh_interactive():
+    clock = FakeClock()
+    sched = scheduler(aging=1.0, clock=clock)
+    blocker = sched.acquire(INTERACTIVE)
+    order = []
+
+    def run(workload):
+        with sched.slot(workload):
+            order.append(workload)
+
+    old = threading.Thread(target=run, args=(MAINTENANCE,))
+    old.start()
+    wait_until(lambda: sched.stats(MAINTENANCE).queued == 1)
+    clock.now = 10.0
+    fresh = threading.Thread(target=run, args=(INTERACTIVE,))
+    fresh.start()
+    wait_until(lambda: sched.stats(INTERACTIVE).queued == 1)
+    sched.release(blocker)
+    old.join(timeout=5)
+    fresh.join(timeout=5)
+    assert order == [MAINTENANCE, INTERACTIVE]
+
+
+def test_full_queue_sheds_work_that_would_wait():
+    sched = scheduler(queue_depth=0)
+    ticket = sched.acquire(INTERACTIVE)
+    with pytest.raises(LoadShedError):
+        sched.acquire(INTERACTIVE)
+    sched.release(ticket)
+    assert sched.stats(INTERACTIVE).shed == 1
+
+
+def test_zero_queue_depth_still_admits_when_a_slot_is_free():
+    sched = scheduler(queue_depth=0)
+    sched.release(sched.acquire(INTERACTIVE))
+    assert sched.stats(INTERACTIVE).completed == 1
+
+
+def test_admission_timeout():
+    sched = scheduler()
+    ticket = sched.acquire(INTERACTIVE)
+    with pytest.raises(AdmissionTimeoutError):
+        sched.acquire(INTERACTIVE, timeout=0.05)
+    sched.release(ticket)
+    assert sched.stats(INTERACTIVE).queued == 0
+    assert sched.stats(INTERACTIVE).timed_out == 1
+
+
+def test_reset_stats_while_waiting_keeps_the_gauges_right():
+    sched = scheduler()
+    ticket = sched.acquire(INTERACTIVE)
+    stats = sched.stats(INTERACTIVE)
+    errors = []
+
+    def wait_for_slot():
+        try:
+            sched.acquire(INTERACTIVE, timeout=0.2)
+        except AdmissionTimeoutError as e:
+            errors.append(e)
+
+    waiter = threading.Thread(target=wait_for_slot)
+    waiter.start()
+    wait_until(lambda: stats.queued == 1)
+    sched.reset_stats()
+    assert (stats.submitted, stats.queued, stats.running) == (0, 1, 1)
+    waiter.join(timeout=5)
+    sched.release(ticket)
+    assert len(errors) == 1
+    assert sched.stats(INTERACTIVE) is stats
+    assert (stats.queued, stats.running, stats.timed_out, stats.completed) == (0, 0, 1, 1)
+
+
+def test_nested_slot_is_not_queued_again():
+    sched = scheduler()
+    with sched.slot(INTERACTIVE):
+        with sched.slot(INTERACTIVE):
+            assert sched.stats(INTERACTIVE).running == 1
+    assert sched.stats(INTERACTIVE).running == 0
+
+
+def test_slots_closed_out_of_order_release_admission():
+    sched = scheduler()
+
+    def statement():
+        with sched.slot(INTERACTIVE):
+            yield
+
+    first, second = statement(), statement()
+    next(first)
+    next(second)
+    first.close()
+    second.close()
+    assert sched.stats(INTERACTIVE).running == 0
+    # The thread holds nothing now, so another thread must not be admitted alongside it.
+    with sched.slot(INTERACTIVE):
+        outcome = []
+
+        def other():
+            try:
+                sched.acquire(INTERACTIVE, timeout=0.05)
+                outcome.append('admitted')
+            except AdmissionTimeoutError:
+                outcome.append('waited')
+
+        thread = threading.Thread(target=other)
+        thread.start()
+        thread.join(timeout=5)
+    assert outcome == ['waited']
+
+
+def test_sql_conn_statements_take_scheduler_slots(make_sql_conn):
+    sched = scheduler(max_concurrency=2)
+    sql_conn = make_sql_conn(scheduler=sched)
+    sql_conn.execute('CREATE TABLE t (id INTEGER)')
+    assert sql_conn.fetch_prepared('SELECT COUNT(*) FROM t')[0][0] == 0
+    assert sched.stats(INTERACTIVE).completed == 2
+    assert sched.stats(INTERACTIVE).running == 0
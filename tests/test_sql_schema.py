@@ -0,0 +1,83 @@
+import pytest
+
+from sql_schema import SchemaCache
+
+
+@pytest.fixture
+def sql_conn(make_sql_conn):
+    sql_conn = make_sql_conn()
+    sql_conn.execute('CREATE TABLE orders (id INTEGER NOT NULL, total DECIMAL(10, 2))')
+    sql_conn.execute('CREATE TABLE customers (id INTEGER, name VARCHAR(50))')
+    return sql_conn
+
+
+def test_columns_are_cached_case_insensitively(sql_conn):
+    cache = SchemaCache(sql_conn)
+    columns = cache.get_columns('orders')
+    assert [(c.name, c.nullable, c.ordinal) for c in columns] == [('id', False, 1), ('total', True, 2)]
+    assert cache.get_columns('ORDERS') is columns
+    assert cache.get_column('Orders', 'TOTAL').type_name == 'DECIMAL(10, 2)'
+    assert (cache.stats.hits, cache.stats.misses) == (2, 1)
+
+
+def test_ttl_expiry_requeries(sql_conn):
+    now = [0.0]
+    cache = SchemaCache(sql_conn, ttl=60.0, clock=lambda: now[0])
+    cache.get_tables()
+    now[0] = 61.0
+    sql_conn.execute('CREATE TABLE later (id INTEGER)')
+    assert 'later' in {t.name for t in cache.get_tables()}
+    assert cache.stats.expirations == 1
+
+
+def test_lru_eviction(sql_conn):
+    cache = SchemaCache(sql_conn, max_entries=1)
+    cache.get_columns('orders')
+    cache.get_columns('customers')
+    cache.get_columns('orders')
+    assert cache.stats.evictions == 2
+    assert cache.stats.misses == 3
+
+
+def test_invalidate_drops_matching_entries(sql_conn):
+    cache = SchemaCache(sql_conn)
+    cache.get_columns('orders')
+    cache.get_columns('customers')
+    assert cache.invalidate(table='Orders') == 1
+    cache.get_columns('customers')
+    assert cache.stats.hits == 1
+
+
+def test_warm_serves_later_lookups_without_queries(sql_conn):
+    cache = SchemaCache(sql_conn)
+    assert cache.warm() == 2
+    cache.get_columns('orders')
+    cache.get_columns('customers', catalog='main')
+    assert (cache.stats.hits, cache.stats.misses) == (2, 0)
+
+
+def test_save_and_load_round_trip(sql_conn, tmp_path):
+    path = tmp_path / 'schema.json'
+    cache = SchemaCache(sql_conn, path=path)
+    columns = cache.get_columns('orders')
+    cache.save()
+    reloaded = SchemaCache(sql_conn, path=path)
+    assert reloaded.get_columns('orders') == columns
+    assert reloaded.stats.misses == 0
+
+
+def test_cache_file_for_another_database_is_ignored(sql_conn, make_sql_conn, tmp_path):
+    path = tmp_path / 'schema.json'
+    cache = SchemaCache(sql_conn, path=path)
+    cache.get_columns('orders')
+    cache.save()
+    other = make_sql_conn(config_override={'database': str(tmp_path / 'other.db')})
+    assert SchemaCache(other, path=path).get_columns('orders') == ()
+
+
+def test_entries_are_keyed_by_database(sql_conn, make_sql_conn, tmp_path):
+    cache = SchemaCache(sql_conn)
+    cache.get_columns('orders')
+    cache.sql_conn = make_sql_conn(config_override={'database': str(tmp_path / 'other.db')})
+    assert cache.get_columns('orders') == ()
+    assert cache.stats.misses == 2